@@ -36,3 +36,186 @@ class GETFPS:
         print('frame_count=', self.frame_count)
         print('start_time=', self.start_time)
         print('current_fps=', self.current_fps)
+
+
+class _StreamRing:
+    """
+    Fixed-size ring of frame arrival timestamps for one stream.
+    """
+    __slots__ = ('timestamps', 'index', 'count', 'first')
+
+    def __init__(self, capacity):
+        self.timestamps = [0.0] * capacity
+        self.index = 0      # slot the next timestamp is written to
+        self.count = 0      # total frames seen, never wraps
+        self.first = None   # timestamp of the very first frame
+
+    def recent(self, since):
+        """
+        Return the stored timestamps newer than `since`, oldest first.
+        """
+        capacity = len(self.timestamps)
+        stored = min(self.count, capacity)
+        # Snapshot the write position first: the streaming thread may keep
+        # appending while the main loop reads.
+        index = self.index
+        out = []
+        for i in range(1, stored + 1):
+            t = self.timestamps[(index - i) % capacity]
+            if t <= since:
+                break
+            out.append(t)
+        out.reverse()
+        return out
+
+
+class StreamRateMeter:
+    """
+    Per-stream frame rate meter.
+
+    tick() is meant to be called from a pad probe: it only stores a monotonic
+    timestamp in a preallocated ring and never prints or allocates. The
+    reporting methods scan the ring and should be called from the main loop.
+    """
+
+    WINDOWS = (1.0, 5.0, 60.0)
+
+    def __init__(self, capacity=4096, clock=time.monotonic):
+        self.capacity = capacity
+        self.clock = clock
+        self.streams = {}
+        self.published = {}
+
+    def tick(self, source_id, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock()
+        ring = self.streams.get(source_id)
+        if ring is None:
+            ring = self.streams[source_id] = _StreamRing(self.capacity)
+            ring.first = timestamp
+        ring.timestamps[ring.index] = timestamp
+        ring.index = (ring.index + 1) % self.capacity
+        ring.count += 1
+
+    def source_ids(self):
+        return sorted(self.streams)
+
+    def frame_count(self, source_id):
+        ring = self.streams.get(source_id)
+        return ring.count if ring else 0
+
+    def rate(self, source_id, window=5.0, now=None):
+        """
+        Frames per second over the last `window` seconds.
+
+        A stream younger than the window is averaged over its lifetime, and a
+        stream that stopped delivering frames decays towards zero instead of
+        reporting its last good value.
+        """
+        ring = self.streams.get(source_id)
+        if ring is None:
+            return 0.0
+        if now is None:
+            now = self.clock()
+        timestamps = ring.recent(now - window)
+        span = min(window, now - ring.first)
+        if len(timestamps) == self.capacity:
+            # The ring is shorter than the window: average over what it holds
+            span = now - timestamps[0]
+        if span <= 0:
+            return 0.0
+        return len(timestamps) / span
+
+    def instantaneous(self, source_id):
+        """
+        Frame rate derived from the last inter-frame interval.
+        """
+        ring = self.streams.get(source_id)
+        if ring is None or ring.count < 2:
+            return 0.0
+        last = ring.timestamps[(ring.index - 1) % self.capacity]
+        previous = ring.timestamps[(ring.index - 2) % self.capacity]
+        if last <= previous:
+            return 0.0
+        return 1.0 / (last - previous)
+
+    def jitter(self, source_id, window=5.0, percentiles=(50, 95, 99), now=None):
+        """
+        Percentiles of the inter-frame interval (in milliseconds) over the
+        last `window` seconds, as a {percentile: value} dict.
+        """
+        ring = self.streams.get(source_id)
+        if ring is None:
+            return dict((p, 0.0) for p in percentiles)
+        if now is None:
+            now = self.clock()
+        timestamps = ring.recent(now - window)
+        intervals = sorted((b - a) * 1000.0 for a, b in zip(timestamps, timestamps[1:]))
+        if not intervals:
+            return dict((p, 0.0) for p in percentiles)
+        last = len(intervals) - 1
+        return dict((p, intervals[min(last, int(round(p / 100.0 * last)))]) for p in percentiles)
+
+    def stats(self, source_id, now=None):
+        if now is None:
+            now = self.clock()
+        stats = {
+            'source_id': source_id,
+            'frames': self.frame_count(source_id),
+            'instantaneous': self.instantaneous(source_id),
+            'jitter_ms': self.jitter(source_id, now=now),
+        }
+        for window in self.WINDOWS:
+            stats['fps_%ds' % window] = self.rate(source_id, window, now=now)
+        return stats
+
+    def publish(self, window=5.0):
+        """
+        Recompute the rate of every stream for current_fps(). Call this
+        periodically from the main loop.
+        """
+        now = self.clock()
+        self.published = dict((source_id, self.rate(source_id, window, now=now))
+                              for source_id in self.source_ids())
+        return True
+
+    def current_fps(self, source_id):
+        """
+        Last published rate of a stream. Read-only and O(1), so it is safe to
+        call per frame from a pad probe.
+        """
+        return self.published.get(source_id, 0.0)
+
+    def summary(self):
+        """
+        One line per stream, for periodic logging from the main loop.
+        """
+        now = self.clock()
+        lines = []
+        for source_id in self.source_ids():
+            s = self.stats(source_id, now=now)
+            lines.append("stream %d: %.1f fps (1s %.1f, 5s %.1f, 60s %.1f) jitter p50/p95/p99 %.1f/%.1f/%.1f ms" % (
+                source_id, s['instantaneous'], s['fps_1s'], s['fps_5s'], s['fps_60s'],
+                s['jitter_ms'][50], s['jitter_ms'][95], s['jitter_ms'][99]))
+        return "\n".join(lines)
+
+
+class FpsText:
+    """
+    Per-stream cache of the rendered FPS overlay text. The string is only
+    formatted again when the displayed (rounded) value changes.
+    """
+
+    def __init__(self, template="FPS: {:.1f}", precision=1):
+        self.template = template
+        self.precision = precision
+        self.cache = {}
+
+    def render(self, source_id, fps):
+        value = round(fps, self.precision)
+        cached = self.cache.get(source_id)
+        if cached is not None and cached[0] == value:
+            return cached[1]
+        text = self.template.format(value)
+        self.cache[source_id] = (value, text)
+        return text
@@ -0,0 +1,5 @@
+# No GStreamer imports here, so that batch_arrays, fake_pyds, analytics and
+# track_store can be imported without PyGObject
+from ds_rtsp.config import DEFAULT_CONFIG, load_config
+
+__all__ = ["DEFAULT_CONFIG", "load_config"]
@@ -0,0 +1,145 @@
+import gi
+
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib
+
+
+def find_queues(pipeline):
+    """
+    The queue elements in the pipeline, including those inside bins, whose
+    fill level shows a stage falling behind. Leaky queues are left out: they
+    drop buffers instead of filling up, and the one-buffer source queues of
+    --live are full whenever a frame is waiting, so they would always read
+    as behind.
+    """
+    queues = []
+    for element in pipeline.iterate_recurse():
+        factory = element.get_factory()
+        if not factory or factory.get_name() != "queue":
+            continue
+        if int(element.get_property("leaky")) or element.get_property("max-size-buffers") == 1:
+            continue
+        queues.append(element)
+    return queues
+
+
+def queue_occupancy(queue):
+    """
+    Fill level of a queue between 0 and 1, by whichever limit is closest.
+    """
+    levels = []
+    for current, limit in (("current-level-buffers", "max-size-buffers"),
+                           ("current-level-bytes", "max-size-bytes"),
+                           ("current-level-time", "max-size-time")):
+        maximum = queue.get_property(limit)
+        if maximum:
+            levels.append(queue.get_property(current) / float(maximum))
+    return max(levels) if levels else 0.0
+
+
+class AdaptiveIntervalController:
+    """
+    Sets nvinfer's interval (frames skipped between inferences) from the
+    measured frame rate and queue occupancy, so that the pipeline keeps up
+    with its sources and the tracker fills in the boxes between inferred
+    frames, instead of falling behind and building up latency.
+
+    Each source is held to its own input rate, `input_rate(source_id)`
+    (see PipelineProbes.input_rate), so a 15 fps camera that is fully kept
+    up with is not taken for a 30 fps one falling behind. The interval is
+    raised by one when a source runs below `lower` times its input rate or
+    a queue is above `high_water`, and lowered by one when every source runs
+    at `upper` times its input rate with all queues below `low_water`. After
+    each change the controller waits `settle` updates for the FPS window to
+    reflect it.
+
+    A pipeline that keeps up at interval N usually runs at full rate, so it
+    always looks ready for N - 1. Lowering is only tried every `probe_wait`
+    updates, and that wait doubles (up to `max_probe_wait`) each time a
+    lowered interval has to be raised again.
+    """
+
+    def __init__(self, pgie, fps_meter, input_rate, floor=0, ceiling=4, queues=None,
+                 lower=0.9, upper=0.97, high_water=0.5, low_water=0.1, settle=5,
+                 probe_wait=30, max_probe_wait=600):
+        self.pgie = pgie
+        self.fps_meter = fps_meter
+        self.input_rate = input_rate
+        self.floor = floor
+        self.ceiling = ceiling
+        self.queues = queues or []
+        self.lower = lower
+        self.upper = upper
+        self.high_water = high_water
+        self.low_water = low_water
+        self.settle = settle
+        self.initial_probe_wait = probe_wait
+        self.probe_wait = probe_wait
+        self.max_probe_wait = max_probe_wait
+        self.since_change = 0
+        self.last_step = 0
+        self.interval = min(max(pgie.get_property("interval"), floor), ceiling)
+        self.pgie.set_property("interval", self.interval)
+
+    def attach(self, seconds=1):
+        GLib.timeout_add_seconds(seconds, self.update)
+
+    def slowest(self):
+        """
+        (fps, input fps) of the source furthest behind its input rate, or
+        None while no input rate is known.
+        """
+        slowest = None
+        for source_id in self.fps_meter.source_ids():
+            target_fps = self.input_rate(source_id)
+            if not target_fps:
+                continue
+            fps = self.fps_meter.current_fps(source_id)
+            if slowest is None or fps / target_fps < slowest[0] / slowest[1]:
+                slowest = (fps, target_fps)
+        return slowest
+
+    def fullest_queue(self):
+        return max([queue_occupancy(queue) for queue in self.queues] or [0.0])
+
+    def decide(self, fps, target_fps, occupancy):
+        """
+        New interval for the measured frame rate of the slowest source, its
+        input rate and the queue occupancy.
+        """
+        behind = fps < self.lower * target_fps or occupancy > self.high_water
+        ahead = fps >= self.upper * target_fps and occupancy < self.low_water
+        if behind and self.interval < self.ceiling:
+            return self.interval + 1
+        if ahead and self.interval > self.floor:
+            return self.interval - 1
+        return self.interval
+
+    def update(self):
+        self.since_change += 1
+        if self.since_change <= self.settle:
+            return True
+        if self.last_step < 0 and self.since_change > self.probe_wait:
+            # The last lowering held
+            self.probe_wait = self.initial_probe_wait
+        slowest = self.slowest()
+        if slowest is None:
+            return True
+        fps, target_fps = slowest
+        occupancy = self.fullest_queue()
+        interval = self.decide(fps, target_fps, occupancy)
+        if interval == self.interval:
+            return True
+        step = interval - self.interval
+        if step < 0 and self.since_change < self.probe_wait:
+            return True
+        if step > 0 and self.last_step < 0 and self.since_change <= self.probe_wait:
+            self.probe_wait = min(self.probe_wait * 2, self.max_probe_wait)
+
+        print("Inference interval %d -> %d (%.1f of %.1f fps, queues %d%% full)" % (
+            self.interval, interval, fps, target_fps, occupancy * 100))
+        self.pgie.set_property("interval", interval)
+        self.interval = interval
+        self.last_step = step
+        self.since_change = 0
+        return True
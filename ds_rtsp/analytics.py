@@ -0,0 +1,362 @@
+import json
+import math
+import numpy as np
+
+from ds_rtsp.batch_arrays import UNTRACKED_OBJECT_ID
+from ds_rtsp.track_store import TrackStore
+
+try:
+    import pyds
+except ImportError:
+    pyds = None
+
+# Zones are tracked as bits of a uint64 per object and per track
+MAX_ZONES = 64
+
+# Per track state kept by Analytics
+TRACK_FIELDS = [
+    ("anchor", np.float32, (2,)),
+    ("zones", np.uint64),
+]
+
+# Lines and texts per NvDsDisplayMeta
+MAX_DISPLAY_ELEMENTS = 16
+
+ONE = np.uint64(1)
+
+
+def zone_bit(index):
+    return ONE << np.uint64(index)
+
+
+def zone_matrix(bits, num_zones):
+    """
+    Zone bits unpacked into a (len(bits), num_zones) boolean matrix.
+    """
+    shifts = np.arange(num_zones, dtype=np.uint64)
+    return ((bits[:, None] >> shifts) & ONE).astype(bool)
+
+
+def anchor_points(bboxes):
+    """
+    Bottom centre of each (left, top, width, height) box: where a person or
+    vehicle touches the ground, so zones drawn on the floor work.
+    """
+    anchors = np.empty((len(bboxes), 2), np.float32)
+    anchors[:, 0] = bboxes[:, 0] + bboxes[:, 2] * 0.5
+    anchors[:, 1] = bboxes[:, 1] + bboxes[:, 3]
+    return anchors
+
+
+class Zone:
+    """
+    Polygon in muxer frame coordinates, on one source.
+    """
+    __slots__ = ('name', 'source_id', 'points', 'bounds')
+
+    def __init__(self, name, source_id, points):
+        if len(points) < 3:
+            raise ValueError("zone %s needs at least 3 points" % name)
+        self.name = name
+        self.source_id = source_id
+        self.points = np.asarray(points, np.float32)
+        self.bounds = (self.points[:, 0].min(), self.points[:, 1].min(),
+                       self.points[:, 0].max(), self.points[:, 1].max())
+
+    def contains(self, points):
+        """
+        Even-odd test of many points at once, one vectorized step per edge.
+        """
+        x, y = points[:, 0], points[:, 1]
+        inside = np.zeros(len(points), bool)
+        edges = len(self.points)
+        for i in range(edges):
+            xi, yi = self.points[i]
+            xj, yj = self.points[i - 1]
+            if yi == yj:
+                # A horizontal edge is never crossed by a horizontal ray
+                continue
+            crosses = ((yi > y) != (yj > y)) & (x < (xj - xi) * (y - yi) / (yj - yi) + xi)
+            inside ^= crosses
+        return inside
+
+
+class Line:
+    """
+    Counting line from `a` to `b` in muxer frame coordinates, on one
+    source. Crossing to the right-hand side of a -> b (image coordinates,
+    y down) counts as "in", the other way as "out".
+    """
+    __slots__ = ('name', 'source_id', 'a', 'b')
+
+    def __init__(self, name, source_id, points):
+        if len(points) != 2:
+            raise ValueError("line %s needs 2 points" % name)
+        self.name = name
+        self.source_id = source_id
+        self.a = np.asarray(points[0], np.float32)
+        self.b = np.asarray(points[1], np.float32)
+
+    def side(self, points):
+        d = self.b - self.a
+        return d[0] * (points[:, 1] - self.a[1]) - d[1] * (points[:, 0] - self.a[0])
+
+    def crossings(self, previous, current):
+        """
+        Direction of the crossing of each previous -> current step: 1 in,
+        -1 out, 0 none.
+        """
+        before = self.side(previous)
+        after = self.side(current)
+        step = current - previous
+        # The step must also pass between a and b, not beyond the line ends
+        ta = step[:, 0] * (self.a[1] - previous[:, 1]) - step[:, 1] * (self.a[0] - previous[:, 0])
+        tb = step[:, 0] * (self.b[1] - previous[:, 1]) - step[:, 1] * (self.b[0] - previous[:, 0])
+        # A point on the line counts as being on the "in" side
+        crossed = ((before >= 0) != (after >= 0)) & (ta * tb <= 0)
+        return np.where(crossed, np.where(after >= 0, 1, -1), 0).astype(np.int8)
+
+
+class ZoneIndex:
+    """
+    Uniform grid over one source's frame. Each cell holds the bits of the
+    zones whose bounding box overlaps it, so a point is only tested against
+    the polygons near it.
+    """
+
+    def __init__(self, zones, width, height, cell=64):
+        # (bit, Zone) pairs
+        self.zones = zones
+        self.cell = cell
+        self.columns = max(1, int(math.ceil(width / float(cell))))
+        self.rows = max(1, int(math.ceil(height / float(cell))))
+        self.grid = np.zeros((self.rows, self.columns), np.uint64)
+        for bit, zone in zones:
+            x0, y0, x1, y1 = [int(v // cell) for v in zone.bounds]
+            x0, x1 = max(x0, 0), min(x1, self.columns - 1)
+            y0, y1 = max(y0, 0), min(y1, self.rows - 1)
+            self.grid[y0:y1 + 1, x0:x1 + 1] |= zone_bit(bit)
+
+    def membership(self, points):
+        """
+        Bits of the zones each point is in.
+        """
+        columns = np.clip((points[:, 0] // self.cell).astype(np.int64), 0, self.columns - 1)
+        rows = np.clip((points[:, 1] // self.cell).astype(np.int64), 0, self.rows - 1)
+        candidates = self.grid[rows, columns]
+        member = np.zeros(len(points), np.uint64)
+        for bit, zone in self.zones:
+            mask = zone_bit(bit)
+            near = np.nonzero(candidates & mask)[0]
+            if near.size:
+                member[near[zone.contains(points[near])]] |= mask
+        return member
+
+
+class Analytics:
+    """
+    Counts tracked objects in polygon zones and across lines.
+
+    update() takes the BatchArrays of a batch after the tracker. Each
+    object is reduced to the bottom centre of its box. Its zones come from
+    a ZoneIndex per source, and its step since the previous frame is
+    checked against the lines of its source. Per track state is kept in a
+    bounded TrackStore. Everything is vectorized over the objects of the batch, so
+    a batch costs O(objects) for a fixed set of zones and lines, plus one
+    dict lookup per tracked object.
+
+    Per zone it keeps the current occupancy and the entries and exits of
+    tracks (a track first seen inside a zone counts as entering it, a track
+    lost inside it as leaving it); per line the crossings in each
+    direction. Occupancy is only updated for the sources that have a frame
+    in the batch: nvstreammux does not wait for slower sources. `on_event`
+    is called with a dict for every entry, exit and crossing.
+
+    draw() reuses the overlay of a source, its segments and count strings
+    already split per display meta, until a count changes.
+    """
+
+    def __init__(self, zones, lines, width, height, cell=64, ttl=150, max_tracks=4096, on_event=None):
+        if len(zones) > MAX_ZONES:
+            raise ValueError("at most %d zones are supported" % MAX_ZONES)
+        self.zones = zones
+        self.lines = lines
+        self.on_event = on_event
+        self.indexes = {}
+        for source_id in set(zone.source_id for zone in zones):
+            self.indexes[source_id] = ZoneIndex(
+                [(bit, zone) for bit, zone in enumerate(zones) if zone.source_id == source_id],
+                width, height, cell)
+        self.zone_sources = np.array([zone.source_id for zone in zones], np.uint32)
+        self.tracks = TrackStore(TRACK_FIELDS, max_tracks, ttl, on_release=self.on_track_released)
+        self.updates = 0
+        self.occupancy = np.zeros(len(zones), np.int64)
+        self.entries = np.zeros(len(zones), np.int64)
+        self.exits = np.zeros(len(zones), np.int64)
+        self.crossings = np.zeros((len(lines), 2), np.int64)    # in, out
+        # Bumped whenever a count changes; source_id -> (generation, overlay)
+        self.generation = 0
+        self.overlay_cache = {}
+
+    def update(self, arrays):
+        self.updates += 1
+        objects = arrays.objects()
+        anchors = anchor_points(objects["bbox"])
+        sources = objects["source_id"]
+
+        member = np.zeros(len(objects), np.uint64)
+        for source_id, index in self.indexes.items():
+            on_source = np.nonzero(sources == source_id)[0]
+            if on_source.size:
+                member[on_source] = index.membership(anchors[on_source])
+        present = np.isin(self.zone_sources, arrays.frames()["source_id"])
+        occupancy = zone_matrix(member, len(self.zones)).sum(axis=0)
+        if not np.array_equal(self.occupancy[present], occupancy[present]):
+            self.occupancy[present] = occupancy[present]
+            self.generation += 1
+
+        tracked = np.nonzero(objects["track_id"] != UNTRACKED_OBJECT_ID)[0]
+        if tracked.size:
+            keys = list(zip(sources[tracked].tolist(), objects["track_id"][tracked].tolist()))
+            slots, new = self.tracks.lookup(keys, self.updates)
+            records = self.tracks.records
+            self.count_zones(keys, records["zones"][slots], member[tracked])
+            known = np.nonzero(~new)[0]
+            if known.size:
+                self.count_lines([keys[i] for i in known], sources[tracked][known],
+                                 records["anchor"][slots[known]], anchors[tracked][known])
+            records["zones"][slots] = member[tracked]
+            records["anchor"][slots] = anchors[tracked]
+        self.tracks.expire(self.updates)
+
+    def count_zones(self, keys, before, after):
+        entered = zone_matrix(after & ~before, len(self.zones))
+        exited = zone_matrix(before & ~after, len(self.zones))
+        self.entries += entered.sum(axis=0)
+        self.exits += exited.sum(axis=0)
+        if entered.any() or exited.any():
+            self.generation += 1
+        if self.on_event:
+            for i, bit in zip(*np.nonzero(entered)):
+                self.emit("enter", self.zones[bit], keys[i])
+            for i, bit in zip(*np.nonzero(exited)):
+                self.emit("exit", self.zones[bit], keys[i])
+
+    def on_track_released(self, slot, key):
+        # A track lost inside zones leaves them, else entries minus exits
+        # would drift
+        zones = self.tracks.records["zones"][slot:slot + 1]
+        if zones[0]:
+            self.count_zones([key], zones, np.zeros(1, np.uint64))
+
+    def count_lines(self, keys, sources, previous, current):
+        for index, line in enumerate(self.lines):
+            on_source = np.nonzero(sources == line.source_id)[0]
+            if not on_source.size:
+                continue
+            directions = line.crossings(previous[on_source], current[on_source])
+            if not directions.any():
+                continue
+            self.crossings[index, 0] += np.count_nonzero(directions > 0)
+            self.crossings[index, 1] += np.count_nonzero(directions < 0)
+            self.generation += 1
+            if self.on_event:
+                for i in np.nonzero(directions)[0]:
+                    self.emit("in" if directions[i] > 0 else "out", line, keys[on_source[i]])
+
+    def emit(self, event, region, key):
+        self.on_event({"event": event, "name": region.name, "source": key[0], "track": key[1]})
+
+    def counts(self):
+        """
+        Totals as plain dicts, for reports and metrics.
+        """
+        zones = [{"name": zone.name, "source": zone.source_id, "occupancy": int(self.occupancy[i]),
+                  "entries": int(self.entries[i]), "exits": int(self.exits[i])}
+                 for i, zone in enumerate(self.zones)]
+        lines = [{"name": line.name, "source": line.source_id,
+                  "in": int(self.crossings[i, 0]), "out": int(self.crossings[i, 1])}
+                 for i, line in enumerate(self.lines)]
+        return zones, lines
+
+    def texts(self, source_id=None):
+        zones, lines = self.counts()
+        return ["zone %(name)s (stream %(source)d): %(occupancy)d inside, %(entries)d entered, "
+                "%(exits)d exited" % zone for zone in zones if source_id in (None, zone["source"])] + \
+               ["line %(name)s (stream %(source)d): %(in)d in, %(out)d out" % line
+                for line in lines if source_id in (None, line["source"])]
+
+    def summary(self):
+        return "\n".join(self.texts() + [
+            "tracks: %(live)d live, %(expired)d expired, %(evicted)d evicted at the cap, "
+            "%(bytes)d bytes" % self.tracks.stats()])
+
+    def segments(self, source_id):
+        for zone in self.zones:
+            if zone.source_id == source_id:
+                for i in range(len(zone.points)):
+                    yield zone.points[i - 1], zone.points[i]
+        for line in self.lines:
+            if line.source_id == source_id:
+                yield line.a, line.b
+
+    def overlay(self, source_id):
+        """
+        [(segments, texts), ...] of a source, one entry per display meta:
+        integer end points and (y_offset, text) pairs.
+        """
+        generation = self.generation
+        cached = self.overlay_cache.get(source_id)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        segments = [(int(a[0]), int(a[1]), int(b[0]), int(b[1])) for a, b in self.segments(source_id)]
+        # Below the FPS text
+        texts = [(40 + 22 * i, text) for i, text in enumerate(self.texts(source_id))]
+        overlay = []
+        while segments or texts:
+            overlay.append((segments[:MAX_DISPLAY_ELEMENTS], texts[:MAX_DISPLAY_ELEMENTS]))
+            segments, texts = segments[MAX_DISPLAY_ELEMENTS:], texts[MAX_DISPLAY_ELEMENTS:]
+        self.overlay_cache[source_id] = (generation, overlay)
+        return overlay
+
+    def draw(self, batch_meta, frame_meta):
+        """
+        Draw the zones and lines of the frame's source and their counts on
+        the OSD.
+        """
+        for segments, texts in self.overlay(frame_meta.source_id):
+            display_meta = pyds.nvds_acquire_display_meta_from_pool(batch_meta)
+            display_meta.num_lines = len(segments)
+            for i, (x1, y1, x2, y2) in enumerate(segments):
+                line_params = display_meta.line_params[i]
+                line_params.x1, line_params.y1 = x1, y1
+                line_params.x2, line_params.y2 = x2, y2
+                line_params.line_width = 2
+                line_params.line_color.set(1.0, 1.0, 0.0, 1.0)
+            display_meta.num_labels = len(texts)
+            for i, (y_offset, text) in enumerate(texts):
+                text_params = display_meta.text_params[i]
+                text_params.x_offset = 10
+                text_params.y_offset = y_offset
+                text_params.display_text = text
+                text_params.font_params.font_name = "Serif"
+                text_params.font_params.font_size = 12
+                text_params.font_params.font_color.set(1.0, 1.0, 0.0, 1.0)
+                text_params.set_bg_clr = 1
+                text_params.text_bg_clr.set(0.0, 0.0, 0.0, 0.5)
+            pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
+
+def load_analytics(path, width, height, ttl=150, max_tracks=4096, on_event=None):
+    """
+    Analytics from a JSON file:
+
+        {"zones": [{"name": "door", "source": 0, "points": [[x, y], ...]}],
+         "lines": [{"name": "gate", "source": 0, "points": [[x1, y1], [x2, y2]]}]}
+
+    with coordinates in the muxer resolution (width x height).
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    zones = [Zone(z["name"], z.get("source", 0), z["points"]) for z in spec.get("zones", [])]
+    lines = [Line(l["name"], l.get("source", 0), l["points"]) for l in spec.get("lines", [])]
+    return Analytics(zones, lines, width, height, ttl=ttl, max_tracks=max_tracks, on_event=on_event)
@@ -0,0 +1,677 @@
+import argparse
+import importlib.util
+import sys
+import time
+import gi
+
+gi.require_version('Gst', '1.0')
+gi.require_version('GstRtspServer', '1.0')
+from gi.repository import GObject, GLib, Gst, GstRtspServer
+
+from common.bus_call import bus_call
+from ds_rtsp.adaptive import AdaptiveIntervalController, find_queues
+from ds_rtsp.builder import PipelineBuilder
+from ds_rtsp.config import load_config
+from ds_rtsp.control import ControlError, ControlServer
+from ds_rtsp.latency import LatencyTracer
+from ds_rtsp.metrics import MetricsRegistry, MetricsServer
+from ds_rtsp.engine_cache import DEFAULT_CACHE_DIR, model_infer_config
+from ds_rtsp.export import EXPORT_FORMATS, MetadataExporter, encode_jsonl, encode_msgpack, open_sink, msgpack
+from ds_rtsp.models import MODEL_PROFILES, ModelSwitcher, keep_built_engine
+from ds_rtsp.probes import PipelineProbes
+from ds_rtsp.source_manager import SourceManager, is_network_source
+from ds_rtsp.sources import batched_push_timeout, is_v4l2_device, parse_size
+from ds_rtsp.stages import QUEUE_BOUNDARIES, DEFAULT_QUEUE_POLICY, batch_capacity
+from ds_rtsp.rtsp_output import RtspClientCounter, RtspClientGate, RtpHandoff, udp_launch, appsrc_launch
+
+
+class Application:
+    """
+    Runs the pipeline composed by PipelineBuilder, with the RTSP server,
+    probes and periodic reports around it.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.builder = PipelineBuilder(config)
+        self.probes = PipelineProbes(config["fps_label"])
+        self.pipeline = None
+        self.loop = None
+        self.client_counter = None
+        self.rtp_handoff = None
+        self.latency_tracer = None
+        self.metrics_server = None
+        self.model_switcher = None
+        self.interval_controller = None
+        self.source_manager = None
+        self.control_server = None
+        self.exporter = None
+        self.analytics = None
+        self.recorder = None
+        self.record_trigger = None
+
+    def apply_label_mode(self):
+        # Object text: "label+id" is what nvtracker writes by default, "label"
+        # asks the tracker to leave the ID out and "none" turns text off in OSD
+        # (set by the rtsp stage). Only trackers without display-tracking-id
+        # need the per-object loop.
+        if self.config["label_mode"] != "label" or not self.builder.streams_rtsp():
+            return
+        tracker = self.pipeline.get_by_name("tracker")
+        if tracker.find_property('display-tracking-id'):
+            tracker.set_property('display-tracking-id', 0)
+        else:
+            print("nvtracker has no display-tracking-id, stripping IDs in the OSD probe")
+            self.probes.strip_object_ids = True
+
+    def attach_latency_tracer(self):
+        """
+        Trace every element of the pipeline, in pipeline order. Per source,
+        the "source" stage is the decoder/camera output and "nvvidconvsrc"
+        the source bin output.
+        """
+        tracer = LatencyTracer()
+        tracer.add_stage("source")
+        tracer.add_stage("nvvidconvsrc")
+        for source in self.builder.sources:
+            self.trace_source(tracer, self.pipeline.get_by_name(source.name))
+        specs = self.builder.trunk_specs()
+        if self.builder.streams_rtsp():
+            specs += self.builder.branches[0].specs
+        for spec in specs:
+            # Sinks have no src pad and are skipped
+            tracer.attach_element(self.pipeline.get_by_name(spec.name))
+        return tracer
+
+    @staticmethod
+    def trace_source(tracer, source_bin):
+        nvvidconvsrc = source_bin.get_by_name("%s-nvvidconv" % source_bin.get_name())
+        tracer.attach(nvvidconvsrc.get_static_pad("sink"), "source")
+        tracer.attach(source_bin.get_static_pad("src"), "nvvidconvsrc")
+
+    def print_latency_stats(self):
+        print("**********************LATENCY*************************************")
+        print(self.latency_tracer.dump())
+        return True
+
+    def start_rtsp_server(self):
+        config = self.config
+        server = GstRtspServer.RTSPServer.new()
+        server.props.service = "%d" % config["rtsp_port"]
+        server.attach(None)
+
+        factory = GstRtspServer.RTSPMediaFactory.new()
+        if config["rtsp_transport"] == "appsrc":
+            factory.set_launch(appsrc_launch(config["codec"]))
+            self.rtp_handoff = RtpHandoff(self.pipeline.get_by_name("rtp-appsink"))
+            self.rtp_handoff.attach(factory)
+        else:
+            factory.set_launch(udp_launch(config["udp_port"], config["codec"]))
+        factory.set_shared(True)
+        server.get_mount_points().add_factory(config["rtsp_mount"], factory)
+
+        if config["encode_on_demand"]:
+            self.client_counter = RtspClientGate(self.pipeline.get_by_name("encode-valve"),
+                                                 self.pipeline.get_by_name("encoder"))
+        else:
+            self.client_counter = RtspClientCounter()
+        self.client_counter.attach(server, factory)
+
+        print("\n *** DeepStream: Launched RTSP Streaming at rtsp://localhost:%d%s ***\n\n" % (
+            config["rtsp_port"], config["rtsp_mount"]))
+
+    def create_metrics_registry(self):
+        probes = self.probes
+        fps_meter = probes.fps_meter
+        pipeline = self.pipeline
+        renders = self.builder.streams_rtsp()
+        registry = MetricsRegistry()
+        registry.gauge("stream_fps", "Frames per second per source over the last 5 seconds",
+                       lambda: [({"source": i}, fps_meter.current_fps(i)) for i in fps_meter.source_ids()])
+        registry.counter("frames_total", "Frames processed per source",
+                         lambda: [({"source": i}, fps_meter.frame_count(i)) for i in fps_meter.source_ids()])
+        registry.counter("frames_dropped_total", "Frames dropped per element, from QoS messages",
+                         lambda: [({"element": k}, v) for k, v in list(probes.frames_dropped.items())])
+        registry.counter("stale_frames_dropped_total", "Frames dropped per source by leaky source queues",
+                         lambda: [({"source": k}, v) for k, v in list(probes.stale_frames.items())])
+        registry.counter("source_restarts_total", "Restarts of failed or stalled sources",
+                         lambda: [({"source": k}, v) for k, v in list(self.source_manager.restarts.items())]
+                         if self.source_manager else [])
+        registry.counter("exported_records_total", "Frame records written by --export",
+                         lambda: [({}, self.exporter.exported)] if self.exporter else [])
+        registry.counter("export_records_dropped_total", "Frame records lost by --export, because the "
+                         "writer fell behind (ring) or the write failed (write)",
+                         lambda: [({"reason": "ring"}, self.exporter.dropped),
+                                  ({"reason": "write"}, self.exporter.failed)] if self.exporter else [])
+        registry.gauge("zone_occupancy", "Tracked objects currently inside each analytics zone",
+                       lambda: [({"zone": z["name"], "source": z["source"]}, z["occupancy"])
+                                for z in self.analytics.counts()[0]] if self.analytics else [])
+        registry.counter("zone_entries_total", "Tracks that entered each analytics zone",
+                         lambda: [({"zone": z["name"], "source": z["source"]}, z["entries"])
+                                  for z in self.analytics.counts()[0]] if self.analytics else [])
+        registry.counter("zone_exits_total", "Tracks that left each analytics zone",
+                         lambda: [({"zone": z["name"], "source": z["source"]}, z["exits"])
+                                  for z in self.analytics.counts()[0]] if self.analytics else [])
+        registry.counter("line_crossings_total", "Tracks that crossed each analytics line, per direction",
+                         lambda: [({"line": l["name"], "source": l["source"], "direction": d}, l[d])
+                                  for l in self.analytics.counts()[1] for d in ("in", "out")]
+                         if self.analytics else [])
+        registry.gauge("tracks_live", "Tracks held in the analytics track store",
+                       lambda: [({}, len(self.analytics.tracks))] if self.analytics else [])
+        registry.counter("tracks_removed_total", "Tracks dropped from the analytics track store, after "
+                         "--track-ttl (expired) or at --max-tracks (evicted)",
+                         lambda: [({"reason": "expired"}, self.analytics.tracks.expired),
+                                  ({"reason": "evicted"}, self.analytics.tracks.evicted)]
+                         if self.analytics else [])
+        registry.counter("clips_recorded_total", "Clips started by --record-dir",
+                         lambda: [({}, self.recorder.clips)] if self.recorder else [])
+        registry.gauge("objects_per_frame", "Objects in the last frame per source",
+                       lambda: [({"source": k}, v) for k, v in list(probes.objects_per_frame.items())])
+        registry.counter("probe_seconds_total", "CPU time spent in Python pad probes",
+                         lambda: [({"probe": k}, v) for k, v in list(probes.probe_seconds.items())])
+        registry.gauge("encoder_bitrate_bps", "Configured encoder bitrate",
+                       lambda: [({}, self.config["bitrate"])] if renders else [])
+        registry.counter("encoded_bytes_total", "Bytes produced by the encoder",
+                         lambda: [({}, probes.encoded_bytes)] if renders else [])
+        registry.gauge("rtsp_clients", "Connected RTSP clients",
+                       lambda: [({}, self.client_counter.clients)] if self.client_counter else [])
+        registry.counter("rtsp_handoff_pushed_total", "RTP buffers handed to RTSP media by "
+                         "--rtsp-transport appsrc, once per media",
+                         lambda: [({}, self.rtp_handoff.pushed)] if self.rtp_handoff else [])
+        registry.counter("rtsp_handoff_dropped_total", "RTP buffers --rtsp-transport appsrc dropped, "
+                         "with no media prepared or a media's appsrc full",
+                         lambda: [({}, self.rtp_handoff.dropped)] if self.rtp_handoff else [])
+        registry.gauge("process_cpu_percent", "CPU time of the process in percent of one core, "
+                       "over the last FPS summary period",
+                       lambda: [({}, probes.cpu_percent)])
+        registry.gauge("inference_interval", "Frames skipped between inferences",
+                       lambda: [({}, self.interval_controller.interval)] if self.interval_controller else [])
+        registry.gauge("pipeline_state", "Current GstState of the pipeline (4 = PLAYING)",
+                       lambda: [({}, int(pipeline.get_state(0)[1]))])
+        return registry
+
+    def start_metrics_server(self, bus):
+        bus.connect("message::qos", self.probes.on_qos_message)
+        encoder = self.pipeline.get_by_name("encoder")
+        if encoder:
+            encoder.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, self.probes.encoded_bytes_probe, 0)
+        self.metrics_server = MetricsServer(self.create_metrics_registry(), self.config["metrics_port"])
+        self.metrics_server.start()
+
+    def attach_model_switcher(self):
+        """
+        A/B the running model against --ab-model on the same pipeline.
+        """
+        config = self.config
+        pgie = self.pipeline.get_by_name("primary-inference")
+        batch_size = batch_capacity(config)
+        models = [
+            (config["model"] or "default", pgie.get_property("config-file-path")),
+            (config["ab_model"], model_infer_config(config, config["ab_model"], batch_size)),
+        ]
+        switcher = ModelSwitcher(pgie, models, self.probes.fps_meter)
+        switcher.attach(config["ab_interval"])
+        print("Switching between %s and %s on SIGUSR1%s" % (
+            models[0][0], models[1][0],
+            " and every %d s" % config["ab_interval"] if config["ab_interval"] else ""))
+        return switcher
+
+    def attach_interval_controller(self):
+        config = self.config
+        controller = AdaptiveIntervalController(
+            self.pipeline.get_by_name("primary-inference"), self.probes.fps_meter, self.probes.input_rate,
+            floor=config["interval_floor"], ceiling=config["interval_ceiling"],
+            queues=find_queues(self.pipeline))
+        controller.attach()
+        print("Adapting inference interval between %d and %d to the frame rate of each source" % (
+            config["interval_floor"], config["interval_ceiling"]))
+        return controller
+
+    def watch_input_rates(self, sources):
+        for source in sources:
+            source_bin = self.pipeline.get_by_name(source.name)
+            if source_bin:
+                self.probes.watch_input_rate(source_bin, source.index)
+
+    def on_input_framerate(self, index, framerate):
+        # The push timeout was sized from guessed frame rates when the
+        # pipeline was composed
+        streammux = self.pipeline.get_by_name("Stream-muxer")
+        if not streammux.find_property("batched-push-timeout"):
+            return False
+        timeout = batched_push_timeout([rate for rate in self.probes.input_framerates.values() if rate])
+        if streammux.get_property("batched-push-timeout") != timeout:
+            print("Source %d runs at %.2f fps, batched-push-timeout now %d us" % (index, framerate, timeout))
+            streammux.set_property("batched-push-timeout", timeout)
+        return False
+
+    def attach_source_manager(self):
+        config = self.config
+        manager = SourceManager(self.pipeline, self.pipeline.get_by_name("Stream-muxer"),
+                                stall_timeout=config["stall_timeout"] / 1000.0,
+                                max_backoff=config["max_backoff"],
+                                on_source_added=self.on_source_added,
+                                cpu_stand_ins=config["cpu_stand_ins"])
+        if config["reconnect"]:
+            for source in self.builder.sources:
+                if is_network_source(source.path):
+                    manager.watch(source)
+            manager.attach()
+        return manager
+
+    def on_source_added(self, source, source_bin):
+        # Added at runtime or restarted: the new bin needs the per-source
+        # probes attached at startup
+        self.probes.count_stale_frames(self.pipeline, [source])
+        if self.latency_tracer:
+            self.trace_source(self.latency_tracer, source_bin)
+        self.watch_input_rates([source])
+        if source.capture_format:
+            self.probes.capture_formats[source.index] = source.capture_format
+
+    def find_source(self, index):
+        for source in self.builder.sources:
+            if source.index == index:
+                return source
+        raise ControlError("404 Not Found", "no source %d" % index)
+
+    def list_sources(self):
+        restarts = self.source_manager.restarts
+        return {
+            "capacity": batch_capacity(self.config),
+            "sources": [{"index": source.index, "uri": source.path, "restarts": restarts.get(source.index, 0)}
+                        for source in self.builder.sources],
+        }
+
+    def add_source(self, uri):
+        """
+        Add an input on the first free muxer pad, returns its index.
+        """
+        if "://" not in uri and not is_v4l2_device(uri):
+            raise ControlError("400 Bad Request", "expected a URI or a /dev/videoN device, got %s" % uri)
+        used = set(source.index for source in self.builder.sources)
+        free = [i for i in range(batch_capacity(self.config)) if i not in used]
+        if not free:
+            raise ControlError("409 Conflict", "all %d sources in use, see --max-sources" % len(used))
+        source = self.builder.source_spec(free[0], uri)
+        watch = self.config["reconnect"] and is_network_source(uri)
+        if not self.source_manager.add_source(source, watch):
+            raise ControlError("500 Internal Server Error", "unable to create source bin for %s" % uri)
+        self.builder.sources.append(source)
+        self.builder.sources.sort(key=lambda s: s.index)
+        print("Playing %s " % uri)
+        return source.index
+
+    def remove_source(self, index):
+        source = self.find_source(index)
+        self.source_manager.remove_source(source)
+        self.builder.sources.remove(source)
+        self.probes.capture_formats.pop(index, None)
+        self.probes.input_framerates.pop(index, None)
+        self.probes.input_ticks.discard(index)
+        self.probes.stale_frames.pop(index, None)
+        print("Removed source %d (%s)" % (index, source.path))
+
+    def start_exporter(self):
+        config = self.config
+        try:
+            sink = open_sink(config["export"])
+        except (IOError, OSError) as e:
+            sys.stderr.write(" Unable to open %s for metadata export: %s \n" % (config["export"], e))
+            return None
+        encode = encode_msgpack if config["export_format"] == "msgpack" else encode_jsonl
+        exporter = MetadataExporter(sink, encode)
+        exporter.start()
+        print("Exporting detections as %s to %s" % (config["export_format"], config["export"]))
+        return exporter
+
+    def load_analytics(self):
+        from ds_rtsp.analytics import load_analytics
+        config = self.config
+        # Boxes are in the muxer resolution
+        streammux = self.builder.trunk[0].specs[0]
+        try:
+            analytics = load_analytics(config["analytics"], streammux.get("width"), streammux.get("height"),
+                                       config["track_ttl"], config["max_tracks"], on_event=self.on_analytics_event)
+        except (IOError, OSError, ValueError, KeyError) as e:
+            sys.stderr.write(" Unable to load analytics from %s: %s \n" % (config["analytics"], e))
+            return None
+        print("Counting %d zones and %d lines from %s" % (
+            len(analytics.zones), len(analytics.lines), config["analytics"]))
+        return analytics
+
+    def on_analytics_event(self, event):
+        if self.exporter:
+            self.exporter.push_event(event)
+        if self.record_trigger:
+            self.record_trigger.on_event(event)
+
+    def attach_recorder(self):
+        from ds_rtsp.recorder import SmartRecorder
+        config = self.config
+        recorder = SmartRecorder(config["record_dir"], config["codec"], config["record_preroll"],
+                                 config["record_postroll"], config["record_max_mb"] << 20)
+        try:
+            if not recorder.attach(self.pipeline):
+                return None
+        except OSError as e:
+            sys.stderr.write(" Unable to record clips to %s: %s \n" % (config["record_dir"], e))
+            return None
+        print("Recording clips to %s on %s and SIGUSR2, with %d s before and %d s after" % (
+            config["record_dir"], ", ".join(config["record_on"]) or "nothing else",
+            config["record_preroll"], config["record_postroll"]))
+        if config["encode_on_demand"]:
+            print("WARNING: with --encode-on-demand, nothing is recorded while no RTSP client is connected")
+        return recorder
+
+    def attach_batch_consumers(self):
+        """
+        Metadata export, clip triggers and analytics share one extraction of
+        each batch. They need numpy, which is only imported when one of them
+        is asked for.
+        """
+        consumers = []
+        if self.config["export"]:
+            self.exporter = self.start_exporter()
+            if self.exporter:
+                consumers.append(self.exporter.consume)
+        if self.recorder and self.config["record_on"]:
+            from ds_rtsp.recorder import DetectionTrigger
+            self.record_trigger = DetectionTrigger(self.recorder, self.config["record_on"])
+            consumers.append(self.record_trigger.consume)
+        if self.config["analytics"]:
+            self.analytics = self.load_analytics()
+            if self.analytics:
+                consumers.append(self.analytics.update)
+                if self.builder.streams_rtsp():
+                    self.probes.overlays.append(self.analytics.draw)
+                GLib.timeout_add_seconds(5, self.print_analytics_summary)
+        if consumers:
+            from ds_rtsp.batch_arrays import BatchArrays
+            self.probes.attach_batch_consumers(self.pipeline, BatchArrays(), consumers)
+
+    def print_analytics_summary(self):
+        print("**********************ANALYTICS***********************************")
+        print(self.analytics.summary())
+        return True
+
+    def on_bus_message(self, bus, message):
+        # Source failures are handled by restarting the source, anything
+        # else ends the main loop as before
+        if self.source_manager and self.source_manager.handle_message(message):
+            return True
+        return bus_call(bus, message, self.loop)
+
+    def run(self):
+        config = self.config
+
+        # Standard GStreamer initialization
+        GObject.threads_init()
+        Gst.init(None)
+
+        self.pipeline = self.builder.build()
+        if not self.pipeline:
+            return 1
+        for source in self.builder.sources:
+            print("Playing %s " % source.path)
+        print("Stream muxer resolution %dx%d" % self.builder.mux_size)
+        self.apply_label_mode()
+        if not config["cpu_stand_ins"]:
+            self.probes.attach(self.pipeline)
+        self.probes.count_stale_frames(self.pipeline, self.builder.sources)
+        self.probes.on_input_framerate = self.on_input_framerate
+        self.watch_input_rates(self.builder.sources)
+        if config["record_dir"]:
+            self.recorder = self.attach_recorder()
+        if not config["cpu_stand_ins"]:
+            self.attach_batch_consumers()
+        for source in self.builder.sources:
+            if source.capture_format:
+                self.probes.capture_formats[source.index] = source.capture_format
+
+        # Create an event loop and feed GStreamer bus messages to it
+        self.loop = GObject.MainLoop()
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self.on_bus_message)
+        GLib.timeout_add_seconds(1, self.probes.fps_meter.publish)
+        GLib.timeout_add_seconds(5, self.probes.print_fps_summary)
+        if config["latency_trace"]:
+            self.latency_tracer = self.attach_latency_tracer()
+            GLib.timeout_add_seconds(5, self.print_latency_stats)
+
+        if config["reconnect"] or config["control_port"]:
+            self.source_manager = self.attach_source_manager()
+        if config["control_port"]:
+            self.control_server = ControlServer(self, config["control_port"])
+            self.control_server.start()
+        if config["ab_model"]:
+            self.model_switcher = self.attach_model_switcher()
+        if config["adaptive_interval"]:
+            self.interval_controller = self.attach_interval_controller()
+
+        # Start RTSP streaming
+        if self.builder.streams_rtsp():
+            self.start_rtsp_server()
+        if config["metrics_port"]:
+            self.start_metrics_server(bus)
+
+        # Start playback and listen to events
+        print("Starting pipeline")
+        started = time.time()
+        self.pipeline.set_state(Gst.State.PLAYING)
+        if config["model"]:
+            # nvinfer builds a missing engine while starting, under a name of
+            # its own
+            pgie = self.pipeline.get_by_name("primary-inference")
+            if pgie:
+                keep_built_engine(pgie.get_property("config-file-path"), started)
+        try:
+            self.loop.run()
+        except:
+            pass
+
+        self.pipeline.set_state(Gst.State.NULL)
+        if self.exporter:
+            self.exporter.stop()
+        if self.recorder:
+            self.recorder.stop()
+        if self.analytics:
+            self.print_analytics_summary()
+        if self.latency_tracer:
+            self.print_latency_stats()
+        if self.model_switcher:
+            self.model_switcher.account()
+            print(self.model_switcher.summary())
+        return 0
+
+
+def parse_queues(value):
+    boundaries = [b.strip() for b in value.split(",") if b.strip()]
+    for boundary in boundaries:
+        if boundary not in QUEUE_BOUNDARIES:
+            raise argparse.ArgumentTypeError("unknown boundary %s, choose from %s" % (
+                boundary, ",".join(QUEUE_BOUNDARIES)))
+    return dict((boundary, {}) for boundary in boundaries)
+
+
+def parse_mux_size(value):
+    try:
+        return parse_size(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected WIDTHxHEIGHT, got %s" % value)
+
+
+def parse_source_scale(value):
+    index, _, size = value.partition("=")
+    parse_mux_size(size)
+    return index, size
+
+
+def parse_args(argv, description='RTSP Output Sample Application Help ', input_help=None, defaults=None):
+    """
+    Return (config, print_pipeline) for the command line `argv`. The config
+    is DEFAULT_CONFIG updated from `defaults` (per script settings), then
+    from the --config JSON file, then from the options.
+    """
+    # --config is read first so that its values become the option defaults
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument("--config")
+    known, _ = pre.parse_known_args(argv)
+    config = load_config(known.config, defaults)
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--config",
+                        help="JSON file with pipeline settings (see ds_rtsp/config.py), options given "
+                             "on the command line take precedence")
+    parser.add_argument("-i", "--input", action="append", dest="inputs",
+                        help=input_help or "URI to input (RTSP or file), repeat for multiple sources. "
+                                           "Webcam devices (/dev/videoN) are also accepted")
+    parser.add_argument("-m", "--model", choices=list(MODEL_PROFILES),
+                        help="Model profile to run instead of the one in the infer config, "
+                             "see MODEL_PROFILES in ds_rtsp/models.py")
+    parser.add_argument("--ab-model", choices=list(MODEL_PROFILES),
+                        help="Model profile to swap in and out at runtime on SIGUSR1, "
+                             "its engine must have been built before")
+    parser.add_argument("--ab-interval", type=int,
+                        help="Also swap to --ab-model and back every this many seconds, default=0 (SIGUSR1 only)")
+    parser.add_argument("--engine-cache", nargs="?", const=DEFAULT_CACHE_DIR,
+                        help="Keep TensorRT engines in this directory, keyed by model, batch size, precision "
+                             "and TensorRT version, default=%s when given without a value" % DEFAULT_CACHE_DIR)
+    parser.add_argument("--adaptive-interval", action="store_true",
+                        help="Skip more or fewer frames between inferences depending on whether the pipeline "
+                             "keeps up with the sources, the tracker fills in the skipped frames")
+    parser.add_argument("--interval-floor", type=int,
+                        help="Smallest inference interval with --adaptive-interval, default=0")
+    parser.add_argument("--interval-ceiling", type=int,
+                        help="Largest inference interval with --adaptive-interval, default=4")
+    parser.add_argument("--mux-size", type=parse_mux_size,
+                        help="Resolution of the batched frames as WIDTHxHEIGHT, default: the largest input, "
+                             "scaled down to the model input with -o metadata-only")
+    parser.add_argument("--mux-padding", action="store_true",
+                        help="Keep the aspect ratio of inputs that differ from the muxer resolution by padding")
+    parser.add_argument("--source-scale", action="append", type=parse_source_scale,
+                        help="Scale one input in its source bin before the muxer, as INDEX=WIDTHxHEIGHT "
+                             "(e.g. 0=1280x720), repeat for several inputs")
+    parser.add_argument("--capture-format", choices=['auto', 'yuy2', 'mjpeg', 'nv12'],
+                        help="Webcam capture format. auto probes the device and picks the cheapest one it "
+                             "offers at 30 fps: nv12, then yuy2, then mjpeg (hardware decoded), default=auto")
+    parser.add_argument("--live", action="store_true",
+                        help="Keep at most one pending frame per source and drop stale ones, so the output "
+                             "always shows the latest scene. Dropped frames are reported per stream")
+    parser.add_argument("--rtsp-latency", type=int,
+                        help="With --live, RTSP packets later than this many ms are dropped, default=200")
+    parser.add_argument("--reconnect", action="store_true",
+                        help="Restart RTSP/HTTP inputs that fail or stall, with exponential backoff, "
+                             "instead of stopping the application")
+    parser.add_argument("--stall-timeout", type=int,
+                        help="With --reconnect, restart an input that produced no frames for this many ms, "
+                             "default=5000")
+    parser.add_argument("--max-backoff", type=int,
+                        help="With --reconnect, longest wait between restarts in seconds, default=60")
+    parser.add_argument("--max-sources", type=int,
+                        help="Batch size to build the pipeline for, so that inputs can be added at runtime "
+                             "up to this many, default: the number of inputs")
+    parser.add_argument("--control-port", type=int,
+                        help="Serve an HTTP API on 127.0.0.1 at this port to list (GET /sources), add "
+                             "(POST /sources {\"uri\": ...}) and remove (DELETE /sources/N) inputs at runtime, "
+                             "default=0 (disabled)")
+    parser.add_argument("--queues", type=parse_queues,
+                        help="Comma separated stage boundaries to put a queue (and a new streaming thread) at, "
+                             "from %s. Per boundary settings can be given in the --config file" %
+                             ",".join(QUEUE_BOUNDARIES))
+    parser.add_argument("--queue-size", type=int,
+                        help="max-size-buffers of the queues, default=%d" % DEFAULT_QUEUE_POLICY["max-size-buffers"])
+    parser.add_argument("--queue-leaky", choices=['no', 'upstream', 'downstream'],
+                        help="Whether full queues drop buffers (upstream: new ones, downstream: old ones), default=no")
+    parser.add_argument("-c", "--codec",
+                        help="RTSP Streaming Codec H264/H265 , default=H264", choices=['H264', 'H265'])
+    parser.add_argument("-b", "--bitrate",
+                        help="Set the encoding bitrate ", type=int)
+    parser.add_argument("-o", "--output",
+                        help="rtsp renders and streams the video, metadata-only stops after the tracker, "
+                             "default=rtsp", choices=['rtsp', 'metadata-only', 'both'])
+    parser.add_argument("--rtsp-transport",
+                        help="How encoded RTP reaches the RTSP server: udp multicast loopback or in-process appsrc, "
+                             "default=udp", choices=['udp', 'appsrc'])
+    parser.add_argument("--encode-on-demand", action="store_true",
+                        help="Only render and encode while an RTSP client is connected")
+    parser.add_argument("--latency-trace", action="store_true",
+                        help="Measure per-element latency and log p50/p95/p99 every 5 seconds")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics on this port at /metrics, default=0 (disabled)")
+    parser.add_argument("--export",
+                        help="Write the detections of every frame (class, confidence, bbox, track id, source, PTS) "
+                             "to this file, or to a Unix socket given as unix:PATH")
+    parser.add_argument("--export-format", choices=list(EXPORT_FORMATS),
+                        help="Record format of --export: JSON Lines or a MessagePack stream, default=jsonl")
+    parser.add_argument("--analytics",
+                        help="JSON file with zones (polygons) and lines to count tracked objects in and across, "
+                             "in muxer resolution coordinates, see load_analytics() in ds_rtsp/analytics.py")
+    parser.add_argument("--track-ttl", type=int,
+                        help="With --analytics, forget a track after it was not seen for this many frames, "
+                             "default=150")
+    parser.add_argument("--max-tracks", type=int,
+                        help="With --analytics, most tracks kept at once; at the cap the least recently seen "
+                             "track is dropped, default=4096")
+    parser.add_argument("--record-dir",
+                        help="Keep the last seconds of encoded video in memory and write MP4 clips to this "
+                             "directory on --record-on events and on SIGUSR2, without encoding again")
+    parser.add_argument("--record-on", action="append",
+                        help="With --record-dir, record when an object with this label is detected, or on "
+                             "events of the --analytics zone or line with this name. Repeat for several")
+    parser.add_argument("--record-preroll", type=int,
+                        help="Seconds of video before the event in each clip, default=5")
+    parser.add_argument("--record-postroll", type=int,
+                        help="Seconds of video after the last event in each clip, default=5")
+    parser.add_argument("--record-max-mb", type=int,
+                        help="Most encoded video kept in memory for the pre-roll, in MB, default=32")
+    parser.add_argument("--label-mode",
+                        help="Object text on the OSD, default=label", choices=['label', 'label+id', 'none'])
+    parser.add_argument("--cpu-stand-ins", action="store_true",
+                        help="Replace DeepStream elements with CPU ones, for testing without a GPU")
+    parser.add_argument("--print-pipeline", action="store_true",
+                        help="Print the equivalent gst-launch-1.0 pipeline and exit")
+    parser.set_defaults(**config)
+    # -i, --source-scale and --record-on replace the values of the config
+    # file instead of appending to them
+    parser.set_defaults(inputs=None, source_scale=None, record_on=None)
+    if not argv:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+    args = vars(parser.parse_args(argv))
+    print_pipeline = args.pop("print_pipeline")
+    args.pop("config")
+    mux = args.pop("mux_size")
+    if mux:
+        args["mux_width"], args["mux_height"] = mux
+    if args["source_scale"] is None:
+        args.pop("source_scale")
+    else:
+        args["source_scale"] = dict(args["source_scale"])
+    if args["inputs"] is None:
+        args.pop("inputs")
+    if args["record_on"] is None:
+        args.pop("record_on")
+    config.update(args)
+    if not config["inputs"]:
+        parser.error("at least one input is required")
+    if config["export"] and config["export_format"] == "msgpack" and msgpack is None:
+        parser.error("--export-format msgpack needs the msgpack package (pip3 install msgpack)")
+    if (config["export"] or config["analytics"] or config["record_dir"]) and not importlib.util.find_spec("numpy"):
+        parser.error("--export, --analytics and --record-dir need numpy (pip3 install numpy)")
+    return config, print_pipeline
+
+
+def run(argv, **kwargs):
+    config, print_pipeline = parse_args(argv, **kwargs)
+    if print_pipeline:
+        print("gst-launch-1.0 " + PipelineBuilder(config).describe())
+        return 0
+    if config["engine_cache"]:
+        # Build missing engines before the pipeline, so that nvinfer only
+        # ever loads them
+        models = [config["model"]] + ([config["ab_model"]] if config["ab_model"] else [])
+        for model in models:
+            model_infer_config(config, model, batch_capacity(config), build=True)
+    return Application(config).run()
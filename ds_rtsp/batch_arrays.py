@@ -0,0 +1,126 @@
+import numpy as np
+
+try:
+    import pyds
+except ImportError:
+    # Pass ds_rtsp.fake_pyds to BatchArrays to run without DeepStream
+    pyds = None
+
+# NvDsObjectMeta.object_id of objects the tracker did not (yet) track
+UNTRACKED_OBJECT_ID = 0xffffffffffffffff
+
+# One row per object of the batch
+OBJECT_DTYPE = np.dtype([
+    ("source_id", np.uint32),
+    ("class_id", np.int32),
+    ("confidence", np.float32),
+    ("bbox", np.float32, (4,)),     # left, top, width, height
+    ("track_id", np.uint64),
+])
+
+# One row per frame; its objects are objects[first:first + num_objects]
+FRAME_DTYPE = np.dtype([
+    ("source_id", np.uint32),
+    ("frame_num", np.int64),
+    ("pts", np.uint64),
+    ("first", np.int64),
+    ("num_objects", np.int64),
+])
+
+
+class BatchArrays:
+    """
+    The objects of a batch in preallocated structured arrays, so that
+    analytics on them (counting, zone checks, filtering) run vectorized
+    instead of walking obj_meta_list per object.
+
+    extract() is the only per-object Python loop. It reads each field of
+    NvDsObjectMeta once and stores them with one assignment per column.
+    The arrays are reused across batches and only grow, doubling, when a
+    batch has more frames or objects than ever before. The views returned
+    by frames() and objects() are overwritten by the next extract(): copy
+    what has to outlive the batch.
+
+    `pyds_module` is the pyds API to read the metadata with: the real
+    bindings by default, or ds_rtsp.fake_pyds.
+    """
+
+    def __init__(self, object_capacity=256, frame_capacity=16, pyds_module=None):
+        self.pyds = pyds_module or pyds
+        self.object_rows = np.zeros(object_capacity, OBJECT_DTYPE)
+        self.frame_rows = np.zeros(frame_capacity, FRAME_DTYPE)
+        self.num_objects = 0
+        self.num_frames = 0
+        # class_id -> label, obj_label is only read for unseen classes
+        self.labels = {}
+
+    def extract(self, batch_meta):
+        ds = self.pyds
+        labels = self.labels
+        frames = []
+        # One list per column: numpy converts a list of numbers much faster
+        # than a list of row tuples into a structured array
+        source_ids, class_ids, confidences, bboxes, track_ids = [], [], [], [], []
+        l_frame = batch_meta.frame_meta_list
+        while l_frame is not None:
+            frame_meta = ds.NvDsFrameMeta.cast(l_frame.data)
+            source_id = frame_meta.source_id
+            first = len(class_ids)
+            l_obj = frame_meta.obj_meta_list
+            while l_obj is not None:
+                obj_meta = ds.NvDsObjectMeta.cast(l_obj.data)
+                class_id = obj_meta.class_id
+                if class_id not in labels:
+                    labels[class_id] = obj_meta.obj_label
+                rect = obj_meta.rect_params
+                source_ids.append(source_id)
+                class_ids.append(class_id)
+                confidences.append(obj_meta.confidence)
+                bboxes.extend((rect.left, rect.top, rect.width, rect.height))
+                track_ids.append(obj_meta.object_id)
+                l_obj = l_obj.next
+            frames.append((source_id, frame_meta.frame_num, frame_meta.buf_pts, first, len(class_ids) - first))
+            l_frame = l_frame.next
+
+        num_objects = len(class_ids)
+        if num_objects > len(self.object_rows):
+            self.object_rows = np.zeros(grown(len(self.object_rows), num_objects), OBJECT_DTYPE)
+        if len(frames) > len(self.frame_rows):
+            self.frame_rows = np.zeros(grown(len(self.frame_rows), len(frames)), FRAME_DTYPE)
+        rows = self.object_rows[:num_objects]
+        rows["source_id"] = source_ids
+        rows["class_id"] = class_ids
+        rows["confidence"] = confidences
+        rows["bbox"] = np.array(bboxes, np.float32).reshape(num_objects, 4)
+        rows["track_id"] = np.array(track_ids, np.uint64)
+        self.frame_rows[:len(frames)] = frames
+        self.num_objects = num_objects
+        self.num_frames = len(frames)
+        return self
+
+    def objects(self):
+        return self.object_rows[:self.num_objects]
+
+    def frames(self):
+        return self.frame_rows[:self.num_frames]
+
+    def frame_objects(self, frame_index):
+        frame = self.frame_rows[frame_index]
+        return self.object_rows[frame["first"]:frame["first"] + frame["num_objects"]]
+
+    def counts(self, num_sources, num_classes):
+        """
+        Objects per (source, class) in the batch, as a num_sources x
+        num_classes array. Classes outside the range are not counted.
+        """
+        objects = self.objects()
+        known = (objects["class_id"] >= 0) & (objects["class_id"] < num_classes) & \
+                (objects["source_id"] < num_sources)
+        flat = objects["source_id"][known].astype(np.int64) * num_classes + objects["class_id"][known]
+        return np.bincount(flat, minlength=num_sources * num_classes).reshape(num_sources, num_classes)
+
+
+def grown(capacity, needed):
+    while capacity < needed:
+        capacity *= 2
+    return capacity
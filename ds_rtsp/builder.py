@@ -0,0 +1,147 @@
+import sys
+import gi
+
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from ds_rtsp.elements import ElementSpec, build_chain, describe_chain
+from ds_rtsp.sources import SourceSpec, parse_size
+from ds_rtsp.stages import (mux_stage, inference_stage, tracker_stage, rtsp_stage, metadata_stage, queue_policy,
+                            batch_capacity, mux_size, write_infer_configs)
+
+
+class PipelineBuilder:
+    """
+    Composes the pipeline from a config dict (see DEFAULT_CONFIG):
+
+        sources -> mux -> inference -> tracker -> [tee ->] rtsp and/or metadata
+
+    with queues at the boundaries listed in config["queues"] (see
+    QUEUE_BOUNDARIES), each starting a streaming thread of its own.
+
+    compose() only produces element specs and writes no files, so the same
+    composition can be instantiated with build() or printed as a
+    gst-launch-1.0 description with describe(). build() writes the
+    generated infer config the specs name. With cpu_stand_ins set, DeepStream elements are replaced
+    by plain GStreamer ones (see CPU_STAND_INS) for testing without a GPU.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.cpu_stand_ins = config["cpu_stand_ins"]
+        self.sources = []
+        self.mux_size = None
+        self.trunk = []
+        self.branches = []
+        self.pipeline = None
+        self.compose()
+
+    def compose(self):
+        config = self.config
+        self.sources = [self.source_spec(i, path) for i, path in enumerate(config["inputs"])]
+        self.mux_size = mux_size(config, self.sources)
+        if self.cpu_stand_ins:
+            for source in self.sources:
+                source.fit(self.mux_size)
+        batch_size = batch_capacity(config)
+        self.trunk = [
+            mux_stage(config, self.sources, self.mux_size),
+            inference_stage(config, batch_size),
+            tracker_stage(config),
+        ]
+        # Output branches after the tracker: the rendered RTSP stream and/or
+        # a metadata sink that only terminates the pipeline. metadata-only
+        # skips OSD, both colour conversions and encoding altogether.
+        self.branches = []
+        if self.streams_rtsp():
+            self.branches.append(rtsp_stage(config, batch_size))
+        if config["output"] in ("metadata-only", "both"):
+            self.branches.append(metadata_stage(config))
+
+    def source_spec(self, index, path):
+        config = self.config
+        source = SourceSpec(index, path, queue_policy(config, "source"), config["live"], config["rtsp_latency"],
+                            config["capture_format"], source_scale(config, index, path))
+        if self.cpu_stand_ins and self.mux_size:
+            # Added at runtime, the muxer size is known
+            source.fit(self.mux_size)
+        return source
+
+    def streams_rtsp(self):
+        return self.config["output"] in ("rtsp", "both")
+
+    def trunk_specs(self):
+        return [spec for stage in self.trunk for spec in stage.specs]
+
+    def branch_heads(self):
+        """
+        Specs inserted in front of each branch: a queue per branch behind a
+        tee when there is more than one.
+        """
+        if len(self.branches) < 2:
+            return [[] for _ in self.branches]
+        return [[ElementSpec("queue", "output-queue-%d" % i)] for i in range(len(self.branches))]
+
+    def describe(self):
+        """
+        The composed pipeline as a gst-launch-1.0 description.
+        """
+        trunk = describe_chain(self.trunk_specs(), self.cpu_stand_ins)
+        heads = self.branch_heads()
+        if len(self.branches) > 1:
+            parts = [trunk + " ! tee name=output-tee"]
+            for head, branch in zip(heads, self.branches):
+                parts.append("output-tee. ! " + describe_chain(head + branch.specs, self.cpu_stand_ins))
+        else:
+            parts = [" ! ".join([trunk] + [describe_chain(b.specs, self.cpu_stand_ins) for b in self.branches])]
+        mux_name = self.trunk[0].specs[0].name
+        for source in self.sources:
+            parts.append("%s ! %s.sink_%d" % (source.describe(self.cpu_stand_ins), mux_name, source.index))
+        return " \\\n  ".join(parts)
+
+    def build(self):
+        write_infer_configs(self.config, batch_capacity(self.config))
+        print("Creating Pipeline")
+        pipeline = Gst.Pipeline()
+        if not pipeline:
+            sys.stderr.write(" Unable to create Pipeline \n")
+            return None
+
+        trunk = build_chain(self.trunk_specs(), pipeline, self.cpu_stand_ins)
+        streammux = trunk[0]
+
+        # One source bin per input, each feeding its own streammux sink pad
+        for source in self.sources:
+            source_bin = source.build(self.cpu_stand_ins)
+            if not source_bin:
+                sys.stderr.write(" Unable to create source bin \n")
+                continue
+            pipeline.add(source_bin)
+            sinkpad = streammux.get_request_pad("sink_%u" % source.index)
+            if not sinkpad:
+                sys.stderr.write(" Unable to get the sink pad of streammux \n")
+                continue
+            source_bin.get_static_pad("src").link(sinkpad)
+
+        tail = trunk[-1]
+        if len(self.branches) > 1:
+            tee = ElementSpec("tee", "output-tee").build()
+            pipeline.add(tee)
+            tail.link(tee)
+            tail = tee
+        for head, branch in zip(self.branch_heads(), self.branches):
+            elements = build_chain(head + branch.specs, pipeline, self.cpu_stand_ins)
+            if not tail.link(elements[0]):
+                sys.stderr.write(" Unable to link %s to %s \n" % (tail.get_name(), elements[0].get_name()))
+
+        self.pipeline = pipeline
+        return pipeline
+
+
+def source_scale(config, index, path):
+    """
+    Size a source is scaled to in its source bin, from config["source_scale"]
+    keyed by input index or path. None leaves scaling to the muxer.
+    """
+    scale = config["source_scale"].get(str(index)) or config["source_scale"].get(path)
+    return parse_size(scale) if scale else None
@@ -0,0 +1,81 @@
+import copy
+import json
+
+# Everything the pipeline builder needs to know. Command line options
+# override these, keys match the argparse destinations.
+DEFAULT_CONFIG = {
+    "inputs": [],
+    "pgie_config": "dstest1_pgie_config.txt",
+    "model": None,
+    "ab_model": None,
+    "ab_interval": 0,
+    "engine_cache": None,
+    "adaptive_interval": False,
+    "interval_floor": 0,
+    "interval_ceiling": 4,
+    "tracker_config": "dstest2_tracker_config.txt",
+    "mux_width": None,
+    "mux_height": None,
+    "mux_padding": False,
+    "source_scale": {},
+    "tiler_width": 1280,
+    "tiler_height": 720,
+    "capture_format": "auto",
+    "live": False,
+    "rtsp_latency": 200,
+    "reconnect": False,
+    "stall_timeout": 5000,
+    "max_backoff": 60,
+    "max_sources": None,
+    "control_port": 0,
+    "queues": {},
+    "queue_size": None,
+    "queue_leaky": None,
+    "codec": "H264",
+    "bitrate": 4000000,
+    "output": "rtsp",
+    "rtsp_transport": "udp",
+    "rtsp_port": 8555,
+    "rtsp_mount": "/ds-test",
+    "udp_port": 5400,
+    "encode_on_demand": False,
+    "label_mode": "label",
+    "fps_label": "FPS",
+    "latency_trace": False,
+    "metrics_port": 0,
+    "export": None,
+    "export_format": "jsonl",
+    "analytics": None,
+    "track_ttl": 150,
+    "max_tracks": 4096,
+    "record_dir": None,
+    "record_on": [],
+    "record_preroll": 5,
+    "record_postroll": 5,
+    "record_max_mb": 32,
+    "cpu_stand_ins": False,
+}
+
+
+def merge_config(base, overrides):
+    """
+    Return a copy of `base` with the keys of `overrides` applied. Keys that
+    are not in DEFAULT_CONFIG are rejected, to catch typos in config files.
+    """
+    config = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if key not in DEFAULT_CONFIG:
+            raise KeyError("Unknown config key: %s" % key)
+        config[key] = value
+    return config
+
+
+def load_config(path=None, defaults=None):
+    """
+    DEFAULT_CONFIG, updated from `defaults` and then from a JSON file.
+    """
+    config = merge_config(DEFAULT_CONFIG, defaults or {})
+    if path:
+        with open(path) as f:
+            config = merge_config(config, json.load(f))
+    return config
@@ -0,0 +1,82 @@
+import json
+import gi
+
+gi.require_version('Gio', '2.0')
+from gi.repository import Gio
+
+from ds_rtsp.metrics import HttpRequest
+
+
+class ControlError(Exception):
+    """
+    A request the control API refuses, with the HTTP status to answer.
+    """
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class ControlServer:
+    """
+    Local HTTP API to add and remove sources while the pipeline runs:
+
+        GET    /sources           list the sources and free slots
+        POST   /sources           add {"uri": "rtsp://..."}, answers its index
+        DELETE /sources/<index>   remove a source
+
+    Like MetricsServer, connections are accepted by a Gio.SocketService on
+    the GLib main loop and read asynchronously by HttpRequest, so
+    `controller` (the Application) changes the pipeline from the main
+    thread. It is bound to localhost only.
+    """
+
+    def __init__(self, controller, port):
+        self.controller = controller
+        self.port = port
+        self.service = Gio.SocketService.new()
+        self.service.add_address(
+            Gio.InetSocketAddress.new_from_string("127.0.0.1", port),
+            Gio.SocketType.STREAM, Gio.SocketProtocol.TCP, None)
+        self.service.connect("incoming", self.on_incoming)
+
+    def start(self):
+        self.service.start()
+        print("Serving source control at http://127.0.0.1:%d/sources" % self.port)
+
+    def stop(self):
+        self.service.stop()
+
+    def dispatch(self, method, path, body):
+        parts = [part for part in path.split("/") if part]
+        if not parts or parts[0] != "sources" or len(parts) > 2:
+            raise ControlError("404 Not Found", "not found")
+        if len(parts) == 1 and method == "GET":
+            return "200 OK", self.controller.list_sources()
+        if len(parts) == 1 and method == "POST":
+            try:
+                uri = json.loads(body.decode("utf-8"))["uri"]
+            except (ValueError, KeyError, TypeError):
+                raise ControlError("400 Bad Request", 'expected {"uri": "..."}')
+            if not isinstance(uri, str):
+                raise ControlError("400 Bad Request", 'expected {"uri": "..."}, got %s' % json.dumps(uri))
+            return "201 Created", {"index": self.controller.add_source(uri)}
+        if len(parts) == 2 and method == "DELETE":
+            try:
+                index = int(parts[1])
+            except ValueError:
+                raise ControlError("404 Not Found", "no source %s" % parts[1])
+            self.controller.remove_source(index)
+            return "200 OK", {"index": index}
+        raise ControlError("405 Method Not Allowed", "%s not allowed on %s" % (method, path))
+
+    def on_incoming(self, service, connection, source_object):
+        HttpRequest(connection, self.handle, "Control").read()
+        return True
+
+    def handle(self, method, path, body):
+        try:
+            status, reply = self.dispatch(method, path, body)
+        except ControlError as e:
+            status, reply = e.status, {"error": str(e)}
+        return status, "application/json", (json.dumps(reply, sort_keys=True) + "\n").encode("utf-8")
@@ -0,0 +1,129 @@
+import sys
+import gi
+
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# CPU elements standing in for the DeepStream ones, so that a composed
+# pipeline can be launched and benchmarked on a machine without a GPU.
+# nvstreammux becomes a funnel: same request pads, no batching and no
+# scaling. A stand-in can be a chain of elements, built as one bin.
+CPU_STAND_INS = {
+    "nvvideoconvert": "videoconvert ! videoscale",
+    "nvstreammux": "funnel",
+    "nvinfer": "identity",
+    "nvtracker": "identity",
+    "nvmultistreamtiler": "identity",
+    "nvdsosd": "identity",
+    "nvv4l2decoder": "decodebin",
+    "nvv4l2h264enc": "x264enc",
+    "nvv4l2h265enc": "x265enc",
+}
+
+
+class ElementSpec:
+    """
+    Declarative description of one element: factory, name and properties in
+    the order they are applied. A spec can be instantiated with build() or
+    rendered as a gst-launch fragment with describe().
+    """
+    __slots__ = ('factory', 'name', 'properties')
+
+    def __init__(self, factory, name, properties=None):
+        self.factory = factory
+        self.name = name
+        self.properties = list(properties.items()) if properties else []
+
+    def set(self, key, value):
+        self.properties = [(k, v) for k, v in self.properties if k != key]
+        self.properties.append((key, value))
+        return self
+
+    def get(self, key, default=None):
+        for k, v in self.properties:
+            if k == key:
+                return v
+        return default
+
+    def resolve(self, cpu_stand_ins=False):
+        """
+        Return (factory, properties) to use, replacing DeepStream elements
+        and NVMM caps when running on CPU stand-ins. Properties of replaced
+        elements are dropped, they only make sense on the real element.
+        """
+        if not cpu_stand_ins:
+            return self.factory, self.properties
+        factory = CPU_STAND_INS.get(self.factory)
+        if factory:
+            return factory, []
+        properties = []
+        for key, value in self.properties:
+            if key == "caps" and isinstance(value, str):
+                value = value.replace("(memory:NVMM)", "")
+            properties.append((key, value))
+        return self.factory, properties
+
+    def build(self, cpu_stand_ins=False):
+        factory, properties = self.resolve(cpu_stand_ins)
+        if "!" in factory:
+            element = Gst.parse_bin_from_description(factory, True)
+            element.set_name(self.name)
+        else:
+            element = Gst.ElementFactory.make(factory, self.name)
+        if not element:
+            sys.stderr.write(" Unable to create %s \n" % factory)
+            return None
+        for key, value in properties:
+            if key == "caps" and isinstance(value, str):
+                element.set_property(key, Gst.Caps.from_string(value))
+            elif isinstance(value, str):
+                # Lets enums and flags be given by nick, as in gst-launch
+                Gst.util_set_object_arg(element, key, value)
+            else:
+                element.set_property(key, value)
+        return element
+
+    def describe(self, cpu_stand_ins=False):
+        factory, properties = self.resolve(cpu_stand_ins)
+        parts = [factory, "name=%s" % self.name]
+        for key, value in properties:
+            parts.append("%s=%s" % (key, format_launch_value(value)))
+        return " ".join(parts)
+
+
+def queue_spec(name, policy):
+    """
+    A queue starting a new streaming thread, with `policy` as its properties
+    (max-size-buffers/bytes/time, leaky).
+    """
+    return ElementSpec("queue", name, policy)
+
+
+def format_launch_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        if any(c in value for c in ' ,;()"=!'):
+            return '"%s"' % value.replace('"', '\\"')
+        return value
+    return str(value)
+
+
+def build_chain(specs, container, cpu_stand_ins=False):
+    """
+    Build the specs, add them to `container` (a pipeline or bin) and link
+    them in order. Returns the elements.
+    """
+    elements = []
+    for spec in specs:
+        element = spec.build(cpu_stand_ins)
+        container.add(element)
+        elements.append(element)
+    for upstream, downstream in zip(elements, elements[1:]):
+        if not upstream.link(downstream):
+            sys.stderr.write(" Unable to link %s to %s \n" % (upstream.get_name(), downstream.get_name()))
+    return elements
+
+
+def describe_chain(specs, cpu_stand_ins=False):
+    return " ! ".join(spec.describe(cpu_stand_ins) for spec in specs)
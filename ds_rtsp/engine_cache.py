@@ -0,0 +1,322 @@
+import argparse
+import configparser
+import glob
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import time
+
+from ds_rtsp.models import (MODEL_PROFILES, NETWORK_MODES, write_infer_config, read_infer_config, infer_engine_path,
+                            find_built_engine)
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/ds_rtsp/engines")
+
+TRT_VERSION_HEADERS = (
+    "/usr/include/aarch64-linux-gnu/NvInferVersion.h",
+    "/usr/include/x86_64-linux-gnu/NvInferVersion.h",
+)
+
+
+def tensorrt_version():
+    try:
+        import tensorrt
+        return tensorrt.__version__
+    except ImportError:
+        pass
+    for header in TRT_VERSION_HEADERS:
+        if not os.path.exists(header):
+            continue
+        with open(header) as f:
+            defines = dict(re.findall(r"#define NV_TENSORRT_(MAJOR|MINOR|PATCH) (\d+)", f.read()))
+        if len(defines) == 3:
+            return "%s.%s.%s" % (defines["MAJOR"], defines["MINOR"], defines["PATCH"])
+    return "unknown"
+
+
+def platform_tag():
+    """
+    Engines are only valid for the GPU and TensorRT version they were built
+    with.
+    """
+    return "%s-trt%s" % (platform.machine(), tensorrt_version())
+
+
+def engine_batch_size(path):
+    """
+    Batch size encoded in an engine file name by nvinfer
+    (model_b1_gpu0_fp32.engine), or None.
+    """
+    match = re.search(r"_b(\d+)_", os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+
+def engine_precision(path):
+    """
+    Precision encoded in an engine file name (model_b1_gpu0_fp16.engine), or
+    None.
+    """
+    match = re.search(r"_(fp32|fp16|int8)\.engine$", os.path.basename(path))
+    return match.group(1) if match else None
+
+
+class GstEngineBuilder:
+    """
+    Builds an engine by running nvinfer once on a test frame with the infer
+    config, the same way the pipeline would at startup, and moving the
+    engine nvinfer serializes into place.
+    """
+
+    def __init__(self, width=1280, height=720, timeout=3600):
+        self.width = width
+        self.height = height
+        self.timeout = timeout
+
+    @staticmethod
+    def adoptable(infer_config, batch_size):
+        """
+        The engine an infer config already names, if it can only have been
+        built from its current ONNX file at `batch_size` and its precision:
+        the file names batch size and precision, and it is newer than the
+        ONNX file. Else None.
+        """
+        existing = infer_engine_path(infer_config)
+        if not existing or not os.path.exists(existing):
+            return None
+        properties = read_infer_config(infer_config)
+        onnx_path = os.path.join(os.path.dirname(os.path.abspath(infer_config)), properties.get("onnx-file", ""))
+        if not os.path.isfile(onnx_path) or os.path.getmtime(existing) <= os.path.getmtime(onnx_path):
+            return None
+        if engine_batch_size(existing) != batch_size or \
+                engine_precision(existing) != precision_name(properties.get("network-mode", "0")):
+            return None
+        return existing
+
+    def __call__(self, infer_config, batch_size, engine_path):
+        existing = self.adoptable(infer_config, batch_size)
+        if existing:
+            # Adopt an engine nvinfer built before the cache was used
+            print("Copying %s into the engine cache" % existing)
+            shutil.copy(existing, engine_path)
+            return True
+
+        import gi
+        gi.require_version('Gst', '1.0')
+        from gi.repository import Gst
+        Gst.init(None)
+
+        # nvinfer would load a stale engine the config names instead of
+        # building one; point it at the cache entry, which does not exist yet
+        build_config = os.path.splitext(infer_config)[0] + "_build.txt"
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(infer_config)
+        parser.set("property", "model-engine-file", engine_path)
+        with open(build_config, "w") as f:
+            parser.write(f, space_around_delimiters=False)
+
+        started = time.time()
+        try:
+            pipeline = Gst.parse_launch(
+                "videotestsrc num-buffers=1 ! nvvideoconvert ! video/x-raw(memory:NVMM),format=NV12 ! "
+                "m.sink_0 nvstreammux name=m batch-size=%d width=%d height=%d ! "
+                "nvinfer config-file-path=%s batch-size=%d ! fakesink" % (
+                    batch_size, self.width, self.height, os.path.abspath(build_config), batch_size))
+            pipeline.set_state(Gst.State.PLAYING)
+            message = pipeline.get_bus().timed_pop_filtered(
+                self.timeout * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+            pipeline.set_state(Gst.State.NULL)
+        finally:
+            os.remove(build_config)
+        if message and message.type == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            sys.stderr.write("Engine build failed: %s: %s\n" % (err, debug))
+
+        built = find_built_engine(infer_config, started)
+        if not built:
+            return False
+        shutil.move(built, engine_path)
+        return True
+
+
+class EngineCache:
+    """
+    TensorRT engines keyed by (ONNX sha256, batch size, precision, platform).
+
+    Each engine is stored with a JSON sidecar holding its key and size. An
+    entry whose sidecar does not match the request, or whose engine file
+    was truncated, is treated as missing instead of being handed to nvinfer,
+    which would otherwise silently rebuild it at startup.
+
+    `builder` is called as builder(infer_config, batch_size, engine_path) on
+    a miss and returns whether it wrote the engine; a stub can record the
+    calls instead of building.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, builder=None, platform=None):
+        # Absolute, nvinfer resolves relative engine paths from the config
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.builder = builder or GstEngineBuilder()
+        self.platform = platform or platform_tag()
+        self.hashes = {}
+
+    def onnx_hash(self, onnx_path):
+        stat = os.stat(onnx_path)
+        memo_key = (onnx_path, stat.st_mtime, stat.st_size)
+        digest = self.hashes.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(onnx_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(chunk)
+            digest = self.hashes[memo_key] = sha.hexdigest()
+        return digest
+
+    def key(self, onnx_path, batch_size, precision):
+        return {
+            "onnx_sha256": self.onnx_hash(onnx_path),
+            "batch_size": batch_size,
+            "precision": precision,
+            "platform": self.platform,
+        }
+
+    def paths(self, key):
+        name = "%s_b%d_%s_%s" % (key["onnx_sha256"][:16], key["batch_size"], key["precision"], key["platform"])
+        base = os.path.join(self.cache_dir, name)
+        return base + ".engine", base + ".json"
+
+    def lookup(self, onnx_path, batch_size, precision):
+        """
+        Path of the cached engine, or None when it is missing or invalid.
+        """
+        key = self.key(onnx_path, batch_size, precision)
+        engine_path, meta_path = self.paths(key)
+        if not os.path.exists(engine_path) or not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if any(meta.get(k) != v for k, v in key.items()):
+            sys.stderr.write("Cached engine %s does not match %s, ignoring it\n" % (engine_path, key))
+            return None
+        if os.path.getsize(engine_path) != meta.get("size"):
+            sys.stderr.write("Cached engine %s is incomplete, ignoring it\n" % engine_path)
+            return None
+        return engine_path
+
+    def build(self, infer_config, onnx_path, batch_size, precision):
+        key = self.key(onnx_path, batch_size, precision)
+        engine_path, meta_path = self.paths(key)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        print("Building %s engine for %s, batch %d. This takes several minutes on a Nano" % (
+            precision, os.path.basename(onnx_path), batch_size))
+        if not self.builder(infer_config, batch_size, engine_path):
+            sys.stderr.write(" Unable to build engine for %s \n" % infer_config)
+            return None
+        meta = dict(key, size=os.path.getsize(engine_path), onnx=os.path.basename(onnx_path),
+                    created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+        return engine_path
+
+    def model_of(self, infer_config):
+        """
+        (model path, precision) of the model of an infer config: its ONNX
+        file, else its model-file, else the config itself for a config that
+        only names a prebuilt engine.
+        """
+        properties = read_infer_config(infer_config)
+        model = properties.get("onnx-file") or properties.get("model-file")
+        if model:
+            model_path = os.path.join(os.path.dirname(os.path.abspath(infer_config)), model)
+        else:
+            model_path = os.path.abspath(infer_config)
+        return model_path, precision_name(properties.get("network-mode", "0"))
+
+    def lookup_config(self, infer_config, batch_size):
+        model_path, precision = self.model_of(infer_config)
+        if not os.path.exists(model_path):
+            return None
+        return self.lookup(model_path, batch_size, precision)
+
+    def ensure(self, infer_config, batch_size):
+        """
+        Engine path for the model of `infer_config` at `batch_size`, built
+        into the cache on a miss. None if it could not be built.
+        """
+        model_path, precision = self.model_of(infer_config)
+        if not os.path.exists(model_path):
+            sys.stderr.write(" Unable to find model %s \n" % model_path)
+            return None
+        engine_path = self.lookup(model_path, batch_size, precision)
+        if engine_path:
+            print("Using cached engine %s" % engine_path)
+            return engine_path
+        return self.build(infer_config, model_path, batch_size, precision)
+
+    def entries(self):
+        entries = []
+        for meta_path in sorted(glob.glob(os.path.join(self.cache_dir, "*.json"))):
+            with open(meta_path) as f:
+                entries.append(json.load(f))
+        return entries
+
+
+def precision_name(network_mode):
+    for name, mode in NETWORK_MODES.items():
+        if mode == int(network_mode):
+            return name
+    return "fp32"
+
+
+def model_infer_config(config, model, batch_size, build=False):
+    """
+    Write the infer config for `model` (None: the model of the base config)
+    and return its path. With the engine cache enabled it points at the
+    cached engine; with `build`, a missing engine is built first.
+    """
+    path = write_infer_config(config["pgie_config"], model, batch_size)
+    if not config["engine_cache"]:
+        return path
+    cache = EngineCache(config["engine_cache"])
+    if build:
+        engine_path = cache.ensure(path, batch_size)
+    else:
+        engine_path = cache.lookup_config(path, batch_size)
+    if not engine_path:
+        return path
+    return write_infer_config(config["pgie_config"], model, batch_size, engine_path)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Prebuild TensorRT engines into the engine cache')
+    parser.add_argument("--infer-config", default="dstest1_pgie_config.txt",
+                        help="Base nvinfer config, default=dstest1_pgie_config.txt")
+    parser.add_argument("-m", "--model", action="append", choices=list(MODEL_PROFILES),
+                        help="Model profile to build, repeat for several. Default: the model of the infer config")
+    parser.add_argument("--batch-size", action="append", type=int,
+                        help="Batch size to build for (the number of inputs), repeat for several, default=1")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Engine cache directory, default=%s" % DEFAULT_CACHE_DIR)
+    parser.add_argument("--list", action="store_true", help="List the cached engines and exit")
+    args = parser.parse_args(argv)
+
+    cache = EngineCache(args.cache_dir)
+    if args.list:
+        for entry in cache.entries():
+            print("%(onnx)s b%(batch_size)d %(precision)s %(platform)s %(size)d bytes %(created)s" % entry)
+        return 0
+
+    failed = 0
+    for model in args.model or [None]:
+        for batch_size in args.batch_size or [1]:
+            config_path = write_infer_config(args.infer_config, model, batch_size)
+            if not cache.ensure(config_path, batch_size):
+                failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
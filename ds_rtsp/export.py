@@ -0,0 +1,199 @@
+import collections
+import json
+import socket
+import sys
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    # Only needed for --export-format msgpack
+    msgpack = None
+
+EXPORT_FORMATS = ("jsonl", "msgpack")
+
+# batch_arrays.UNTRACKED_OBJECT_ID, not imported: this module is loaded to
+# parse the arguments and must not need numpy
+UNTRACKED_OBJECT_ID = 0xffffffffffffffff
+
+
+def encode_jsonl(record):
+    return json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def encode_msgpack(record):
+    return msgpack.packb(record, use_bin_type=True)
+
+
+class FileSink:
+    """
+    Appends to a file, e.g. a FIFO or a log rotated by the consumer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+
+    def write(self, data):
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class UnixSocketSink:
+    """
+    Streams to a Unix socket a consumer listens on. While nobody listens,
+    writes fail and the records are counted as dropped; the connection is
+    retried on the next write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sock = None
+
+    def write(self, data):
+        if self.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self.sock = sock
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def open_sink(target):
+    """
+    Sink for --export: unix:PATH for a Unix socket, anything else is a file.
+    """
+    if target.startswith("unix:"):
+        return UnixSocketSink(target[len("unix:"):])
+    return FileSink(target)
+
+
+class MetadataExporter:
+    """
+    Exports the detections of every frame as one record:
+
+        {"source": 0, "frame": 42, "pts": 1400000000,
+         "objects": [{"class": 0, "label": "person", "confidence": 0.8,
+                      "bbox": [left, top, width, height], "track": 7}]}
+
+    and analytics events pushed with push_event() as they are.
+
+    On the streaming thread consume() only appends a copy of each frame's
+    object rows from BatchArrays to a bounded ring; records are built from
+    the rows on the writer thread. The writer drains the ring every
+    `flush_interval` seconds, or once `batch_size` records are waiting, and
+    serializes and writes them in one go, so the streaming thread never
+    blocks on I/O. When the consumer falls behind the ring keeps the newest
+    `capacity` records and the oldest are counted as dropped; records that
+    could not be written are counted as failed. Each counter is only
+    written by one thread.
+    """
+
+    def __init__(self, sink, encode=encode_jsonl, capacity=4096, batch_size=64, flush_interval=0.5):
+        self.sink = sink
+        self.encode = encode
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ring = collections.deque(maxlen=capacity)
+        self.labels = {}
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self.failing = False
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="metadata-export")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        self.thread.join()
+        self.sink.close()
+
+    def push(self, record):
+        if len(self.ring) == self.capacity:
+            self.dropped += 1
+        self.ring.append(record)
+        if len(self.ring) >= self.batch_size:
+            self.wake.set()
+
+    def consume(self, arrays):
+        """
+        Batch consumer, see PipelineProbes.attach_batch_consumers().
+        """
+        self.labels = arrays.labels
+        for index, frame in enumerate(arrays.frames()):
+            self.push((int(frame["source_id"]), int(frame["frame_num"]), int(frame["pts"]),
+                       arrays.frame_objects(index).copy()))
+
+    def push_event(self, event):
+        """
+        Export an analytics event as a record of its own.
+        """
+        self.push(event)
+
+    def record(self, frame):
+        if isinstance(frame, dict):
+            return frame
+        source_id, frame_num, pts, objects = frame
+        labels = self.labels
+        return {
+            "source": source_id,
+            "frame": frame_num,
+            "pts": pts,
+            "objects": [{
+                "class": class_id,
+                "label": labels.get(class_id, ""),
+                # Rows are float32, don't print float64 noise
+                "confidence": round(confidence, 4),
+                "bbox": [round(v, 1) for v in bbox.tolist()],
+                "track": None if track_id == UNTRACKED_OBJECT_ID else track_id,
+            } for _, class_id, confidence, bbox, track_id in objects.tolist()],
+        }
+
+    def flush(self):
+        records = []
+        while self.ring:
+            records.append(self.ring.popleft())
+        if not records:
+            return
+        try:
+            self.sink.write(b"".join(self.encode(self.record(frame)) for frame in records))
+        except (OSError, ValueError) as e:
+            self.failed += len(records)
+            if not self.failing:
+                # Logged once, not on every flush until the consumer is back
+                sys.stderr.write("Metadata export to %s failed: %s\n" % (self.sink.path, e))
+                self.failing = True
+            return
+        if self.failing:
+            print("Metadata export to %s resumed" % self.sink.path)
+            self.failing = False
+        self.exported += len(records)
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+        self.flush()
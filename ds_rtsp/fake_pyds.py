@@ -0,0 +1,162 @@
+import random
+
+# Pure Python stand-in for the part of the pyds API the probes use: batch,
+# frame and object metadata linked through GList nodes, cast(),
+# gst_buffer_get_nvds_batch_meta() and display metas. Lets BatchArrays and
+# the probes run, and be timed, on synthetic batches without DeepStream or a
+# GPU.
+
+# Batches registered by buffer hash, see attach_batch_meta()
+_batches = {}
+
+UNTRACKED_OBJECT_ID = 0xffffffffffffffff
+
+
+class GList:
+    __slots__ = ('data', 'next')
+
+    def __init__(self, data, next=None):
+        self.data = data
+        self.next = next
+
+
+def make_list(items):
+    head = None
+    for item in reversed(items):
+        head = GList(item, head)
+    return head
+
+
+class _Meta:
+    @staticmethod
+    def cast(data):
+        return data
+
+
+class NvOSD_RectParams:
+    __slots__ = ('left', 'top', 'width', 'height')
+
+    def __init__(self, left=0.0, top=0.0, width=0.0, height=0.0):
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+
+class NvOSD_ColorParams:
+    __slots__ = ('red', 'green', 'blue', 'alpha')
+
+    def __init__(self):
+        self.set(0.0, 0.0, 0.0, 0.0)
+
+    def set(self, red, green, blue, alpha):
+        self.red = red
+        self.green = green
+        self.blue = blue
+        self.alpha = alpha
+
+
+class NvOSD_FontParams:
+    __slots__ = ('font_name', 'font_size', 'font_color')
+
+    def __init__(self):
+        self.font_name = ""
+        self.font_size = 0
+        self.font_color = NvOSD_ColorParams()
+
+
+class NvOSD_TextParams:
+    __slots__ = ('display_text', 'x_offset', 'y_offset', 'font_params', 'set_bg_clr', 'text_bg_clr')
+
+    def __init__(self, display_text=""):
+        self.display_text = display_text
+        self.x_offset = 0
+        self.y_offset = 0
+        self.font_params = NvOSD_FontParams()
+        self.set_bg_clr = 0
+        self.text_bg_clr = NvOSD_ColorParams()
+
+
+class NvOSD_LineParams:
+    __slots__ = ('x1', 'y1', 'x2', 'y2', 'line_width', 'line_color')
+
+    def __init__(self):
+        self.x1 = self.y1 = self.x2 = self.y2 = 0
+        self.line_width = 0
+        self.line_color = NvOSD_ColorParams()
+
+
+class NvDsObjectMeta(_Meta):
+    def __init__(self, class_id=0, obj_label="", confidence=0.0, rect=None, object_id=UNTRACKED_OBJECT_ID):
+        self.class_id = class_id
+        self.obj_label = obj_label
+        self.confidence = confidence
+        self.rect_params = rect or NvOSD_RectParams()
+        self.object_id = object_id
+        self.text_params = NvOSD_TextParams(obj_label)
+
+
+class NvDsFrameMeta(_Meta):
+    def __init__(self, source_id=0, frame_num=0, buf_pts=0, objects=()):
+        self.source_id = source_id
+        self.frame_num = frame_num
+        self.buf_pts = buf_pts
+        self.num_obj_meta = len(objects)
+        self.obj_meta_list = make_list(list(objects))
+        # Display metas added by nvds_add_display_meta_to_frame(), in order
+        self.display_meta = []
+
+
+class NvDsBatchMeta(_Meta):
+    def __init__(self, frames=()):
+        self.num_frames_in_batch = len(frames)
+        self.frame_meta_list = make_list(list(frames))
+
+
+# Elements per display meta, as MAX_ELEMENTS_IN_DISPLAY_META in DeepStream
+MAX_ELEMENTS_IN_DISPLAY_META = 16
+
+
+class NvDsDisplayMeta(_Meta):
+    def __init__(self):
+        self.num_labels = 0
+        self.num_lines = 0
+        self.text_params = [NvOSD_TextParams() for _ in range(MAX_ELEMENTS_IN_DISPLAY_META)]
+        self.line_params = [NvOSD_LineParams() for _ in range(MAX_ELEMENTS_IN_DISPLAY_META)]
+
+
+def nvds_acquire_display_meta_from_pool(batch_meta):
+    return NvDsDisplayMeta()
+
+
+def nvds_add_display_meta_to_frame(frame_meta, display_meta):
+    frame_meta.display_meta.append(display_meta)
+
+
+def attach_batch_meta(buffer_hash, batch_meta):
+    _batches[buffer_hash] = batch_meta
+
+
+def gst_buffer_get_nvds_batch_meta(buffer_hash):
+    return _batches.get(buffer_hash)
+
+
+def synthetic_batch(num_sources, objects_per_frame, frame_num=0, labels=("person", "car"),
+                    size=(1280, 720), seed=None):
+    """
+    A batch with one frame per source and `objects_per_frame` objects of
+    random class, confidence and box in each, tracked with IDs unique per
+    source.
+    """
+    rng = random.Random(seed)
+    width, height = size
+    frames = []
+    for source_id in range(num_sources):
+        objects = []
+        for i in range(objects_per_frame):
+            class_id = rng.randrange(len(labels))
+            w, h = rng.uniform(10, width / 4.0), rng.uniform(10, height / 4.0)
+            rect = NvOSD_RectParams(rng.uniform(0, width - w), rng.uniform(0, height - h), w, h)
+            objects.append(NvDsObjectMeta(class_id, labels[class_id], rng.random(), rect, i))
+        frames.append(NvDsFrameMeta(source_id, frame_num, frame_num * 33333333, objects))
+    return NvDsBatchMeta(frames)
@@ -0,0 +1,171 @@
+import math
+import threading
+import time
+import gi
+
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+
+class LatencyHistogram:
+    """
+    Log-scale latency histogram with fixed buckets.
+
+    Bucket i covers latencies up to min_us * 2^((i + 1) / steps_per_octave).
+    record() only increments a preallocated list slot. It is not thread
+    safe on its own; LatencyTracer records and reads under its lock.
+    """
+
+    def __init__(self, min_us=1.0, max_us=100000000.0, steps_per_octave=4):
+        self.min_us = min_us
+        self.steps_per_octave = steps_per_octave
+        self.size = int(math.ceil(math.log2(max_us / min_us) * steps_per_octave)) + 1
+        self.counts = [0] * self.size
+        self.total = 0
+        self.sum_us = 0.0
+
+    def record(self, latency_us):
+        if latency_us <= self.min_us:
+            index = 0
+        else:
+            index = min(self.size - 1, int(math.log2(latency_us / self.min_us) * self.steps_per_octave))
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_us += latency_us
+
+    def upper_bound(self, index):
+        return self.min_us * 2 ** ((index + 1) / float(self.steps_per_octave))
+
+    def percentile(self, p):
+        """
+        Upper bound (in microseconds) of the bucket holding the p-th
+        percentile, 0 when nothing was recorded.
+        """
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = p / 100.0 * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return self.upper_bound(index)
+        return self.upper_bound(self.size - 1)
+
+    def mean(self):
+        return self.sum_us / self.total if self.total else 0.0
+
+
+class LatencyTracer:
+    """
+    Opt-in per-element latency tracer.
+
+    A buffer probe on the src pad of each traced element stamps the arrival
+    time of every buffer, keyed by its PTS. The time since the same PTS was
+    stamped by the previous stage is recorded in that element's histogram,
+    and the time since the first stage in the "total" histogram.
+
+    Stages are attached in pipeline order. Only the first stage (the sources)
+    starts tracking a PTS and the last one stops, so RTP packets that share a
+    frame's PTS are only counted once. nvstreammux keeps the PTS of the input
+    frame, but frames from different sources with the same PTS are not told
+    apart.
+
+    The probes run on several streaming threads: each source bin has its
+    own, and so does every stage behind a queue. stamp() and stats() take a
+    lock, held for a dict lookup and a histogram increment.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, max_inflight=512, clock=time.monotonic):
+        self.max_inflight = max_inflight
+        self.clock = clock
+        self.stages = []
+        self.histograms = {}
+        self.total = LatencyHistogram()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def add_stage(self, name):
+        """
+        Register a stage, in pipeline order, and return its index.
+        """
+        if name not in self.histograms:
+            self.stages.append(name)
+            self.histograms[name] = LatencyHistogram()
+        return self.stages.index(name)
+
+    def attach(self, pad, name):
+        """
+        Trace buffers leaving `pad` as stage `name`. Several pads may share
+        a stage, e.g. the src pads of all source bins.
+        """
+        index = self.add_stage(name)
+        pad.add_probe(Gst.PadProbeType.BUFFER, self.probe, (index, name))
+
+    def attach_element(self, element, name=None):
+        pad = element.get_static_pad("src")
+        if not pad:
+            return False
+        self.attach(pad, name or element.get_name())
+        return True
+
+    def probe(self, pad, info, stage):
+        gst_buffer = info.get_buffer()
+        if gst_buffer:
+            self.stamp(gst_buffer.pts, stage[0], stage[1])
+        return Gst.PadProbeReturn.OK
+
+    def stamp(self, pts, index, name, now=None):
+        if now is None:
+            now = self.clock()
+        with self.lock:
+            self.record(pts, index, name, now)
+
+    def record(self, pts, index, name, now):
+        entry = self.inflight.get(pts)
+        if entry is None:
+            if index != 0:
+                return
+            if len(self.inflight) >= self.max_inflight:
+                # Oldest entries are the ones that were dropped downstream
+                self.inflight.pop(next(iter(self.inflight)), None)
+            self.inflight[pts] = [now, now]
+            return
+        if index == 0:
+            # Same PTS from another source: restart from the latest arrival
+            entry[0] = entry[1] = now
+            return
+        self.histograms[name].record((now - entry[1]) * 1000000.0)
+        entry[1] = now
+        if index == len(self.stages) - 1:
+            self.total.record((now - entry[0]) * 1000000.0)
+            self.inflight.pop(pts, None)
+
+    def stats(self):
+        with self.lock:
+            return self.collect()
+
+    def collect(self):
+        stats = {}
+        for name in self.stages[1:] + ["total"]:
+            histogram = self.total if name == "total" else self.histograms[name]
+            entry = {'count': histogram.total, 'mean_ms': histogram.mean() / 1000.0}
+            for p in self.PERCENTILES:
+                entry['p%d_ms' % p] = histogram.percentile(p) / 1000.0
+            stats[name] = entry
+        return stats
+
+    def dump(self):
+        """
+        Per-stage latency table, for logging from the main loop.
+        """
+        lines = ["%-16s %8s %9s %9s %9s %9s" % ("stage", "count", "mean ms", "p50 ms", "p95 ms", "p99 ms")]
+        stats = self.stats()
+        for name in self.stages[1:] + ["total"]:
+            s = stats[name]
+            lines.append("%-16s %8d %9.2f %9.2f %9.2f %9.2f" % (
+                name, s['count'], s['mean_ms'], s['p50_ms'], s['p95_ms'], s['p99_ms']))
+        return "\n".join(lines)
@@ -0,0 +1,160 @@
+import sys
+import gi
+
+gi.require_version('Gio', '2.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import Gio, GLib
+
+# Seconds a client gets to send its request and read the reply
+REQUEST_TIMEOUT = 5
+# Larger requests are refused
+MAX_REQUEST_SIZE = 65536
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, _escape(v)) for k, v in sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """
+    Metrics rendered in the Prometheus text format.
+
+    Each metric is backed by a collect function returning (labels, value)
+    pairs. Collect functions only run when the endpoint is scraped, on the
+    main loop, so nothing is computed on the streaming threads for metrics
+    nobody reads.
+    """
+
+    def __init__(self, prefix="ds_rtsp_"):
+        self.prefix = prefix
+        self.metrics = []
+
+    def add(self, name, kind, help_text, collect):
+        self.metrics.append((self.prefix + name, kind, help_text, collect))
+
+    def gauge(self, name, help_text, collect):
+        self.add(name, "gauge", help_text, collect)
+
+    def counter(self, name, help_text, collect):
+        self.add(name, "counter", help_text, collect)
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, collect in self.metrics:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                sys.stderr.write("Unable to collect metric %s: %s\n" % (name, e))
+                continue
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for labels, value in samples:
+                lines.append("%s%s %s" % (name, format_labels(labels), repr(float(value))))
+        return "\n".join(lines) + "\n"
+
+
+class HttpRequest:
+    """
+    Serves one HTTP/1.0 request on a connection accepted on the main loop,
+    without blocking it.
+
+    The request is read with read_bytes_async(), and the socket times out
+    after REQUEST_TIMEOUT seconds, so a peer that connects and sends nothing
+    costs an idle connection until then instead of stalling bus handling,
+    the RTSP server and every GLib timeout. Once the head and any
+    Content-Length body are in, `handle(method, path, body)` returns
+    (status, content type, body bytes). The reply is small and written at
+    once; the timeout also bounds that write.
+    """
+
+    def __init__(self, connection, handle, description):
+        self.connection = connection
+        self.handle = handle
+        self.description = description
+        self.data = b""
+        connection.get_socket().set_timeout(REQUEST_TIMEOUT)
+
+    def read(self):
+        self.connection.get_input_stream().read_bytes_async(
+            4096, GLib.PRIORITY_DEFAULT, None, self.on_read, None)
+
+    def on_read(self, stream, result, user_data):
+        try:
+            chunk = stream.read_bytes_finish(result).get_data()
+            self.data += chunk
+            request = self.parse()
+            if request is None:
+                if not chunk:
+                    raise ValueError("connection closed before the end of the request")
+                if len(self.data) > MAX_REQUEST_SIZE:
+                    raise ValueError("request larger than %d bytes" % MAX_REQUEST_SIZE)
+                self.read()
+                return
+            status, content_type, body = self.handle(*request)
+            header = ("HTTP/1.0 %s\r\n"
+                      "Content-Type: %s\r\n"
+                      "Content-Length: %d\r\n"
+                      "Connection: close\r\n\r\n" % (status, content_type, len(body)))
+            self.connection.get_output_stream().write_all(header.encode("ascii") + body, None)
+        except Exception as e:
+            sys.stderr.write("%s request failed: %s\n" % (self.description, e))
+        self.connection.close(None)
+
+    def parse(self):
+        """
+        (method, path, body) once the whole request is in, else None.
+        """
+        head, separator, body = self.data.partition(b"\r\n\r\n")
+        if not separator:
+            return None
+        lines = head.decode("ascii", "replace").split("\r\n")
+        method, path = (lines[0].split(" ") + ["", ""])[:2]
+        length = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value.strip())
+        if len(body) < length:
+            return None
+        return method, path.split("?", 1)[0], body[:length]
+
+
+class MetricsServer:
+    """
+    Minimal HTTP endpoint serving a MetricsRegistry at /metrics.
+
+    Connections are accepted by a Gio.SocketService on the default main
+    context, i.e. by the GLib main loop created in main(), and read
+    asynchronously by HttpRequest; no extra thread is started.
+    """
+
+    def __init__(self, registry, port):
+        self.registry = registry
+        self.port = port
+        self.service = Gio.SocketService.new()
+        self.service.add_inet_port(port, None)
+        self.service.connect("incoming", self.on_incoming)
+
+    def start(self):
+        self.service.start()
+        print("Serving metrics at http://0.0.0.0:%d/metrics" % self.port)
+
+    def stop(self):
+        self.service.stop()
+
+    def on_incoming(self, service, connection, source_object):
+        HttpRequest(connection, self.handle, "Metrics").read()
+        return True
+
+    def handle(self, method, path, body):
+        if method == "GET" and path == "/metrics":
+            status, body = "200 OK", self.registry.render()
+        else:
+            status, body = "404 Not Found", "not found\n"
+        return status, "text/plain; version=0.0.4; charset=utf-8", body.encode("utf-8")
@@ -0,0 +1,249 @@
+import collections
+import configparser
+import glob
+import os
+import shutil
+import signal
+import sys
+import time
+import gi
+
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib
+
+# nvinfer network-mode per engine precision
+NETWORK_MODES = {"fp32": 0, "int8": 1, "fp16": 2}
+
+# Model variants that can be selected with --model. Model files are looked up
+# in the directory of the base infer config, like the paths inside it, and
+# then in the pipeline directory of the model family ("dir", next to it), so
+# that yolov8n and yolov11n can be compared from either one. The input size
+# of a DeepStream-Yolo export is fixed in the ONNX file, so other input sizes
+# are separate exports.
+MODEL_PROFILES = collections.OrderedDict([
+    ("yolov8n", {"onnx": "yolov8n.onnx", "precision": "fp32", "input": 640, "dir": "ds_rtsp_y8n"}),
+    ("yolov8n-fp16", {"onnx": "yolov8n.onnx", "precision": "fp16", "input": 640, "dir": "ds_rtsp_y8n"}),
+    ("yolov8n-int8", {"onnx": "yolov8n.onnx", "precision": "int8", "calib": "calib.table", "input": 640,
+                      "dir": "ds_rtsp_y8n"}),
+    ("yolov8n-416", {"onnx": "yolov8n_416.onnx", "precision": "fp16", "input": 416, "dir": "ds_rtsp_y8n"}),
+    ("yolov11n", {"onnx": "yolov11n.onnx", "precision": "fp32", "input": 640, "dir": "ds_rtsp_y11n"}),
+    ("yolov11n-fp16", {"onnx": "yolov11n.onnx", "precision": "fp16", "input": 640, "dir": "ds_rtsp_y11n"}),
+    ("yolov11n-int8", {"onnx": "yolov11n.onnx", "precision": "int8", "calib": "calib.table", "input": 640,
+                       "dir": "ds_rtsp_y11n"}),
+    ("yolov11n-416", {"onnx": "yolov11n_416.onnx", "precision": "fp16", "input": 416, "dir": "ds_rtsp_y11n"}),
+])
+
+# Input size of the DeepStream-Yolo exports when the infer config does not
+# say otherwise
+DEFAULT_MODEL_INPUT = 640
+
+
+def engine_file_name(name, batch_size, precision):
+    return "%s_b%d_gpu0_%s.engine" % (name, batch_size, precision)
+
+
+def model_file(base_path, profile, name):
+    """
+    Path of model file `name` (ONNX file, calibration table) of `profile`
+    for an infer config written next to `base_path`: as is if the base
+    config's directory has it, else in the directory of the model family.
+    """
+    base_dir = os.path.dirname(os.path.abspath(base_path))
+    if os.path.exists(os.path.join(base_dir, name)):
+        return name
+    family_path = os.path.join(os.path.dirname(base_dir), profile["dir"], name)
+    if os.path.exists(family_path):
+        return family_path
+    # Left for nvinfer to report as missing
+    return name
+
+
+def read_infer_config(path):
+    """
+    The [property] section of an nvinfer config as a dict.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(path)
+    if not parser.has_section("property"):
+        return {}
+    return dict(parser.items("property"))
+
+
+def infer_config_path(base_path, name, batch_size):
+    """
+    Where write_infer_config() writes the config for `name` and `batch_size`.
+    """
+    return os.path.join(os.path.dirname(base_path), "pgie_%s_b%d.txt" % (name or "default", batch_size))
+
+
+def write_infer_config(base_path, name, batch_size, engine_file=None):
+    """
+    Write the nvinfer config for model profile `name` next to `base_path`
+    and return its path. Everything but the model, engine, precision and
+    batch size is taken from the base config; with `name` None the model of
+    the base config is kept.
+
+    Each profile gets its own engine file name, so that engines of different
+    models and precisions built in the same directory do not overwrite each
+    other; nvinfer does not build under that name, see keep_built_engine().
+    `engine_file` overrides it, e.g. with an engine cache entry.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    if not parser.read(base_path):
+        sys.stderr.write(" Unable to read infer config %s \n" % base_path)
+    if not parser.has_section("property"):
+        parser.add_section("property")
+    if name:
+        profile = MODEL_PROFILES[name]
+        parser.set("property", "onnx-file", model_file(base_path, profile, profile["onnx"]))
+        parser.set("property", "model-engine-file",
+                   engine_file_name(name, batch_size, profile["precision"]))
+        parser.set("property", "network-mode", str(NETWORK_MODES[profile["precision"]]))
+        if "calib" in profile:
+            parser.set("property", "int8-calib-file", model_file(base_path, profile, profile["calib"]))
+    if engine_file:
+        parser.set("property", "model-engine-file", engine_file)
+    parser.set("property", "batch-size", str(batch_size))
+
+    path = infer_config_path(base_path, name, batch_size)
+    with open(path, "w") as f:
+        parser.write(f, space_around_delimiters=False)
+    return path
+
+
+def model_input_size(config):
+    """
+    (width, height) of the network input of the configured model, from its
+    profile or the infer-dims (channels;height;width) of the infer config.
+    """
+    if config["model"]:
+        size = MODEL_PROFILES[config["model"]]["input"]
+        return size, size
+    dims = read_infer_config(config["pgie_config"]).get("infer-dims")
+    if dims:
+        channels, height, width = [int(d) for d in dims.split(";")]
+        return width, height
+    return DEFAULT_MODEL_INPUT, DEFAULT_MODEL_INPUT
+
+
+def infer_engine_path(config_path):
+    """
+    Absolute path of the model-engine-file of an infer config, or None.
+    """
+    engine = read_infer_config(config_path).get("model-engine-file")
+    if not engine:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), engine)
+
+
+def find_built_engine(config_path, since):
+    """
+    The newest engine written since `since` (a time.time()) next to an
+    infer config or in the working directory. nvinfer names the engines it
+    builds itself, e.g. model_b1_gpu0_fp16.engine for DeepStream-Yolo.
+    """
+    config_dir = os.path.dirname(os.path.abspath(config_path))
+    built = [path for path in glob.glob(os.path.join(config_dir, "*.engine")) + glob.glob("*.engine")
+             if os.path.getmtime(path) >= since]
+    return max(built, key=os.path.getmtime) if built else None
+
+
+def keep_built_engine(config_path, since):
+    """
+    Move the engine nvinfer built for an infer config since `since` to the
+    model-engine-file the config names, so that the next start loads it
+    instead of building it again, and a ModelSwitcher can load it at
+    runtime. Call it once nvinfer has started. Returns the engine path, or
+    None if there was nothing to keep.
+    """
+    engine = infer_engine_path(config_path)
+    if not engine or os.path.exists(engine):
+        return None
+    built = find_built_engine(config_path, since)
+    if not built:
+        return None
+    shutil.move(built, engine)
+    print("Saved the engine nvinfer built as %s" % engine)
+    return engine
+
+
+class ModelSwitcher:
+    """
+    Swaps the model of a running nvinfer between infer configs by setting
+    its config-file-path, without stopping the sources or the RTSP server.
+
+    nvinfer only accepts the new config once the engine is loaded, and it
+    can only load a prebuilt engine at runtime: run the pipeline once with
+    --model for every profile to build them. The new engine must have the
+    same batch size as the running one.
+
+    Switches happen on SIGUSR1 and, with an interval, periodically. The
+    throughput of each model is accumulated over the time it was active, for
+    A/B comparisons on the same live input.
+    """
+
+    def __init__(self, pgie, models, fps_meter):
+        self.pgie = pgie
+        self.models = models    # [(name, infer config path)]
+        self.fps_meter = fps_meter
+        self.active = 0
+        self.previous = 0
+        self.started = time.monotonic()
+        self.frames_at_start = 0
+        self.totals = collections.OrderedDict((name, [0, 0.0]) for name, _ in models)
+        try:
+            pgie.connect("model-updated", self.on_model_updated)
+        except TypeError:
+            # nvinfer without the signal, switches are not confirmed
+            pass
+
+    def attach(self, interval=0):
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR1, self.switch)
+        if interval:
+            GLib.timeout_add_seconds(interval, self.switch)
+
+    def total_frames(self):
+        return sum(self.fps_meter.frame_count(i) for i in self.fps_meter.source_ids())
+
+    def account(self):
+        now = time.monotonic()
+        frames = self.total_frames()
+        totals = self.totals[self.models[self.active][0]]
+        totals[0] += frames - self.frames_at_start
+        totals[1] += now - self.started
+        self.started = now
+        self.frames_at_start = frames
+
+    def switch(self):
+        next_index = (self.active + 1) % len(self.models)
+        name, path = self.models[next_index]
+        engine = infer_engine_path(path)
+        # The first model is the one the pipeline started with, its engine
+        # was loaded (or built) at startup
+        if next_index != 0 and (not engine or not os.path.exists(engine)):
+            sys.stderr.write("Engine %s for model %s is not built yet, run once with --model %s\n" % (
+                engine, name, name))
+            return True
+        self.account()
+        print("Switching model from %s to %s" % (self.models[self.active][0], name))
+        print(self.summary())
+        self.pgie.set_property("config-file-path", path)
+        self.previous = self.active
+        self.active = next_index
+        return True
+
+    def on_model_updated(self, pgie, error, config_path):
+        if error:
+            # nvinfer keeps running the previous model
+            sys.stderr.write("nvinfer failed to load %s (error %d)\n" % (config_path, error))
+            self.account()
+            self.active = self.previous
+        else:
+            print("nvinfer now running %s" % config_path)
+
+    def summary(self):
+        lines = []
+        for name, (frames, seconds) in self.totals.items():
+            if seconds > 0:
+                lines.append("model %s: %.1f fps over %.0f s" % (name, frames / seconds, seconds))
+        return "\n".join(lines)
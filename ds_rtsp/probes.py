@@ -0,0 +1,323 @@
+import os
+import sys
+import time
+import gi
+
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+from common.FPS import StreamRateMeter, FpsText
+from ds_rtsp.sources import caps_framerate
+
+try:
+    import pyds
+except ImportError:
+    # Only needed for the metadata probes, which are not attached when
+    # running on CPU stand-ins
+    pyds = None
+
+
+class CpuUsage:
+    """
+    CPU time of the whole process, as a percentage of one core since the
+    previous sample.
+    """
+
+    def __init__(self):
+        self.last = self.read()
+
+    @staticmethod
+    def read():
+        times = os.times()
+        return time.monotonic(), times[0] + times[1]
+
+    def sample(self):
+        now, cpu = self.read()
+        elapsed = now - self.last[0]
+        percent = 100.0 * (cpu - self.last[1]) / elapsed if elapsed > 0 else 0.0
+        self.last = (now, cpu)
+        return percent
+
+
+class PipelineProbes:
+    """
+    Pad probes reading DeepStream metadata, and the counters they keep.
+
+    Counters are plain dicts and floats updated on the streaming threads and
+    read from the main loop (FPS summary, --metrics-port).
+    """
+
+    def __init__(self, fps_label="FPS"):
+        self.fps_meter = StreamRateMeter()
+        self.fps_text = FpsText(fps_label + ": {:.1f}")
+        # class_id -> interned label, filled once per class
+        self.label_cache = {}
+        # Set when the tracker cannot be told to leave IDs out of the object
+        # text and the OSD probe has to rewrite it per object
+        self.strip_object_ids = False
+        self.objects_per_frame = {}
+        self.probe_seconds = {"fps_count": 0.0, "overlay": 0.0, "osd": 0.0}
+        self.frames_dropped = {}
+        # source index -> frames dropped by its leaky source queue
+        self.stale_frames = {}
+        # source index -> webcam capture format, for the CPU usage report
+        self.capture_formats = {}
+        # source index -> frame rate its source bin negotiated, None when the
+        # caps leave it variable; those sources are measured in input_meter
+        self.input_framerates = {}
+        self.input_meter = StreamRateMeter()
+        self.input_ticks = set()
+        # Called on the main loop as (index, framerate) when a source
+        # negotiates a frame rate
+        self.on_input_framerate = None
+        self.cpu = CpuUsage()
+        self.cpu_percent = 0.0
+        self.encoded_bytes = 0
+        # BatchArrays filled once per batch for the batch consumers, see
+        # attach_batch_consumers()
+        self.batch_arrays = None
+        self.batch_consumers = []
+        # Called as overlay(batch_meta, frame_meta) for every frame the OSD
+        # draws, in muxer frame coordinates
+        self.overlays = []
+
+    def attach(self, pipeline):
+        # Count frames once, after the tracker and before the tiler merges the batch
+        tracker = pipeline.get_by_name("tracker")
+        tracker_src_pad = tracker.get_static_pad("src") if tracker else None
+        if tracker_src_pad:
+            tracker_src_pad.add_probe(Gst.PadProbeType.BUFFER, self.fps_count_probe, 0)
+        else:
+            sys.stderr.write("Unable to get src pad of tracker for FPS count\n")
+
+        # FPS text and overlays are added per frame in muxer coordinates, so
+        # in front of the tiler, which maps them into each tile. Without a
+        # tiler (one source) the OSD draws the muxer frame as it is.
+        nvosd = pipeline.get_by_name("onscreendisplay")
+        overlay_element = pipeline.get_by_name("nvtiler") or nvosd
+        if overlay_element:
+            overlay_pad = overlay_element.get_static_pad("sink")
+            if overlay_pad:
+                overlay_pad.add_probe(Gst.PadProbeType.BUFFER, self.overlay_probe, 0)
+            else:
+                sys.stderr.write("Unable to get sink pad of %s\n" % overlay_element.get_name())
+
+        # Attach the OSD probe for removing IDs
+        if nvosd and self.strip_object_ids:
+            nvosd_sink_pad = nvosd.get_static_pad("sink")
+            if nvosd_sink_pad:
+                nvosd_sink_pad.add_probe(Gst.PadProbeType.BUFFER, self.osd_sink_pad_buffer_probe, 0)
+            else:
+                sys.stderr.write("Unable to get sink pad of nvosd\n")
+
+    def attach_batch_consumers(self, pipeline, arrays, consumers):
+        """
+        Extract every batch after the tracker into `arrays` once and hand it
+        to each of `consumers` (metadata export, analytics), instead of each
+        walking the metadata lists on its own.
+        """
+        tracker = pipeline.get_by_name("tracker")
+        tracker_src_pad = tracker.get_static_pad("src") if tracker else None
+        if not tracker_src_pad:
+            sys.stderr.write("Unable to get src pad of tracker for batch metadata\n")
+            return
+        self.batch_arrays = arrays
+        self.batch_consumers = consumers
+        self.probe_seconds["batch"] = 0.0
+        tracker_src_pad.add_probe(Gst.PadProbeType.BUFFER, self.batch_probe, 0)
+
+    def count_stale_frames(self, pipeline, sources):
+        """
+        Count the frames the leaky queue of each source drops. A leaky queue
+        emits "overrun" for every buffer arriving while it is full, right
+        before dropping one.
+        """
+        for source in sources:
+            source_bin = pipeline.get_by_name(source.name)
+            queue = source_bin.get_by_name("%s-queue" % source.name) if source_bin else None
+            if queue and queue.get_property("leaky"):
+                self.stale_frames.setdefault(source.index, 0)
+                queue.connect("overrun", self.on_source_overrun, source.index)
+
+    def on_source_overrun(self, queue, index):
+        # The queue of a removed source can still overrun while it stops
+        if index in self.stale_frames:
+            self.stale_frames[index] += 1
+
+    def watch_input_rate(self, source_bin, index):
+        """
+        Learn the frame rate source `index` delivers from the caps its bin
+        negotiates. Sources with a variable frame rate are measured at the
+        bin's src pad instead, which costs a probe call per frame.
+        """
+        pad = source_bin.get_static_pad("src")
+        if not pad:
+            sys.stderr.write("Unable to get src pad of %s for its frame rate\n" % source_bin.get_name())
+            return
+        # A restarted source negotiates again on a new bin
+        self.input_framerates.pop(index, None)
+        self.input_ticks.discard(index)
+        pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self.source_caps_probe, index)
+
+    def source_caps_probe(self, pad, info, index):
+        event = info.get_event()
+        if event.type != Gst.EventType.CAPS:
+            return Gst.PadProbeReturn.OK
+        framerate = caps_framerate(event.parse_caps())
+        self.input_framerates[index] = framerate
+        if framerate is None:
+            if index not in self.input_ticks:
+                self.input_ticks.add(index)
+                pad.add_probe(Gst.PadProbeType.BUFFER, self.source_tick_probe, index)
+        elif self.on_input_framerate:
+            GLib.idle_add(self.on_input_framerate, index, framerate)
+        return Gst.PadProbeReturn.OK
+
+    def source_tick_probe(self, pad, info, index):
+        self.input_meter.tick(index)
+        return Gst.PadProbeReturn.OK
+
+    def input_rate(self, index):
+        """
+        Frames per second source `index` delivers: its negotiated frame
+        rate, else its measured arrival rate, 0 while unknown. Call it from
+        the main loop.
+        """
+        framerate = self.input_framerates.get(index)
+        if framerate:
+            return framerate
+        return self.input_meter.rate(index)
+
+    def fps_count_probe(self, pad, info, u_data):
+        """
+        The only probe that counts frames: one tick per NvDsFrameMeta, so a
+        batched buffer counts once for each of its sources.
+        """
+        start = time.perf_counter()
+        gst_buffer = info.get_buffer()
+        if not gst_buffer:
+            return Gst.PadProbeReturn.OK
+
+        batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
+        l_frame = batch_meta.frame_meta_list
+        while l_frame is not None:
+            frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
+            self.fps_meter.tick(frame_meta.source_id)
+            self.objects_per_frame[frame_meta.source_id] = frame_meta.num_obj_meta
+            l_frame = l_frame.next
+        self.probe_seconds["fps_count"] += time.perf_counter() - start
+        return Gst.PadProbeReturn.OK
+
+    def batch_probe(self, pad, info, u_data):
+        start = time.perf_counter()
+        gst_buffer = info.get_buffer()
+        if not gst_buffer:
+            return Gst.PadProbeReturn.OK
+
+        self.batch_arrays.extract(pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer)))
+        for consumer in self.batch_consumers:
+            consumer(self.batch_arrays)
+        self.probe_seconds["batch"] += time.perf_counter() - start
+        return Gst.PadProbeReturn.OK
+
+    def overlay_probe(self, pad, info, u_data):
+        """
+        Probe in front of the tiler adding the FPS text and the overlays to
+        every frame of the batch.
+        """
+        start = time.perf_counter()
+        gst_buffer = info.get_buffer()
+        if not gst_buffer:
+            return Gst.PadProbeReturn.OK
+
+        # Retrieve batch metadata from the GstBuffer
+        batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
+        l_frame = batch_meta.frame_meta_list
+
+        while l_frame is not None:
+            frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
+            fps = self.fps_meter.current_fps(frame_meta.source_id)
+
+            # Acquire display_meta for FPS text
+            display_meta = pyds.nvds_acquire_display_meta_from_pool(batch_meta)
+            display_meta.num_labels = 1
+            py_nvosd_text_params = display_meta.text_params[0]
+
+            # Set FPS display text
+            py_nvosd_text_params.x_offset = 10
+            py_nvosd_text_params.y_offset = 12
+            py_nvosd_text_params.display_text = self.fps_text.render(frame_meta.source_id, fps)
+            py_nvosd_text_params.font_params.font_name = "Serif"
+            py_nvosd_text_params.font_params.font_size = 14
+            py_nvosd_text_params.font_params.font_color.set(1.0, 1.0, 1.0, 1.0)
+            py_nvosd_text_params.set_bg_clr = 1
+            py_nvosd_text_params.text_bg_clr.set(0.0, 0.0, 0.0, 0.5)
+
+            pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
+            for overlay in self.overlays:
+                overlay(batch_meta, frame_meta)
+
+            l_frame = l_frame.next
+
+        self.probe_seconds["overlay"] += time.perf_counter() - start
+        return Gst.PadProbeReturn.OK
+
+    def osd_sink_pad_buffer_probe(self, pad, info, u_data):
+        """
+        Probe at OSD sink pad to remove object IDs from display text, for
+        trackers that cannot be told to leave them out.
+        """
+        start = time.perf_counter()
+        gst_buffer = info.get_buffer()
+        if not gst_buffer:
+            return Gst.PadProbeReturn.OK
+
+        batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
+        l_frame = batch_meta.frame_meta_list
+
+        while l_frame is not None:
+            frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
+
+            # Modify object text to remove IDs, leave only class labels
+            l_obj = frame_meta.obj_meta_list
+            while l_obj is not None:
+                obj_meta = pyds.NvDsObjectMeta.cast(l_obj.data)
+                # Set display text to the object label only; reading obj_label
+                # through pyds builds a new string, so do it once per class
+                label = self.label_cache.get(obj_meta.class_id)
+                if label is None:
+                    label = self.label_cache[obj_meta.class_id] = sys.intern(obj_meta.obj_label)
+                obj_meta.text_params.display_text = label
+                l_obj = l_obj.next
+
+            l_frame = l_frame.next
+
+        self.probe_seconds["osd"] += time.perf_counter() - start
+        return Gst.PadProbeReturn.OK
+
+    def encoded_bytes_probe(self, pad, info, u_data):
+        gst_buffer = info.get_buffer()
+        if gst_buffer:
+            self.encoded_bytes += gst_buffer.get_size()
+        return Gst.PadProbeReturn.OK
+
+    def on_qos_message(self, bus, message):
+        # Dropped counts in QoS messages are cumulative per element
+        fmt, processed, dropped = message.parse_qos_stats()
+        self.frames_dropped[message.src.get_name()] = dropped
+
+    def print_fps_summary(self):
+        """
+        Log per-stream rates from the main loop, off the streaming thread.
+        """
+        summary = self.fps_meter.summary()
+        if summary:
+            print("**********************FPS*****************************************")
+            print(summary)
+        for index, dropped in sorted(self.stale_frames.items()):
+            if dropped:
+                print("stream %d: dropped %d stale frames" % (index, dropped))
+        self.cpu_percent = self.cpu.sample()
+        capture = ", ".join("stream %d %s" % item for item in sorted(self.capture_formats.items()))
+        print("CPU: %.0f%% of one core%s" % (self.cpu_percent, " (capture: %s)" % capture if capture else ""))
+        return True
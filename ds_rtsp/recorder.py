@@ -0,0 +1,243 @@
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+import gi
+import numpy as np
+
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+
+class Gop:
+    """
+    Encoded buffers from one keyframe up to the next.
+    """
+    __slots__ = ('start', 'buffers', 'size')
+
+    def __init__(self, start):
+        self.start = start
+        self.buffers = []
+        self.size = 0
+
+
+class EncodedRing:
+    """
+    The last `preroll` seconds of encoded video, as whole GOPs so that a
+    clip always starts on a keyframe. The oldest GOP is dropped once the
+    next one alone covers the pre-roll, or when the ring holds more than
+    `max_bytes`.
+    """
+
+    def __init__(self, preroll=5.0, max_bytes=32 << 20):
+        self.preroll = int(preroll * Gst.SECOND)
+        self.max_bytes = max_bytes
+        self.gops = collections.deque()
+        self.size = 0
+
+    def append(self, buffer, keyframe):
+        if keyframe or not self.gops:
+            if not keyframe:
+                # Nothing to decode a clip from before the first keyframe
+                return
+            self.gops.append(Gop(buffer.pts))
+        gop = self.gops[-1]
+        gop.buffers.append(buffer)
+        gop.size += buffer.get_size()
+        self.size += buffer.get_size()
+        while len(self.gops) > 1 and (self.gops[1].start <= buffer.pts - self.preroll or
+                                      self.size > self.max_bytes):
+            self.size -= self.gops.popleft().size
+
+    def buffers(self):
+        return [buffer for gop in self.gops for buffer in gop.buffers]
+
+
+class ClipWriter:
+    """
+    appsrc -> parse -> mp4mux -> filesink pipeline writing one clip, fed
+    with already encoded buffers. Timestamps are shifted so the clip starts
+    at 0.
+    """
+
+    def __init__(self, path, caps, codec, on_done):
+        self.path = path
+        self.base = None
+        self.on_done = on_done
+        self.pipeline = Gst.parse_launch(
+            "appsrc name=clip-src format=time is-live=false ! %sparse ! mp4mux ! filesink location=%s" % (
+                codec.lower(), path))
+        self.appsrc = self.pipeline.get_by_name("clip-src")
+        self.appsrc.set_property("caps", caps)
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self.on_message)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def push(self, buffer):
+        if self.base is None:
+            self.base = buffer.pts
+        # A shallow copy (ALL does not include DEEP): new timestamps, same
+        # encoded memory
+        buffer = buffer.copy_region(Gst.BufferCopyFlags.ALL, 0, buffer.get_size())
+        buffer.pts -= self.base
+        if buffer.dts != Gst.CLOCK_TIME_NONE:
+            buffer.dts = max(buffer.dts - self.base, 0)
+        self.appsrc.emit("push-buffer", buffer)
+
+    def finish(self):
+        self.appsrc.emit("end-of-stream")
+
+    def on_message(self, bus, message):
+        if message.type == Gst.MessageType.EOS:
+            self.close("Saved clip %s" % self.path)
+        elif message.type == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            self.close("Unable to write clip %s: %s: %s" % (self.path, err, debug))
+        return True
+
+    def close(self, text):
+        self.pipeline.get_bus().remove_signal_watch()
+        self.pipeline.set_state(Gst.State.NULL)
+        print(text)
+        self.on_done(self)
+
+
+class SmartRecorder:
+    """
+    Records clips of the encoded output around detection events, without
+    encoding anything a second time.
+
+    A probe on the encoder src pad keeps the last `preroll` seconds in an
+    EncodedRing. trigger(), from any thread or on SIGUSR2, starts a clip:
+    the ring is written as pre-roll, then encoded buffers keep going to the
+    clip until `postroll` seconds after the last trigger. Triggers during a
+    clip extend it; one clip is written at a time.
+    """
+
+    def __init__(self, directory, codec, preroll=5.0, postroll=5.0, max_bytes=32 << 20):
+        self.directory = directory
+        self.codec = codec
+        self.postroll = int(postroll * Gst.SECOND)
+        self.ring = EncodedRing(preroll, max_bytes)
+        # Held by the encoder streaming thread and by start_clip()
+        self.lock = threading.Lock()
+        self.caps = None
+        self.writer = None
+        self.starting = False
+        self.stop_pts = 0
+        self.triggered = False
+        # Writers between end-of-stream and their EOS message
+        self.closing = set()
+        self.clips = 0
+
+    def attach(self, pipeline):
+        encoder = pipeline.get_by_name("encoder")
+        if not encoder:
+            sys.stderr.write(" Unable to record clips without an encoder, use -o rtsp or both \n")
+            return False
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        encoder.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, self.encoded_probe, 0)
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR2, self.on_signal)
+        return True
+
+    def trigger(self):
+        # Only a flag, read by the probe on the next encoded buffer
+        self.triggered = True
+
+    def on_signal(self):
+        self.trigger()
+        return True
+
+    def encoded_probe(self, pad, info, u_data):
+        buffer = info.get_buffer()
+        if not buffer:
+            return Gst.PadProbeReturn.OK
+        keyframe = not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT)
+        # Copied once, the encoder may recycle its output buffers
+        buffer = buffer.copy_deep()
+        with self.lock:
+            if self.caps is None:
+                self.caps = pad.get_current_caps()
+            self.ring.append(buffer, keyframe)
+            if self.triggered:
+                self.triggered = False
+                self.stop_pts = buffer.pts + self.postroll
+                if self.writer is None and not self.starting:
+                    self.starting = True
+                    GLib.idle_add(self.start_clip)
+            if self.writer is not None:
+                self.writer.push(buffer)
+                if buffer.pts >= self.stop_pts:
+                    self.writer.finish()
+                    self.closing.add(self.writer)
+                    self.writer = None
+        return Gst.PadProbeReturn.OK
+
+    def start_clip(self):
+        self.clips += 1
+        path = os.path.join(self.directory, "clip-%s-%d.mp4" % (time.strftime("%Y%m%d-%H%M%S"), self.clips))
+        writer = ClipWriter(path, self.caps, self.codec, self.on_clip_done)
+        with self.lock:
+            # Pre-roll up to the newest buffer, the probe continues from there
+            for buffer in self.ring.buffers():
+                writer.push(buffer)
+            self.writer = writer
+            self.starting = False
+        print("Recording clip %s" % path)
+        return False
+
+    def on_clip_done(self, writer):
+        self.closing.discard(writer)
+
+    def stop(self):
+        """
+        Finish the clips being written, e.g. when the pipeline stops. The
+        main loop is gone by then, so wait for their EOS here.
+        """
+        with self.lock:
+            if self.writer is not None:
+                self.writer.finish()
+                self.closing.add(self.writer)
+                self.writer = None
+        for writer in list(self.closing):
+            message = writer.pipeline.get_bus().timed_pop_filtered(
+                5 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+            if message and message.type == Gst.MessageType.EOS:
+                writer.close("Saved clip %s" % writer.path)
+            else:
+                writer.close("Unable to finish clip %s" % writer.path)
+
+
+class DetectionTrigger:
+    """
+    Triggers a SmartRecorder when an object labelled one of `names` is
+    detected with at least `min_confidence`, or when an analytics event
+    happens on a zone or line named one of `names`.
+    """
+
+    def __init__(self, recorder, names, min_confidence=0.5):
+        self.recorder = recorder
+        self.names = set(names)
+        self.min_confidence = min_confidence
+        self.class_ids = np.zeros(0, np.int32)
+        self.known_labels = 0
+
+    def consume(self, arrays):
+        if len(arrays.labels) != self.known_labels:
+            # Labels are learnt as classes show up
+            self.known_labels = len(arrays.labels)
+            self.class_ids = np.array([class_id for class_id, label in arrays.labels.items()
+                                       if label in self.names], np.int32)
+        if not self.class_ids.size:
+            return
+        objects = arrays.objects()
+        if np.any(np.isin(objects["class_id"], self.class_ids) & (objects["confidence"] >= self.min_confidence)):
+            self.recorder.trigger()
+
+    def on_event(self, event):
+        if event["name"] in self.names:
+            self.recorder.trigger()
@@ -0,0 +1,158 @@
+import sys
+import gi
+
+gi.require_version('Gst', '1.0')
+gi.require_version('GstVideo', '1.0')
+from gi.repository import Gst, GstVideo
+
+
+class RtspClientCounter:
+    """
+    Counts the clients connected to an RTSP server.
+
+    Connection signals are delivered on the main loop the server is attached
+    to, so the count is only ever updated from there.
+    """
+
+    def __init__(self):
+        self.clients = 0
+
+    def attach(self, server, factory):
+        server.connect("client-connected", self.on_client_connected)
+        factory.connect("media-configure", self.on_media_configure)
+
+    def on_client_connected(self, server, client):
+        self.clients += 1
+        client.connect("closed", self.on_client_closed)
+        if self.clients == 1:
+            self.on_first_client()
+
+    def on_client_closed(self, client):
+        if self.clients == 0:
+            return
+        self.clients -= 1
+        if self.clients == 0:
+            self.on_last_client()
+
+    def on_media_configure(self, factory, media):
+        media.connect("unprepared", self.on_media_unprepared)
+
+    def on_media_unprepared(self, media):
+        # The shared media is torn down once the last client is gone, even
+        # if that client never closed its connection cleanly
+        if self.clients:
+            self.clients = 0
+            self.on_last_client()
+
+    def on_first_client(self):
+        pass
+
+    def on_last_client(self):
+        pass
+
+
+class RtspClientGate(RtspClientCounter):
+    """
+    Keeps the render/encode branch behind a valve that is only open while at
+    least one RTSP client is connected.
+    """
+
+    def __init__(self, valve, encoder):
+        RtspClientCounter.__init__(self)
+        self.valve = valve
+        self.encoder = encoder
+        self.valve.set_property('drop', True)
+
+    def is_open(self):
+        return not self.valve.get_property('drop')
+
+    def on_first_client(self):
+        if self.is_open():
+            return
+        print("RTSP client connected, starting encoder branch")
+        self.valve.set_property('drop', False)
+        # Send a keyframe right away instead of leaving the new client
+        # waiting for the next IDR interval
+        event = GstVideo.video_event_new_upstream_force_key_unit(Gst.CLOCK_TIME_NONE, True, 0)
+        if not self.encoder.send_event(event):
+            sys.stderr.write("Unable to request a keyframe from the encoder\n")
+
+    def on_last_client(self):
+        if not self.is_open():
+            return
+        print("No RTSP clients left, stopping encoder branch")
+        self.valve.set_property('drop', True)
+
+
+def rtp_caps_string(codec):
+    return "application/x-rtp, media=video, clock-rate=90000, encoding-name=(string)%s, payload=96" % codec
+
+
+def udp_launch(port, codec):
+    """
+    RTSP media reading the RTP stream multicast by the main pipeline's udpsink.
+    """
+    return "( udpsrc name=pay0 port=%d buffer-size=524288 caps=\"%s \" )" % (port, rtp_caps_string(codec))
+
+
+def appsrc_launch(codec, max_bytes=524288):
+    """
+    RTSP media fed in-process by RtpHandoff.
+    """
+    return "( appsrc name=pay0 is-live=true do-timestamp=true format=time max-bytes=%d caps=\"%s\" )" % (
+        max_bytes, rtp_caps_string(codec))
+
+
+class RtpHandoff:
+    """
+    Passes RTP buffers from an appsink at the end of the main pipeline to the
+    appsrc of the RTSP media, without going through the network stack.
+
+    Buffers are pushed by reference. While no media is prepared, or while a
+    media's appsrc is full because its clients are not keeping up, buffers
+    are dropped and counted instead of queueing up.
+    """
+
+    def __init__(self, appsink):
+        self.appsrcs = []
+        self.pushed = 0
+        self.dropped = 0
+        appsink.set_property('emit-signals', True)
+        appsink.set_property('sync', False)
+        appsink.set_property('async', False)
+        appsink.set_property('max-buffers', 1)
+        appsink.set_property('drop', True)
+        appsink.connect("new-sample", self.on_new_sample)
+
+    def attach(self, factory):
+        factory.connect("media-configure", self.on_media_configure)
+
+    def on_media_configure(self, factory, media):
+        appsrc = media.get_element().get_child_by_name("pay0")
+        if not appsrc:
+            sys.stderr.write("RTSP media has no pay0 appsrc\n")
+            return
+        # Replace the list rather than mutate it: the streaming thread may
+        # be iterating over the old one
+        self.appsrcs = self.appsrcs + [appsrc]
+        media.connect("unprepared", self.on_media_unprepared, appsrc)
+
+    def on_media_unprepared(self, media, appsrc):
+        self.appsrcs = [a for a in self.appsrcs if a is not appsrc]
+
+    def on_new_sample(self, appsink):
+        sample = appsink.emit("pull-sample")
+        if not sample:
+            return Gst.FlowReturn.OK
+        buf = sample.get_buffer()
+        appsrcs = self.appsrcs
+        if not appsrcs:
+            self.dropped += 1
+            return Gst.FlowReturn.OK
+        for appsrc in appsrcs:
+            if appsrc.get_property('current-level-bytes') >= appsrc.get_property('max-bytes'):
+                self.dropped += 1
+                continue
+            appsrc.emit("push-buffer", buf)
+            self.pushed += 1
+        return Gst.FlowReturn.OK
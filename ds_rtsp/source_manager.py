@@ -0,0 +1,198 @@
+import sys
+import time
+import gi
+
+gi.require_version('Gst', '1.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib, Gst
+
+
+def is_network_source(path):
+    return path.startswith(("rtsp://", "rtsps://", "http://", "https://"))
+
+
+class SourceState:
+    """
+    Watchdog state of one source bin.
+    """
+    __slots__ = ('source', 'source_bin', 'failed_bin', 'last_buffer', 'failures', 'started', 'pending')
+
+    def __init__(self, source):
+        self.source = source
+        self.source_bin = None
+        self.failed_bin = None  # torn down, its elements may still post errors
+        self.last_buffer = 0.0
+        self.failures = 0
+        self.started = 0.0
+        self.pending = False    # a restart is scheduled
+
+
+class SourceManager:
+    """
+    Restarts failing network sources without stopping the pipeline.
+
+    A source is restarted when its bin posts an error, sends EOS, or has not
+    produced a buffer for `stall_timeout` seconds (plus `connect_timeout`
+    right after it was started). Only the source bin is torn down and
+    re-added: the muxer pad is released and requested again, inference and
+    the RTSP server keep running. Restarts back off exponentially from
+    `backoff` to `max_backoff` seconds; a source that has been running for
+    `max_backoff` seconds is considered healthy again.
+
+    `on_source_added` is called with (source, source_bin) for every bin
+    (re)added, to attach per-source probes again.
+
+    Sources can also be added and removed at runtime with add_source() and
+    remove_source(), on muxer pads below the batch size the pipeline was
+    built for.
+    """
+
+    def __init__(self, pipeline, streammux, stall_timeout=5.0, connect_timeout=10.0,
+                 backoff=1.0, max_backoff=60.0, on_source_added=None, cpu_stand_ins=False,
+                 clock=time.monotonic):
+        self.pipeline = pipeline
+        self.streammux = streammux
+        self.stall_timeout = stall_timeout
+        self.connect_timeout = connect_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_source_added = on_source_added
+        self.cpu_stand_ins = cpu_stand_ins
+        self.clock = clock
+        self.states = {}
+        self.restarts = {}
+
+    def watch(self, source, source_bin=None):
+        """
+        Start watching a source whose bin is already in the pipeline.
+        """
+        state = self.states[source.index] = SourceState(source)
+        self.restarts.setdefault(source.index, 0)
+        self.track(state, source_bin or self.pipeline.get_by_name(source.name))
+
+    def track(self, state, source_bin):
+        state.source_bin = source_bin
+        state.failed_bin = None
+        state.started = self.clock()
+        state.last_buffer = state.started + self.connect_timeout
+        state.pending = False
+        srcpad = source_bin.get_static_pad("src")
+        srcpad.add_probe(Gst.PadProbeType.BUFFER, self.buffer_probe, state)
+        srcpad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self.eos_probe, state)
+
+    def attach(self, interval_ms=500):
+        GLib.timeout_add(interval_ms, self.check)
+
+    def buffer_probe(self, pad, info, state):
+        state.last_buffer = self.clock()
+        return Gst.PadProbeReturn.OK
+
+    def eos_probe(self, pad, info, state):
+        if info.get_event().type != Gst.EventType.EOS:
+            return Gst.PadProbeReturn.OK
+        # The muxer must not see it, or it ends the batch for good
+        GLib.idle_add(self.fail, state, "end of stream")
+        return Gst.PadProbeReturn.DROP
+
+    def handle_message(self, message):
+        """
+        Take over error messages from source bins. Returns True if the
+        message was handled and must not reach bus_call.
+
+        An error often comes with more from other elements of the same bin,
+        still queued on the bus when fail() has torn it down; those from the
+        bin waiting for its restart are dropped.
+        """
+        if message.type != Gst.MessageType.ERROR:
+            return False
+        for state in self.states.values():
+            if state.source_bin and message.src.has_as_ancestor(state.source_bin):
+                err, debug = message.parse_error()
+                self.fail(state, "%s: %s" % (err, debug))
+                return True
+            if state.failed_bin and message.src.has_as_ancestor(state.failed_bin):
+                return True
+        return False
+
+    def check(self):
+        now = self.clock()
+        for state in list(self.states.values()):
+            if state.pending:
+                continue
+            if now - state.last_buffer > self.stall_timeout:
+                self.fail(state, "no buffers for %.1f s" % (now - state.last_buffer))
+            elif state.failures and now - state.started > self.max_backoff:
+                state.failures = 0
+        return True
+
+    def fail(self, state, reason):
+        if state.pending:
+            return False
+        state.pending = True
+        delay = min(self.backoff * 2 ** state.failures, self.max_backoff)
+        state.failures += 1
+        sys.stderr.write("Source %d (%s) failed: %s. Restarting in %.0f s\n" % (
+            state.source.index, state.source.path, reason, delay))
+        if state.source_bin:
+            self.remove_bin(state.source, state.source_bin)
+            state.failed_bin = state.source_bin
+            state.source_bin = None
+        GLib.timeout_add(int(delay * 1000), self.restart, state)
+        return False
+
+    def add_source(self, source, watch=False):
+        """
+        Add a source at runtime, watched for failures with `watch`.
+        """
+        source_bin = self.add_bin(source)
+        if source_bin and watch:
+            self.watch(source, source_bin)
+        return source_bin
+
+    def remove_source(self, source):
+        """
+        Remove a source at runtime, cancelling a pending restart.
+        """
+        state = self.states.pop(source.index, None)
+        self.restarts.pop(source.index, None)
+        source_bin = self.pipeline.get_by_name(source.name)
+        if state:
+            state.source_bin = None
+        if source_bin:
+            self.remove_bin(source, source_bin)
+
+    def remove_bin(self, source, source_bin):
+        if source_bin.set_state(Gst.State.NULL) == Gst.StateChangeReturn.FAILURE:
+            sys.stderr.write(" Unable to stop source bin %s \n" % source_bin.get_name())
+        sinkpad = self.streammux.get_static_pad("sink_%u" % source.index)
+        if sinkpad:
+            sinkpad.send_event(Gst.Event.new_flush_stop(False))
+            self.streammux.release_request_pad(sinkpad)
+        self.pipeline.remove(source_bin)
+
+    def add_bin(self, source):
+        source_bin = source.build(self.cpu_stand_ins)
+        if not source_bin:
+            return None
+        self.pipeline.add(source_bin)
+        sinkpad = self.streammux.get_request_pad("sink_%u" % source.index)
+        if not sinkpad or source_bin.get_static_pad("src").link(sinkpad) != Gst.PadLinkReturn.OK:
+            sys.stderr.write(" Unable to link %s to the streammux \n" % source.name)
+        if self.on_source_added:
+            self.on_source_added(source, source_bin)
+        source_bin.sync_state_with_parent()
+        return source_bin
+
+    def restart(self, state):
+        if self.states.get(state.source.index) is not state:
+            # Removed in the meantime
+            return False
+        print("Restarting source %d (%s)" % (state.source.index, state.source.path))
+        source_bin = self.add_bin(state.source)
+        self.restarts[state.source.index] += 1
+        if not source_bin:
+            state.pending = False
+            self.fail(state, "unable to create source bin")
+            return False
+        self.track(state, source_bin)
+        return False
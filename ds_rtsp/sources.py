@@ -0,0 +1,344 @@
+import collections
+import sys
+import gi
+
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from ds_rtsp.elements import ElementSpec, build_chain, describe_chain, queue_spec
+
+# Frame rate assumed for sources whose rate is unknown before negotiation
+# (files and RTSP cameras behind uridecodebin).
+DEFAULT_FRAMERATE = 30
+
+# Frame rate requested from v4l2 webcams.
+V4L2_FRAMERATE = 30
+
+DEFAULT_TEST_SIZE = (1280, 720)
+
+NVMM_NV12_CAPS = "video/x-raw(memory:NVMM), format=NV12"
+
+# Webcam capture formats, cheapest first. NV12 and YUY2 go straight into
+# nvvideoconvert, which converts on the VIC; MJPEG is decoded by the
+# hardware JPEG decoder but needs jpegparse on the CPU.
+CAPTURE_FORMATS = collections.OrderedDict([
+    ("nv12", "video/x-raw, format=NV12"),
+    ("yuy2", "video/x-raw, format=YUY2"),
+    ("mjpeg", "image/jpeg"),
+])
+
+
+def is_v4l2_device(path):
+    return path.startswith("/dev/video")
+
+
+def is_test_source(path):
+    return path.startswith("videotestsrc")
+
+
+def source_framerate(path):
+    """
+    Frame rate of an input before its caps are negotiated, used to size the
+    streammux push timeout at startup. Exact for webcams and test patterns,
+    whose caps fix it; a guess for URIs until caps_framerate() is known.
+    """
+    if is_v4l2_device(path):
+        return V4L2_FRAMERATE
+    return DEFAULT_FRAMERATE
+
+
+def caps_framerate(caps):
+    """
+    Frame rate of negotiated caps, or None when they leave it unknown or
+    variable (0/1).
+    """
+    if not caps or caps.get_size() == 0:
+        return None
+    found, numerator, denominator = caps.get_structure(0).get_fraction("framerate")
+    if not found or numerator <= 0 or denominator <= 0:
+        return None
+    return numerator / float(denominator)
+
+
+def probe_device_caps(device):
+    """
+    Caps a v4l2 device can produce, or None when it cannot be opened.
+    """
+    if not Gst.is_initialized():
+        Gst.init(None)
+    src = Gst.ElementFactory.make("v4l2src", None)
+    if not src:
+        return None
+    src.set_property("device", device)
+    if src.set_state(Gst.State.READY) == Gst.StateChangeReturn.FAILURE:
+        src.set_state(Gst.State.NULL)
+        return None
+    caps = src.get_static_pad("src").query_caps(None)
+    src.set_state(Gst.State.NULL)
+    return caps
+
+
+def capture_caps(capture_format):
+    return Gst.Caps.from_string("%s, framerate=%d/1" % (CAPTURE_FORMATS[capture_format], V4L2_FRAMERATE))
+
+
+def capture_formats(caps):
+    """
+    Formats of CAPTURE_FORMATS in `caps` at V4L2_FRAMERATE, cheapest first.
+    """
+    return [name for name in CAPTURE_FORMATS if caps.can_intersect(capture_caps(name))]
+
+
+def capture_size(caps, capture_format):
+    """
+    Largest (width, height) in `caps` for the format at V4L2_FRAMERATE, or
+    None when the sizes are not listed as fixed values.
+    """
+    sizes = []
+    offered = caps.intersect(capture_caps(capture_format))
+    for i in range(offered.get_size()):
+        structure = offered.get_structure(i)
+        width = structure.get_int("width")
+        height = structure.get_int("height")
+        if width[0] and height[0]:
+            sizes.append((width[1], height[1]))
+    if not sizes:
+        return None
+    return max(sizes, key=lambda size: size[0] * size[1])
+
+
+def choose_capture(device, requested="auto"):
+    """
+    (format, size) to capture from a webcam. With "auto", the cheapest
+    format the device offers at V4L2_FRAMERATE; size is None when unknown.
+    """
+    caps = probe_device_caps(device)
+    if caps is None:
+        if requested == "auto":
+            print("WARNING: Unable to probe %s for %d fps capture formats, trying yuy2" % (device, V4L2_FRAMERATE))
+            requested = "yuy2"
+        return requested, None
+    if requested == "auto":
+        formats = capture_formats(caps)
+        if not formats:
+            print("WARNING: %s offers none of %s at %d fps, trying yuy2" % (
+                device, "/".join(CAPTURE_FORMATS), V4L2_FRAMERATE))
+            return "yuy2", None
+        print("%s offers %s at %d fps, capturing %s" % (device, "/".join(formats), V4L2_FRAMERATE, formats[0]))
+        requested = formats[0]
+    return requested, capture_size(caps, requested)
+
+
+def discover_size(uri, timeout=5):
+    """
+    (width, height) of the first video stream of a file URI, or None.
+    Network streams are not probed, connecting to them takes too long.
+    """
+    if not uri.startswith("file://"):
+        return None
+    gi.require_version('GstPbutils', '1.0')
+    from gi.repository import GLib, GstPbutils
+    if not Gst.is_initialized():
+        Gst.init(None)
+    try:
+        info = GstPbutils.Discoverer.new(timeout * Gst.SECOND).discover_uri(uri)
+    except GLib.Error as err:
+        sys.stderr.write("Unable to discover %s: %s\n" % (uri, err))
+        return None
+    streams = info.get_video_streams()
+    if not streams:
+        return None
+    return streams[0].get_width(), streams[0].get_height()
+
+
+def parse_size(value):
+    """
+    "WIDTHxHEIGHT" as a (width, height) tuple.
+    """
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def batched_push_timeout(framerates):
+    """
+    Return the nvstreammux batched-push-timeout (in microseconds) for the
+    given source frame rates.
+
+    The muxer should not wait longer than one frame interval of the fastest
+    source for a batch to fill up, otherwise a stalled camera holds back all
+    the others.
+    """
+    if not framerates:
+        return int(1000000 / DEFAULT_FRAMERATE)
+    return int(1000000 / max(framerates))
+
+
+def tiler_grid(number_sources):
+    """
+    Return (rows, columns) of the smallest near-square grid holding all
+    sources.
+    """
+    columns = 1
+    while columns * columns < number_sources:
+        columns += 1
+    rows = (number_sources + columns - 1) // columns
+    return rows, columns
+
+
+def source_bin_name(index):
+    return "source-bin-%02d" % index
+
+
+class SourceSpec:
+    """
+    One input of the pipeline: a chain of element specs ending in NVMM NV12
+    frames, wrapped in a bin with a "src" ghost pad when built.
+
+    Device paths (/dev/videoN) are captured with v4l2src,
+    "videotestsrc[:pattern][@WIDTHxHEIGHT]" selects a live test pattern and
+    anything else is treated as a URI for uridecodebin, whose first element
+    then has dynamic pads. With a queue policy, the bin ends in a queue so
+    that decoding runs on its own thread.
+
+    `size` is the resolution the source delivers, when it is known before
+    negotiation. With `scale`, the source bin's nvvideoconvert scales the
+    frames to that (width, height) before the muxer.
+
+    In live mode the queue sits right after the capture caps instead, so
+    that frames dropped by a leaky queue are never converted, and RTSP
+    sources drop packets that arrive later than `rtsp_latency` ms.
+    """
+
+    def __init__(self, index, path, queue=None, live=False, rtsp_latency=200, capture_format="auto",
+                 scale=None):
+        self.index = index
+        self.path = path
+        self.name = source_bin_name(index)
+        self.dynamic = False
+        self.live = live
+        self.rtsp_latency = rtsp_latency
+        self.capture_format = None
+        self.size = None
+        if is_v4l2_device(path):
+            self.capture_format, self.size = choose_capture(path, capture_format)
+            self.specs = self.v4l2_specs()
+        elif is_test_source(path):
+            self.size = DEFAULT_TEST_SIZE
+            if "@" in path:
+                self.size = parse_size(path.split("@", 1)[1])
+            self.specs = self.test_specs()
+        else:
+            self.dynamic = True
+            self.size = discover_size(path)
+            self.specs = self.uri_specs()
+        nvmm_caps = NVMM_NV12_CAPS
+        if scale:
+            self.size = scale
+            nvmm_caps += ", width=%d, height=%d" % scale
+        self.specs += [
+            ElementSpec("nvvideoconvert", "%s-nvvidconv" % self.name),
+            ElementSpec("capsfilter", "%s-nvmm-caps" % self.name, {"caps": nvmm_caps}),
+        ]
+        if queue is not None:
+            position = len(self.specs)
+            if live:
+                position = 1 + [spec.factory for spec in self.specs].index("capsfilter")
+            self.specs.insert(position, queue_spec("%s-queue" % self.name, queue))
+
+    def fit(self, size):
+        """
+        Scale the frames to `size` at the end of the bin. Only for CPU
+        stand-ins: the funnel standing in for nvstreammux does not scale,
+        and the encoder behind it takes a single resolution. Sources of
+        another aspect ratio get borders.
+        """
+        self.specs += [
+            ElementSpec("videoscale", "%s-fit" % self.name),
+            ElementSpec("capsfilter", "%s-fit-caps" % self.name, {
+                "caps": "video/x-raw, width=%d, height=%d, pixel-aspect-ratio=1/1" % size}),
+        ]
+
+    def uri_specs(self):
+        return [ElementSpec("uridecodebin", "%s-decoder" % self.name, {"uri": self.path})]
+
+    def v4l2_specs(self):
+        # No CPU colour conversion: raw frames go straight to nvvideoconvert
+        # and MJPEG to the hardware decoder
+        specs = [
+            ElementSpec("v4l2src", "%s-usb-cam" % self.name, {"device": self.path}),
+            ElementSpec("capsfilter", "%s-v4l2src-caps" % self.name, {"caps": self.v4l2_caps()}),
+        ]
+        if self.capture_format == "mjpeg":
+            specs += [
+                ElementSpec("jpegparse", "%s-jpegparse" % self.name),
+                ElementSpec("nvv4l2decoder", "%s-jpegdec" % self.name, {"mjpeg": 1}),
+            ]
+        return specs
+
+    def v4l2_caps(self):
+        caps = "%s, framerate=%d/1" % (CAPTURE_FORMATS[self.capture_format], V4L2_FRAMERATE)
+        if self.size:
+            caps += ", width=%d, height=%d" % self.size
+        return caps
+
+    def test_specs(self):
+        properties = {"is-live": True}
+        pattern = self.path.split("@", 1)[0]
+        if ":" in pattern:
+            properties["pattern"] = pattern.split(":", 1)[1]
+        return [
+            ElementSpec("videotestsrc", "%s-test" % self.name, properties),
+            ElementSpec("capsfilter", "%s-test-caps" % self.name, {
+                "caps": "video/x-raw, width=%d, height=%d, framerate=%d/1" % (self.size + (DEFAULT_FRAMERATE,))}),
+        ]
+
+    def framerate(self):
+        return source_framerate(self.path)
+
+    def describe(self, cpu_stand_ins=False):
+        return describe_chain(self.specs, cpu_stand_ins)
+
+    def build(self, cpu_stand_ins=False):
+        print("Creating source bin %s for %s" % (self.name, self.path))
+        nbin = Gst.Bin.new(self.name)
+        if not nbin:
+            sys.stderr.write(" Unable to create source bin \n")
+            return None
+        if self.dynamic:
+            head = self.specs[0].build(cpu_stand_ins)
+            nbin.add(head)
+            elements = [head] + build_chain(self.specs[1:], nbin, cpu_stand_ins)
+            head.connect("pad-added", on_decodebin_pad_added, elements[1])
+            if self.live:
+                head.connect("source-setup", on_live_source_setup, self.rtsp_latency)
+        else:
+            elements = build_chain(self.specs, nbin, cpu_stand_ins)
+
+        ghost_pad = Gst.GhostPad.new("src", elements[-1].get_static_pad("src"))
+        if not ghost_pad or not nbin.add_pad(ghost_pad):
+            sys.stderr.write(" Failed to add ghost pad in source bin \n")
+            return None
+        return nbin
+
+
+def on_decodebin_pad_added(decodebin, pad, downstream):
+    caps = pad.get_current_caps()
+    if not caps:
+        caps = pad.query_caps(None)
+    gst_struct = caps.get_structure(0)
+    pad_name = gst_struct.get_name()
+
+    print("Received new pad from %s: %s" % (decodebin.get_name(), pad_name))
+    if "video" in pad_name:
+        sinkpad = downstream.get_static_pad("sink")
+        if sinkpad.is_linked():
+            return
+        if pad.link(sinkpad) != Gst.PadLinkReturn.OK:
+            sys.stderr.write(" Unable to link %s to %s \n" % (decodebin.get_name(), downstream.get_name()))
+
+
+def on_live_source_setup(decodebin, source, rtsp_latency):
+    # Late packets are dropped instead of growing the jitter buffer
+    if source.find_property("drop-on-latency"):
+        source.set_property("drop-on-latency", True)
+        source.set_property("latency", rtsp_latency)
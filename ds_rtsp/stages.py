@@ -0,0 +1,242 @@
+import collections
+import configparser
+
+from common.is_aarch_64 import is_aarch64
+from ds_rtsp.elements import ElementSpec, queue_spec
+from ds_rtsp.engine_cache import engine_batch_size, model_infer_config
+from ds_rtsp.models import infer_config_path, model_input_size, read_infer_config
+from ds_rtsp.sources import batched_push_timeout, tiler_grid
+
+# A named run of elements in the pipeline. The trunk is a list of stages
+# linked one after the other, each output branch is a single stage.
+Stage = collections.namedtuple("Stage", ["name", "specs"])
+
+# nvtracker properties read from the [tracker] section of the tracker config,
+# with the type they are parsed as
+TRACKER_PROPERTIES = collections.OrderedDict([
+    ("tracker-width", int),
+    ("tracker-height", int),
+    ("gpu-id", int),
+    ("ll-lib-file", str),
+    ("ll-config-file", str),
+    ("enable-batch-process", int),
+    ("enable-past-frame", int),
+])
+
+# Places a queue can be inserted, in pipeline order: the end of each source
+# bin, after the muxer, after inference, after the tracker, and in the RTSP
+# branch in front of the OSD and in front of the encoder.
+QUEUE_BOUNDARIES = ("source", "mux", "inference", "tracker", "osd", "encode")
+
+# Queues are kept short: NVMM buffers come from small fixed pools, and a
+# long queue only adds latency once a stage falls behind.
+DEFAULT_QUEUE_POLICY = collections.OrderedDict([
+    ("max-size-buffers", 2),
+    ("max-size-bytes", 0),
+    ("max-size-time", 0),
+    ("leaky", "no"),
+])
+
+# Source queues in live mode: at most one pending frame per source, older
+# frames are dropped for the newest one
+LIVE_SOURCE_QUEUE_POLICY = {"max-size-buffers": 1, "leaky": "downstream"}
+
+
+def queue_policy(config, boundary):
+    """
+    Properties of the queue at `boundary`, or None when there is none.
+    config["queues"] maps boundaries to property overrides; queue_size and
+    queue_leaky apply to all of them. Live mode always has source queues.
+    """
+    live_source = config["live"] and boundary == "source"
+    if boundary not in config["queues"] and not live_source:
+        return None
+    policy = collections.OrderedDict(DEFAULT_QUEUE_POLICY)
+    if config["queue_size"]:
+        policy["max-size-buffers"] = config["queue_size"]
+    if config["queue_leaky"]:
+        policy["leaky"] = config["queue_leaky"]
+    if live_source:
+        policy.update(LIVE_SOURCE_QUEUE_POLICY)
+    policy.update(config["queues"].get(boundary) or {})
+    return policy
+
+
+def boundary_queue(config, boundary):
+    """
+    The queue at `boundary` as a list of zero or one spec.
+    """
+    policy = queue_policy(config, boundary)
+    if policy is None:
+        return []
+    return [queue_spec("queue-%s" % boundary, policy)]
+
+
+# Muxer resolution when no source size is known before negotiation
+FALLBACK_MUX_SIZE = (1280, 720)
+
+
+def mux_size(config, sources):
+    """
+    (width, height) of the batched frames. Unless set in the config, this is
+    the size of the largest source, so that no source is upscaled. When
+    nothing is rendered, frames only need to cover the model input and are
+    scaled down further.
+    """
+    if config["mux_width"] and config["mux_height"]:
+        return config["mux_width"], config["mux_height"]
+    sizes = [source.size or FALLBACK_MUX_SIZE for source in sources] or [FALLBACK_MUX_SIZE]
+    width, height = max(sizes, key=lambda size: size[0] * size[1])
+    if config["output"] == "metadata-only":
+        model_width, model_height = model_input_size(config)
+        scale = max(model_width / float(width), model_height / float(height))
+        if scale < 1:
+            width, height = int(width * scale + 0.5), int(height * scale + 0.5)
+    # nvstreammux wants even dimensions for NV12
+    return width // 2 * 2, height // 2 * 2
+
+
+def batch_capacity(config):
+    """
+    Batch size of the muxer and nvinfer: the number of inputs, or more with
+    max_sources so that sources can be added at runtime. nvinfer cannot
+    change its batch size without reloading the engine.
+    """
+    return max(len(config["inputs"]), config["max_sources"] or 0)
+
+
+def mux_stage(config, sources, size):
+    width, height = size
+    streammux = ElementSpec("nvstreammux", "Stream-muxer", {
+        "width": width,
+        "height": height,
+        "batch-size": batch_capacity(config),
+        "batched-push-timeout": batched_push_timeout([source.framerate() for source in sources]),
+    })
+    if config["mux_padding"]:
+        # Scale sources of another aspect ratio without distorting them
+        streammux.set("enable-padding", 1)
+    if config["live"]:
+        streammux.set("live-source", 1)
+    return Stage("mux", [streammux] + boundary_queue(config, "mux"))
+
+
+def generates_infer_config(config):
+    return bool(config["model"] or config["engine_cache"])
+
+
+def write_infer_configs(config, batch_size):
+    """
+    Write the infer config inference_stage() names, if it is a generated
+    one. Called when the pipeline is built, so that composing it (e.g. for
+    --print-pipeline) writes no files.
+    """
+    if generates_infer_config(config):
+        model_infer_config(config, config["model"], batch_size)
+
+
+def inference_stage(config, batch_size):
+    if generates_infer_config(config):
+        # Generated for the batch size, nothing to override; written by
+        # write_infer_configs()
+        path = infer_config_path(config["pgie_config"], config["model"], batch_size)
+        pgie = ElementSpec("nvinfer", "primary-inference", {"config-file-path": path})
+        return Stage("inference", [pgie] + boundary_queue(config, "inference"))
+
+    pgie = ElementSpec("nvinfer", "primary-inference", {"config-file-path": config["pgie_config"]})
+    # Set after config-file-path so that it wins over the file
+    properties = read_infer_config(config["pgie_config"])
+    pgie_batch_size = int(properties.get("batch-size", 1))
+    if pgie_batch_size != batch_size:
+        print("WARNING: Overriding infer-config batch-size %d with number of sources %d" % (
+            pgie_batch_size, batch_size))
+        pgie.set("batch-size", batch_size)
+    engine = properties.get("model-engine-file")
+    if engine and engine_batch_size(engine) not in (None, batch_size):
+        print("WARNING: %s was built for batch-size %d, nvinfer will build a new engine at startup. "
+              "Use --engine-cache to keep engines per batch size" % (engine, engine_batch_size(engine)))
+    return Stage("inference", [pgie] + boundary_queue(config, "inference"))
+
+
+def tracker_stage(config):
+    tracker = ElementSpec("nvtracker", "tracker")
+    parser = configparser.ConfigParser()
+    parser.read(config["tracker_config"])
+    if parser.has_section("tracker"):
+        for key, kind in TRACKER_PROPERTIES.items():
+            if parser.has_option("tracker", key):
+                value = parser.get("tracker", key)
+                tracker.set(key, int(value) if kind is int else value)
+    return Stage("tracker", [tracker] + boundary_queue(config, "tracker"))
+
+
+def rtsp_stage(config, number_sources):
+    """
+    Elements rendering the batch into the RTSP stream:
+    [valve ->] [tiler ->] [queue ->] nvvidconv -> nvosd -> nvvidconv_postosd -> caps -> [queue ->]
+    encoder -> rtppay -> udpsink/appsink
+    """
+    specs = []
+    # With encode_on_demand the whole branch sits behind a valve that is
+    # closed while no RTSP client is connected
+    if config["encode_on_demand"]:
+        specs.append(ElementSpec("valve", "encode-valve"))
+
+    # Composite the batch into a single frame for the RTSP output
+    if number_sources > 1:
+        rows, columns = tiler_grid(number_sources)
+        specs.append(ElementSpec("nvmultistreamtiler", "nvtiler", {
+            "rows": rows,
+            "columns": columns,
+            "width": config["tiler_width"],
+            "height": config["tiler_height"],
+        }))
+
+    nvosd = ElementSpec("nvdsosd", "onscreendisplay")
+    if config["label_mode"] == "none":
+        nvosd.set("display-text", 0)
+
+    codec = config["codec"]
+    encoder = ElementSpec("nvv4l2%senc" % codec.lower(), "encoder", {"bitrate": config["bitrate"]})
+    if is_aarch64():
+        encoder.set("preset-level", 1)
+        encoder.set("insert-sps-pps", 1)
+        encoder.set("bufapi-version", 1)
+    elif config["record_dir"]:
+        # Clips start on any keyframe of the ring, which needs the SPS/PPS
+        # in front of it to be decodable
+        encoder.set("insert-sps-pps", 1)
+
+    specs += boundary_queue(config, "osd") + [
+        ElementSpec("nvvideoconvert", "convertor"),
+        nvosd,
+        ElementSpec("nvvideoconvert", "convertor_postosd"),
+        ElementSpec("capsfilter", "filter", {"caps": "video/x-raw(memory:NVMM), format=I420"}),
+    ] + boundary_queue(config, "encode") + [
+        encoder,
+        ElementSpec("rtp%spay" % codec.lower(), "rtppay"),
+    ]
+
+    if config["rtsp_transport"] == "appsrc":
+        # Handed to the RTSP media in-process, see RtpHandoff
+        specs.append(ElementSpec("appsink", "rtp-appsink"))
+    else:
+        specs.append(ElementSpec("udpsink", "udpsink", {
+            "host": "224.224.255.255",
+            "port": config["udp_port"],
+            "async": False,
+            "sync": True,
+        }))
+    return Stage("rtsp", specs)
+
+
+def metadata_stage(config):
+    """
+    Terminates the pipeline after the tracker, without rendering anything.
+    """
+    sink = ElementSpec("fakesink", "metadata-sink", {
+        "sync": False,
+        "async": False,
+        "enable-last-sample": False,
+    })
+    return Stage("metadata", [sink])
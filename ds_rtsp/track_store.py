@@ -0,0 +1,127 @@
+import numpy as np
+
+# Bookkeeping fields every record has
+BASE_FIELDS = [
+    ("first_seen", np.int64),
+    ("last_seen", np.int64),
+]
+
+
+class TrackStore:
+    """
+    Per track state keyed by (source_id, object_id), in one structured array
+    with a row (slot) per track.
+
+    nvtracker IDs only ever increase, so on a camera running for days a
+    dict of per track objects grows without bound. Here a track's slot is
+    freed once it has not been seen for `ttl` updates (one update per
+    batch, i.e. per frame of each source), and the store holds no more than
+    `max_tracks` rows: at the cap, a new track takes the slot of the track
+    seen least recently, never one seen in the current update. The array
+    starts at `capacity` rows and doubles up to `max_tracks`, so memory is
+    bounded by max_tracks times the record size; only a single batch with
+    more than max_tracks tracks grows it further, to fit that batch.
+
+    `fields` are numpy dtype fields added to each record, e.g.
+    [("anchor", np.float32, (2,))]. New records are zeroed. `on_release`
+    is called as on_release(slot, key) right before a track expires or is
+    evicted, while its record can still be read.
+    """
+
+    def __init__(self, fields=(), max_tracks=4096, ttl=150, capacity=256, on_release=None):
+        self.dtype = np.dtype(BASE_FIELDS + list(fields))
+        self.max_tracks = max_tracks
+        self.ttl = ttl
+        self.on_release = on_release
+        capacity = min(capacity, max_tracks)
+        self.records = np.zeros(capacity, self.dtype)
+        self.live = np.zeros(capacity, bool)
+        self.keys = [None] * capacity
+        self.slots = {}
+        self.free = list(range(capacity - 1, -1, -1))
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def lookup(self, keys, now):
+        """
+        Slots of `keys`, and which of them are new tracks. Marks them seen
+        at `now`.
+        """
+        slots = np.empty(len(keys), np.int64)
+        new = np.zeros(len(keys), bool)
+        last_seen = self.records["last_seen"]
+        for i, key in enumerate(keys):
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.allocate(key, now, len(keys) - i)
+                last_seen = self.records["last_seen"]
+                new[i] = True
+            last_seen[slot] = now
+            slots[i] = slot
+        return slots, new
+
+    def allocate(self, key, now, pending=1):
+        if not self.free:
+            if len(self.keys) < self.max_tracks:
+                self.grow(min(len(self.keys) * 2, self.max_tracks))
+            elif not self.evict(now):
+                # Every track was seen in this update: the slots of the keys
+                # looked up before in the batch must stay valid, make room
+                # for the `pending` keys left instead
+                self.grow(len(self.keys) + pending)
+        slot = self.free.pop()
+        self.slots[key] = slot
+        self.keys[slot] = key
+        self.live[slot] = True
+        self.records[slot] = 0
+        self.records["first_seen"][slot] = now
+        self.created += 1
+        return slot
+
+    def grow(self, size):
+        old = len(self.keys)
+        self.records = np.concatenate([self.records, np.zeros(size - old, self.dtype)])
+        self.live = np.concatenate([self.live, np.zeros(size - old, bool)])
+        self.keys.extend([None] * (size - old))
+        self.free.extend(range(size - 1, old - 1, -1))
+
+    def release(self, slot):
+        if self.on_release:
+            self.on_release(slot, self.keys[slot])
+        del self.slots[self.keys[slot]]
+        self.keys[slot] = None
+        self.live[slot] = False
+        self.free.append(slot)
+
+    def evict(self, now):
+        # The live track seen least recently, all slots are live at the cap.
+        # False when it was seen at `now`, like every other.
+        slot = int(np.argmin(self.records["last_seen"]))
+        if self.records["last_seen"][slot] >= now:
+            return False
+        self.release(slot)
+        self.evicted += 1
+        return True
+
+    def expire(self, now):
+        """
+        Free the slots of tracks not seen for more than `ttl` updates.
+        """
+        stale = np.nonzero(self.live & (now - self.records["last_seen"] > self.ttl))[0]
+        for slot in stale.tolist():
+            self.release(slot)
+        self.expired += len(stale)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def stats(self):
+        return {
+            "live": len(self.slots),
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "capacity": len(self.keys),
+            "bytes": self.records.nbytes,
+        }
@@ -0,0 +1,128 @@
+"""
+Time BatchArrays against walking the batch metadata object by object, on
+synthetic batches from fake_pyds:
+
+    python3 tests/bench_batch_arrays.py [--sources 4] [--batches 300] [--repeat 3]
+
+Each consumer counts the objects per (source, class) above a confidence
+and inside a region, the kind of analytics the arrays are for: walking,
+every consumer casts each list node and reads each object again; with
+BatchArrays the batch is extracted once and each consumer counts
+vectorized, as export, clip triggers and analytics share one extraction
+in the pipeline. Rows are given for 1 and 3 consumers.
+
+The fake metadata is plain Python objects, so the absolute numbers are
+not those of pyds, where casts and attribute reads cost more, which adds
+to the walk once per consumer and to the extraction once.
+"""
+import argparse
+import gc
+import time
+
+import conftest  # noqa: F401, puts the repo on sys.path
+import numpy as np
+
+from ds_rtsp import fake_pyds
+from ds_rtsp.batch_arrays import BatchArrays
+
+NUM_CLASSES = 2
+MIN_CONFIDENCE = 0.5
+REGION = (320.0, 180.0, 960.0, 540.0)     # left, top, right, bottom
+
+
+def walk(batch_meta, num_sources):
+    """
+    The per-object loop analytics written against pyds run in the probe.
+    """
+    ds = fake_pyds
+    left, top, right, bottom = REGION
+    counts = [[0] * NUM_CLASSES for _ in range(num_sources)]
+    l_frame = batch_meta.frame_meta_list
+    while l_frame is not None:
+        frame_meta = ds.NvDsFrameMeta.cast(l_frame.data)
+        row = counts[frame_meta.source_id]
+        l_obj = frame_meta.obj_meta_list
+        while l_obj is not None:
+            obj_meta = ds.NvDsObjectMeta.cast(l_obj.data)
+            if obj_meta.confidence >= MIN_CONFIDENCE:
+                rect = obj_meta.rect_params
+                x = rect.left + rect.width / 2.0
+                y = rect.top + rect.height
+                if left <= x < right and top <= y < bottom:
+                    row[obj_meta.class_id] += 1
+            l_obj = l_obj.next
+        l_frame = l_frame.next
+    return counts
+
+
+def vectorized(objects, num_sources):
+    bbox = objects["bbox"]
+    x = bbox[:, 0] + bbox[:, 2] / 2.0
+    y = bbox[:, 1] + bbox[:, 3]
+    left, top, right, bottom = REGION
+    keep = (objects["confidence"] >= MIN_CONFIDENCE) & (left <= x) & (x < right) & (top <= y) & (y < bottom)
+    flat = objects["source_id"][keep].astype(np.int64) * NUM_CLASSES + objects["class_id"][keep]
+    return np.bincount(flat, minlength=num_sources * NUM_CLASSES).reshape(num_sources, NUM_CLASSES)
+
+
+def walks(consumers):
+    def count(batch_meta, num_sources):
+        return [walk(batch_meta, num_sources) for _ in range(consumers)]
+    return count
+
+
+def extract_and_count(arrays, consumers):
+    def count(batch_meta, num_sources):
+        objects = arrays.extract(batch_meta).objects()
+        return [vectorized(objects, num_sources) for _ in range(consumers)]
+    return count
+
+
+def time_batches(count, batches, num_sources):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for batch_meta in batches:
+            count(batch_meta, num_sources)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--batches", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+
+    arrays = BatchArrays(pyds_module=fake_pyds)
+    cases = [
+        ("walk, 1 consumer", walks(1)),
+        ("BatchArrays, 1 consumer", extract_and_count(arrays, 1)),
+        ("walk, 3 consumers", walks(3)),
+        ("BatchArrays, 3 consumers", extract_and_count(arrays, 3)),
+        ("BatchArrays.extract only", extract_and_count(arrays, 0)),
+    ]
+    object_counts = (1, 10, 50, 200)
+    print("%d batches of %d frames, microseconds per batch" % (args.batches, args.sources))
+    print("%-28s" % "objects per frame" + "".join("%10d" % n for n in object_counts))
+    batches = dict((n, [fake_pyds.synthetic_batch(args.sources, n, frame_num, seed=frame_num)
+                        for frame_num in range(args.batches)]) for n in object_counts)
+    for n in object_counts:
+        # Both sides count the same objects
+        objects = arrays.extract(batches[n][0]).objects()
+        assert walk(batches[n][0], args.sources) == vectorized(objects, args.sources).tolist()
+    for name, count in cases:
+        row = []
+        for n in object_counts:
+            # Grow the arrays to the batch size first
+            time_batches(count, batches[n][:2], args.sources)
+            seconds = min(time_batches(count, batches[n], args.sources) for _ in range(args.repeat))
+            row.append(seconds / args.batches * 1e6)
+        print("%-28s" % name + "".join("%10.1f" % value for value in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Time the metadata probes per frame on synthetic batches from fake_pyds,
+at 0, 10 and 100 objects per frame:
+
+    python3 tests/bench_probes.py [--sources 4] [--batches 300] [--repeat 3]
+
+The fake metadata is plain Python objects, so the absolute numbers are
+not those of pyds, and a fake display meta is allocated where DeepStream
+takes one from a pool. The differences between probes and object counts
+carry over.
+"""
+import argparse
+import gc
+import time
+
+import conftest  # noqa: F401, stand-ins for gi and common without PyGObject
+from ds_rtsp import analytics as analytics_module
+from ds_rtsp import fake_pyds
+from ds_rtsp import probes
+from ds_rtsp.analytics import Analytics, Line, Zone
+from ds_rtsp.probes import PipelineProbes
+
+
+class FakeBuffer:
+    def get_buffer(self):
+        return self
+
+
+def make_buffers(num_batches, num_sources, objects_per_frame):
+    buffers = []
+    for frame_num in range(num_batches):
+        buffer = FakeBuffer()
+        fake_pyds.attach_batch_meta(hash(buffer), fake_pyds.synthetic_batch(
+            num_sources, objects_per_frame, frame_num, seed=frame_num))
+        buffers.append(buffer)
+    return buffers
+
+
+def make_probes(with_analytics):
+    pipeline_probes = PipelineProbes()
+    if with_analytics:
+        analytics = Analytics([Zone("door", source_id, [[100, 100], [600, 100], [600, 600], [100, 600]])
+                               for source_id in range(4)],
+                              [Line("gate", 0, [[640, 0], [640, 720]])], 1280, 720)
+        pipeline_probes.overlays.append(analytics.draw)
+    return pipeline_probes
+
+
+def time_probe(probe, buffers):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for buffer in buffers:
+            probe(None, buffer, 0)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--batches", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+    probes.pyds = analytics_module.pyds = fake_pyds
+
+    cases = [
+        ("fps_count", lambda p: p.fps_count_probe, False),
+        ("overlay (FPS text)", lambda p: p.overlay_probe, False),
+        ("overlay (FPS text, zones)", lambda p: p.overlay_probe, True),
+        ("osd (strip object ids)", lambda p: p.osd_sink_pad_buffer_probe, False),
+    ]
+    frames = args.batches * args.sources
+    print("%d batches of %d frames, microseconds per frame" % (args.batches, args.sources))
+    print("%-28s %10s %10s %10s" % ("probe", "0 objects", "10", "100"))
+    for name, probe_of, with_analytics in cases:
+        row = []
+        for objects_per_frame in (0, 10, 100):
+            pipeline_probes = make_probes(with_analytics)
+            probe = probe_of(pipeline_probes)
+            # Warm up the FPS text and overlay caches
+            time_probe(probe, make_buffers(2, args.sources, objects_per_frame))
+            seconds = min(time_probe(probe, make_buffers(args.batches, args.sources, objects_per_frame))
+                          for _ in range(args.repeat))
+            row.append(seconds / frames * 1e6)
+        print("%-28s %10.1f %10.1f %10.1f" % tuple([name] + row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Throughput of the composed pipeline on CPU stand-ins, without queues and
+with a queue (and a streaming thread) at each stage boundary:
+
+    python3 tests/bench_queues.py [--inputs 2] [--frames 300] [--infer-ms 10] [--osd-ms 2]
+
+Needs GStreamer with PyGObject and x264enc, but no GPU. The pipeline is
+the one PipelineBuilder composes with --cpu-stand-ins, run as fast as it
+goes: the test sources are not live and the sink does not sync. The
+identity elements standing in for nvinfer and nvdsosd sleep --infer-ms and
+--osd-ms per buffer, in place of the time the GPU stages take.
+"""
+import argparse
+import sys
+import time
+
+try:
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+except (ImportError, ValueError) as e:
+    sys.stderr.write(" Unable to run the benchmark, it needs GStreamer: %s \n" % e)
+    sys.exit(1)
+
+import conftest  # noqa: F401, puts the repo and common on sys.path
+from ds_rtsp.builder import PipelineBuilder
+from ds_rtsp.config import load_config
+from ds_rtsp.stages import QUEUE_BOUNDARIES
+
+
+def build(args, boundaries):
+    config = load_config(defaults={
+        "inputs": ["videotestsrc:ball@%dx%d" % args.size] * args.inputs,
+        "cpu_stand_ins": True,
+        "queues": dict((boundary, {}) for boundary in boundaries),
+    })
+    builder = PipelineBuilder(config)
+    pipeline = builder.build()
+    for element in pipeline.iterate_recurse():
+        factory = element.get_factory()
+        if factory and factory.get_name() == "videotestsrc":
+            element.set_property("is-live", False)
+            element.set_property("num-buffers", args.frames)
+    pipeline.get_by_name("primary-inference").set_property("sleep-time", int(args.infer_ms * 1000))
+    pipeline.get_by_name("onscreendisplay").set_property("sleep-time", int(args.osd_ms * 1000))
+    Gst.util_set_object_arg(pipeline.get_by_name("encoder"), "speed-preset", args.preset)
+    pipeline.get_by_name("udpsink").set_property("sync", False)
+    return pipeline
+
+
+def run(args, boundaries):
+    pipeline = build(args, boundaries)
+    started = time.perf_counter()
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(
+        600 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    elapsed = time.perf_counter() - started
+    pipeline.set_state(Gst.State.NULL)
+    if not message or message.type != Gst.MessageType.EOS:
+        detail = message.parse_error()[0].message if message else "timed out"
+        return "%-40s failed: %s" % (",".join(boundaries) or "none", detail)
+    frames = args.inputs * args.frames
+    return "%-40s %8.1f %8.1f" % (",".join(boundaries) or "none", elapsed, frames / elapsed)
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--inputs", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=300, help="frames per input")
+    parser.add_argument("--size", type=parse_size, default=(1280, 720))
+    parser.add_argument("--infer-ms", type=float, default=10.0)
+    parser.add_argument("--osd-ms", type=float, default=2.0)
+    parser.add_argument("--preset", default="veryfast", help="x264enc speed-preset")
+    args = parser.parse_args()
+    Gst.init(None)
+
+    variants = [(), ("inference", "osd", "encode"), QUEUE_BOUNDARIES]
+    print("%-40s %8s %8s" % ("queues", "seconds", "fps"))
+    for boundaries in variants:
+        print(run(args, list(boundaries)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Latency and loss of the encoded RTP stream on its way to an RTSP client,
+through the UDP loopback (--rtsp-transport udp) and through the in-process
+handoff (--rtsp-transport appsrc):
+
+    python3 tests/bench_rtsp_handoff.py [--seconds 10] [--bitrate 8000] [--size 1920x1080]
+
+Needs GStreamer with PyGObject, gst-rtsp-server and x264enc, but no GPU:
+x264enc encodes, as with --cpu-stand-ins. Every RTP packet is stamped at
+the payloader's src pad and again where an in-process RTSP client
+(rtspsrc over TCP, so the client leg loses nothing) receives it, matched by
+sequence number. A packet sent while the client is connected and never
+received is lost between the payloader and the RTSP media.
+"""
+import argparse
+import sys
+import time
+
+try:
+    import gi
+    gi.require_version('Gst', '1.0')
+    gi.require_version('GstRtp', '1.0')
+    gi.require_version('GstRtspServer', '1.0')
+    from gi.repository import GLib, Gst, GstRtp, GstRtspServer
+except (ImportError, ValueError) as e:
+    sys.stderr.write(" Unable to run the benchmark, it needs GStreamer with gst-rtsp-server: %s \n" % e)
+    sys.exit(1)
+
+import conftest  # noqa: F401, puts the repo on sys.path
+from ds_rtsp.rtsp_output import RtpHandoff, appsrc_launch, udp_launch
+
+MOUNT = "/bench"
+# Packets still in flight when the run stops are not counted as lost
+TAIL_SECONDS = 0.5
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else float("nan")
+
+
+class PacketClock:
+    """
+    seqnum -> perf_counter() at a pad, for RTP buffers.
+    """
+
+    def __init__(self, pad):
+        self.times = {}
+        pad.add_probe(Gst.PadProbeType.BUFFER, self.probe, 0)
+
+    def probe(self, pad, info, u_data):
+        now = time.perf_counter()
+        ok, rtp = GstRtp.RTPBuffer.map(info.get_buffer(), Gst.MapFlags.READ)
+        if ok:
+            self.times[rtp.get_seq()] = now
+            rtp.unmap()
+        return Gst.PadProbeReturn.OK
+
+
+def run(transport, args, rtsp_port, udp_port):
+    width, height = args.size
+    sink = ("udpsink host=224.224.255.255 port=%d async=false sync=true" % udp_port
+            if transport == "udp" else "appsink name=rtp-appsink")
+    sender = Gst.parse_launch(
+        "videotestsrc is-live=true pattern=ball ! video/x-raw, width=%d, height=%d, framerate=30/1 ! "
+        "videoconvert ! x264enc tune=zerolatency speed-preset=ultrafast bitrate=%d key-int-max=30 ! "
+        "h264parse ! rtph264pay name=rtppay config-interval=1 pt=96 ! %s" % (
+            width, height, args.bitrate, sink))
+    sent = PacketClock(sender.get_by_name("rtppay").get_static_pad("src"))
+
+    server = GstRtspServer.RTSPServer.new()
+    server.props.service = "%d" % rtsp_port
+    factory = GstRtspServer.RTSPMediaFactory.new()
+    handoff = None
+    if transport == "appsrc":
+        factory.set_launch(appsrc_launch("H264"))
+        handoff = RtpHandoff(sender.get_by_name("rtp-appsink"))
+        handoff.attach(factory)
+    else:
+        factory.set_launch(udp_launch(udp_port, "H264"))
+    factory.set_shared(True)
+    server.get_mount_points().add_factory(MOUNT, factory)
+    server_source = server.attach(None)
+
+    client = Gst.parse_launch(
+        "rtspsrc location=rtsp://127.0.0.1:%d%s protocols=tcp latency=0 ! fakesink name=client-sink sync=false" % (
+            rtsp_port, MOUNT))
+    received = PacketClock(client.get_by_name("client-sink").get_static_pad("sink"))
+
+    loop = GLib.MainLoop()
+    sender.set_state(Gst.State.PLAYING)
+    GLib.timeout_add(1000, lambda: client.set_state(Gst.State.PLAYING) and False)
+    GLib.timeout_add(int((1 + args.seconds) * 1000), lambda: loop.quit() and False)
+    loop.run()
+    client.set_state(Gst.State.NULL)
+    sender.set_state(Gst.State.NULL)
+    GLib.source_remove(server_source)
+
+    if not received.times:
+        return "%-7s no packets reached the RTSP client" % transport
+    first = min(sent.times.get(seq, float("inf")) for seq in received.times)
+    last = max(sent.times.values()) - TAIL_SECONDS
+    window = [seq for seq, t in sent.times.items() if first <= t <= last]
+    lost = [seq for seq in window if seq not in received.times]
+    latencies = [(received.times[seq] - sent.times[seq]) * 1000.0 for seq in window if seq in received.times]
+    text = "%-7s %8d %7.2f%% %8.2f %8.2f %8.2f" % (
+        transport, len(window), 100.0 * len(lost) / max(len(window), 1),
+        percentile(latencies, 0.5), percentile(latencies, 0.95), percentile(latencies, 0.99))
+    if handoff:
+        text += "   (handoff: %d pushed, %d dropped)" % (handoff.pushed, handoff.dropped)
+    return text
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--bitrate", type=int, default=8000, help="x264enc bitrate in kbit/s")
+    parser.add_argument("--size", type=parse_size, default=(1920, 1080))
+    parser.add_argument("--rtsp-port", type=int, default=8654)
+    parser.add_argument("--udp-port", type=int, default=5454)
+    args = parser.parse_args()
+    Gst.init(None)
+
+    print("%-7s %8s %8s %8s %8s %8s" % ("path", "packets", "lost", "p50 ms", "p95 ms", "p99 ms"))
+    for offset, transport in enumerate(("udp", "appsrc")):
+        print(run(transport, args, args.rtsp_port + offset, args.udp_port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import importlib.util
+import os
+import platform
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class _Stub:
+    """
+    Stand-in for a GObject introspection namespace: every attribute and call
+    gives another stub. Attributes are kept, so Gst.PadProbeReturn.OK is the
+    same object on every read.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, name):
+        stub = _Stub("%s.%s" % (self._name, name))
+        setattr(self, name, stub)
+        return stub
+
+    def __call__(self, *args, **kwargs):
+        return _Stub("%s()" % self._name)
+
+    def __or__(self, other):
+        return self
+
+    def __repr__(self):
+        return "<stub %s>" % self._name
+
+
+def _have_gst():
+    try:
+        import gi
+        gi.require_version('Gst', '1.0')
+        from gi.repository import Gst
+    except (ImportError, ValueError):
+        return False
+    return True
+
+
+def _install_fake_gi():
+    """
+    The modules under test import gi at the top but only use it in code
+    the tests do not reach, apart from a few constants set here.
+    """
+    gi = types.ModuleType("gi")
+    gi.require_version = lambda namespace, version: None
+    repository = types.ModuleType("gi.repository")
+    for name in ("Gst", "GLib", "Gio", "GObject", "GstRtspServer", "GstVideo", "GstPbutils", "GstApp"):
+        setattr(repository, name, _Stub(name))
+    repository.Gst.SECOND = 1000000000
+    repository.Gst.CLOCK_TIME_NONE = 0xffffffffffffffff
+    gi.repository = repository
+    sys.modules["gi"] = gi
+    sys.modules["gi.repository"] = repository
+
+
+def _install_common():
+    """
+    deepstream_python_apps/apps/common, with the FPS.py of this repo as
+    the README installs it.
+    """
+    common = types.ModuleType("common")
+    common.__path__ = []
+    spec = importlib.util.spec_from_file_location("common.FPS", os.path.join(ROOT, "FPS.py"))
+    fps = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(fps)
+    is_aarch_64 = types.ModuleType("common.is_aarch_64")
+    is_aarch_64.is_aarch64 = lambda: platform.uname()[4] == 'aarch64'
+    bus_call = types.ModuleType("common.bus_call")
+    bus_call.bus_call = lambda bus, message, loop: True
+    common.FPS, common.is_aarch_64, common.bus_call = fps, is_aarch_64, bus_call
+    for module in (common, fps, is_aarch_64, bus_call):
+        sys.modules[module.__name__] = module
+
+
+# Tests that run real GStreamer elements (CPU stand-ins) skip without it
+HAVE_GST = _have_gst()
+if not HAVE_GST:
+    _install_fake_gi()
+try:
+    import common.FPS
+except ImportError:
+    _install_common()
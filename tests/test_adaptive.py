@@ -0,0 +1,151 @@
+import pytest
+
+from common.FPS import StreamRateMeter
+from ds_rtsp.adaptive import AdaptiveIntervalController, find_queues
+
+
+class FakeInfer:
+    def __init__(self, interval=0):
+        self.properties = {"interval": interval}
+
+    def get_property(self, name):
+        return self.properties[name]
+
+    def set_property(self, name, value):
+        self.properties[name] = value
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def controller(interval=0, input_rates=None, **kwargs):
+    rates = input_rates or {0: 25.0}
+    return AdaptiveIntervalController(FakeInfer(interval), StreamRateMeter(), rates.get, **kwargs)
+
+
+@pytest.mark.parametrize("interval, fps, target_fps, occupancy, expected", [
+    # Keeping up with a 25 fps source is not behind
+    (0, 25.0, 25.0, 0.0, 0),
+    (2, 25.0, 25.0, 0.0, 1),
+    (2, 24.5, 25.0, 0.0, 1),
+    # Within the band between lower and upper nothing changes
+    (2, 23.0, 25.0, 0.0, 2),
+    (2, 20.0, 25.0, 0.0, 3),
+    (2, 15.0, 15.0, 0.0, 1),
+    (2, 12.0, 15.0, 0.0, 3),
+    # Queues filling up raise the interval even at full rate
+    (2, 25.0, 25.0, 0.8, 3),
+    # Queues neither full nor empty hold it
+    (2, 25.0, 25.0, 0.3, 2),
+    # Floor and ceiling
+    (0, 30.0, 25.0, 0.0, 0),
+    (4, 10.0, 25.0, 0.0, 4),
+    (4, 25.0, 25.0, 0.9, 4),
+])
+def test_decide(interval, fps, target_fps, occupancy, expected):
+    assert controller(interval, floor=0, ceiling=4).decide(fps, target_fps, occupancy) == expected
+
+
+def run(adaptive, rates, updates, seconds=1.0):
+    """
+    Feed steady per-source output rates for `updates` one-second updates.
+    """
+    clock = FakeClock()
+    meter = adaptive.fps_meter = StreamRateMeter(clock=clock)
+    for _ in range(updates):
+        steps = 100
+        for step in range(steps):
+            clock.now += seconds / steps
+            for source_id, fps in rates.items():
+                # One tick per frame due in this step
+                due = int(clock.now * fps) - int((clock.now - seconds / steps) * fps)
+                for _ in range(due):
+                    meter.tick(source_id)
+        meter.publish()
+        adaptive.update()
+    return adaptive.interval
+
+
+@pytest.mark.parametrize("fps", [25.0, 15.0])
+def test_source_keeping_up_stays_at_floor(fps):
+    adaptive = controller(0, {0: fps}, ceiling=4)
+    assert run(adaptive, {0: fps}, 60) == 0
+
+
+def test_source_falling_behind_raises_interval():
+    adaptive = controller(0, {0: 25.0}, ceiling=4, settle=2)
+    assert run(adaptive, {0: 12.0}, 20) == 4
+
+
+def test_each_source_held_to_its_own_rate():
+    # 30 and 15 fps cameras both fully kept up with
+    adaptive = controller(0, {0: 30.0, 1: 15.0}, ceiling=4)
+    assert run(adaptive, {0: 30.0, 1: 15.0}, 60) == 0
+    # The 15 fps camera falls behind
+    adaptive = controller(0, {0: 30.0, 1: 15.0}, ceiling=4, settle=2)
+    assert run(adaptive, {0: 30.0, 1: 9.0}, 20) == 4
+
+
+def test_lowers_interval_once_caught_up():
+    adaptive = controller(3, {0: 25.0}, ceiling=4, settle=2, probe_wait=3)
+    assert run(adaptive, {0: 25.0}, 30) == 0
+
+
+def test_waits_for_input_rate():
+    adaptive = controller(2, {0: 0.0}, ceiling=4, settle=0)
+    assert run(adaptive, {0: 5.0}, 10) == 2
+
+
+class FakeFactory:
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+
+class FakeQueue(FakeInfer):
+    def __init__(self, name, leaky=0, max_size_buffers=2, factory="queue"):
+        FakeInfer.__init__(self)
+        self.name = name
+        self.factory = FakeFactory(factory)
+        self.properties.update({"leaky": leaky, "max-size-buffers": max_size_buffers,
+                                "max-size-bytes": 0, "max-size-time": 0,
+                                "current-level-buffers": 0, "current-level-bytes": 0, "current-level-time": 0})
+
+    def get_factory(self):
+        return self.factory
+
+
+class FakePipeline:
+    def __init__(self, elements):
+        self.elements = elements
+
+    def iterate_recurse(self):
+        return iter(self.elements)
+
+
+def test_leaky_and_single_buffer_queues_are_not_a_load_signal():
+    pipeline = FakePipeline([
+        FakeQueue("queue-inference"),
+        # --live source queue
+        FakeQueue("source-bin-00-queue", leaky=2, max_size_buffers=1),
+        FakeQueue("source-bin-01-queue", max_size_buffers=1),
+        FakeQueue("queue-encode", leaky=1, max_size_buffers=4),
+        FakeQueue("primary-inference", factory="nvinfer"),
+    ])
+    queues = find_queues(pipeline)
+    assert [queue.name for queue in queues] == ["queue-inference"]
+
+
+def test_live_source_queues_do_not_pin_ceiling():
+    live_queue = FakeQueue("source-bin-00-queue", leaky=2, max_size_buffers=1)
+    live_queue.properties["current-level-buffers"] = 1
+    adaptive = controller(2, {0: 25.0}, ceiling=4, settle=0, probe_wait=0,
+                          queues=find_queues(FakePipeline([live_queue, FakeQueue("queue-inference")])))
+    assert run(adaptive, {0: 25.0}, 10) == 0
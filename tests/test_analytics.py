@@ -0,0 +1,210 @@
+import numpy as np
+
+from ds_rtsp import fake_pyds
+from ds_rtsp import analytics as analytics_module
+from ds_rtsp import probes
+from ds_rtsp.analytics import Analytics, Line, Zone
+from ds_rtsp.batch_arrays import BatchArrays
+from ds_rtsp.probes import PipelineProbes
+
+# 100x100 zone "door" on source 0, vertical line "gate" at x=300 on source 0
+DOOR = [[100, 100], [200, 100], [200, 200], [100, 200]]
+GATE = [[300, 0], [300, 400]]
+
+
+def batch(frames):
+    """
+    BatchArrays of {source_id: [(track_id, (x, y)), ...]}, each object a
+    10x10 box whose bottom centre is at (x, y).
+    """
+    frame_metas = []
+    for source_id, objects in sorted(frames.items()):
+        object_metas = [fake_pyds.NvDsObjectMeta(0, "person", 0.9, fake_pyds.NvOSD_RectParams(x - 5, y - 10, 10, 10),
+                                                 track_id)
+                        for track_id, (x, y) in objects]
+        frame_metas.append(fake_pyds.NvDsFrameMeta(source_id, 0, 0, object_metas))
+    return BatchArrays(pyds_module=fake_pyds).extract(fake_pyds.NvDsBatchMeta(frame_metas))
+
+
+def make_analytics(**kwargs):
+    events = []
+    analytics = Analytics([Zone("door", 0, DOOR), Zone("lobby", 1, DOOR)], [Line("gate", 0, GATE)], 640, 480,
+                          on_event=events.append, **kwargs)
+    return analytics, events
+
+
+def counts(analytics):
+    zones, lines = analytics.counts()
+    return dict((zone["name"], (zone["occupancy"], zone["entries"], zone["exits"])) for zone in zones), \
+        dict((line["name"], (line["in"], line["out"])) for line in lines)
+
+
+def test_walk_through_zone_and_over_line():
+    analytics, events = make_analytics()
+    path = [(50, 150), (150, 150), (250, 150), (350, 150), (250, 150), (150, 150), (50, 150)]
+    for point in path:
+        analytics.update(batch({0: [(7, point)]}))
+    zones, lines = counts(analytics)
+    assert zones["door"] == (0, 2, 2)
+    # Left to right of a top -> bottom line is "out", back is "in"
+    assert lines["gate"] == (1, 1)
+    assert [(e["event"], e["name"]) for e in events] == [
+        ("enter", "door"), ("exit", "door"), ("out", "gate"), ("in", "gate"), ("enter", "door"), ("exit", "door")]
+    assert all(e["source"] == 0 and e["track"] == 7 for e in events)
+
+
+def test_track_first_seen_inside_counts_as_entry():
+    analytics, events = make_analytics()
+    analytics.update(batch({0: [(1, (150, 150)), (2, (160, 160)), (3, (500, 150))]}))
+    zones, lines = counts(analytics)
+    assert zones["door"] == (2, 2, 0)
+    # A new track has no previous position to cross from
+    assert lines["gate"] == (0, 0)
+
+
+def test_untracked_objects_count_for_occupancy_only():
+    analytics, events = make_analytics()
+    analytics.update(batch({0: [(fake_pyds.UNTRACKED_OBJECT_ID, (150, 150))]}))
+    assert counts(analytics)[0]["door"] == (1, 0, 0)
+    assert events == []
+
+
+def test_zones_are_per_source():
+    analytics, events = make_analytics()
+    analytics.update(batch({0: [(1, (150, 150))], 1: [(1, (50, 50)), (2, (150, 150)), (3, (160, 160))]}))
+    zones, lines = counts(analytics)
+    assert zones["door"] == (1, 1, 0)
+    assert zones["lobby"] == (2, 2, 0)
+
+
+def test_occupancy_kept_for_sources_missing_from_batch():
+    analytics, events = make_analytics()
+    analytics.update(batch({0: [(1, (150, 150))], 1: [(1, (150, 150)), (2, (160, 160))]}))
+    # A slower source 1 has no frame in every other batch
+    for _ in range(10):
+        analytics.update(batch({0: [(1, (150, 150))]}))
+        assert counts(analytics)[0]["lobby"][0] == 2
+        analytics.update(batch({0: [(1, (150, 150))], 1: [(1, (150, 150)), (2, (160, 160))]}))
+        assert counts(analytics)[0]["lobby"][0] == 2
+    # An empty frame of the source does clear it
+    analytics.update(batch({1: []}))
+    assert counts(analytics)[0]["lobby"][0] == 0
+    assert counts(analytics)[0]["door"][0] == 1
+
+
+def test_track_lost_inside_zone_exits():
+    analytics, events = make_analytics(ttl=5)
+    analytics.update(batch({0: [(1, (150, 150)), (2, (50, 50))]}))
+    for _ in range(7):
+        analytics.update(batch({0: []}))
+    zones, lines = counts(analytics)
+    assert zones["door"] == (0, 1, 1)
+    assert [(e["event"], e["name"], e["track"]) for e in events] == [("enter", "door", 1), ("exit", "door", 1)]
+    assert analytics.tracks.stats()["expired"] == 2
+
+
+def test_track_evicted_inside_zone_exits():
+    analytics, events = make_analytics(max_tracks=2)
+    analytics.update(batch({0: [(1, (150, 150))]}))
+    analytics.update(batch({0: [(2, (50, 50))]}))
+    # Track 1, seen least recently, makes room for track 3
+    analytics.update(batch({0: [(3, (50, 60))]}))
+    zones, lines = counts(analytics)
+    assert zones["door"] == (0, 1, 1)
+    assert analytics.tracks.stats()["evicted"] == 1
+
+
+def test_entries_minus_exits_match_occupancy():
+    analytics, events = make_analytics(ttl=3, max_tracks=16)
+    rng = np.random.RandomState(1)
+    for frame in range(300):
+        # Short lived tracks wandering around the door, some vanishing in it
+        tracks = [(frame // 20 * 10 + i, (rng.uniform(80, 220), rng.uniform(80, 220))) for i in range(5)]
+        analytics.update(batch({0: tracks}))
+    for _ in range(5):
+        analytics.update(batch({0: []}))
+    occupancy, entries, exits = counts(analytics)[0]["door"]
+    assert occupancy == 0
+    assert entries == exits > 0
+
+
+class FakePad:
+    def __init__(self):
+        self.probes = []
+
+    def add_probe(self, mask, callback, user_data):
+        self.probes.append(callback.__name__)
+
+
+class FakeElement:
+    def __init__(self, name):
+        self.name = name
+        self.pads = {"sink": FakePad(), "src": FakePad()}
+
+    def get_name(self):
+        return self.name
+
+    def get_static_pad(self, name):
+        return self.pads[name]
+
+
+class FakePipeline:
+    def __init__(self, names):
+        self.elements = dict((name, FakeElement(name)) for name in names)
+
+    def get_by_name(self, name):
+        return self.elements.get(name)
+
+
+def test_overlays_drawn_in_front_of_tiler():
+    pipeline = FakePipeline(["tracker", "nvtiler", "onscreendisplay"])
+    PipelineProbes().attach(pipeline)
+    assert pipeline.elements["nvtiler"].pads["sink"].probes == ["overlay_probe"]
+    assert pipeline.elements["onscreendisplay"].pads["sink"].probes == []
+
+    # One source, no tiler: the OSD draws the muxer frame as it is
+    pipeline = FakePipeline(["tracker", "onscreendisplay"])
+    PipelineProbes().attach(pipeline)
+    assert pipeline.elements["onscreendisplay"].pads["sink"].probes == ["overlay_probe"]
+
+
+def test_draw_zones_of_each_frame(monkeypatch):
+    monkeypatch.setattr(probes, "pyds", fake_pyds)
+    monkeypatch.setattr(analytics_module, "pyds", fake_pyds)
+    analytics, events = make_analytics()
+    pipeline_probes = PipelineProbes()
+    pipeline_probes.overlays.append(analytics.draw)
+
+    class Info:
+        def get_buffer(self):
+            return self
+
+    info = Info()
+    batch_meta = fake_pyds.NvDsBatchMeta([fake_pyds.NvDsFrameMeta(0), fake_pyds.NvDsFrameMeta(1)])
+    fake_pyds.attach_batch_meta(hash(info), batch_meta)
+    pipeline_probes.overlay_probe(None, info, 0)
+
+    frames = [batch_meta.frame_meta_list.data, batch_meta.frame_meta_list.next.data]
+    # FPS text, then the zones and lines of the frame's own source
+    fps, source_0 = frames[0].display_meta
+    assert source_0.num_lines == 5
+    assert [(p.x1, p.y1, p.x2, p.y2) for p in source_0.line_params[:5]][-1] == (300, 0, 300, 400)
+    assert source_0.text_params[0].display_text.startswith("zone door")
+    fps, source_1 = frames[1].display_meta
+    assert source_1.num_lines == 4
+    assert source_1.text_params[0].display_text.startswith("zone lobby")
+
+
+def test_overlay_rebuilt_only_when_counts_change():
+    analytics, events = make_analytics()
+    analytics.update(batch({0: [(1, (50, 150))]}))
+    overlay = analytics.overlay(0)
+    # Same counts, same strings
+    analytics.update(batch({0: [(1, (60, 150))]}))
+    assert analytics.overlay(0) is overlay
+    analytics.update(batch({0: [(1, (150, 150))]}))
+    rebuilt = analytics.overlay(0)
+    assert rebuilt is not overlay
+    segments, texts = rebuilt[0]
+    assert texts[0] == (40, "zone door (stream 0): 1 inside, 1 entered, 0 exited")
+    assert segments[-1] == (300, 0, 300, 400)
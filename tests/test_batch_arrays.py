@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from ds_rtsp import fake_pyds
+from ds_rtsp.batch_arrays import BatchArrays, UNTRACKED_OBJECT_ID
+
+
+def items(glist):
+    while glist is not None:
+        yield glist.data
+        glist = glist.next
+
+
+def test_extract_matches_the_metadata():
+    batch_meta = fake_pyds.synthetic_batch(3, 5, frame_num=7, seed=1)
+    arrays = BatchArrays(object_capacity=4, frame_capacity=2, pyds_module=fake_pyds).extract(batch_meta)
+    expected = [(frame.source_id, obj.class_id, obj.confidence,
+                 (obj.rect_params.left, obj.rect_params.top, obj.rect_params.width, obj.rect_params.height),
+                 obj.object_id)
+                for frame in items(batch_meta.frame_meta_list) for obj in items(frame.obj_meta_list)]
+    objects = arrays.objects()
+    assert len(objects) == 15 and len(arrays.object_rows) == 16
+    assert objects["source_id"].tolist() == [row[0] for row in expected]
+    assert objects["class_id"].tolist() == [row[1] for row in expected]
+    assert objects["confidence"] == pytest.approx([row[2] for row in expected])
+    assert objects["bbox"] == pytest.approx(np.array([row[3] for row in expected]))
+    assert objects["track_id"].tolist() == [row[4] for row in expected]
+    assert arrays.frames()["first"].tolist() == [0, 5, 10]
+    assert arrays.frame_objects(1)["source_id"].tolist() == [1] * 5
+    assert set(arrays.labels.items()) <= {(0, "person"), (1, "car")}
+
+
+def test_untracked_and_empty_batches():
+    objects = [fake_pyds.NvDsObjectMeta(1, "car", 0.5, fake_pyds.NvOSD_RectParams(1, 2, 3, 4))]
+    batch_meta = fake_pyds.NvDsBatchMeta([fake_pyds.NvDsFrameMeta(0, 0, 0, objects)])
+    arrays = BatchArrays(pyds_module=fake_pyds)
+    assert arrays.extract(batch_meta).objects()["track_id"].tolist() == [UNTRACKED_OBJECT_ID]
+
+    arrays.extract(fake_pyds.NvDsBatchMeta([fake_pyds.NvDsFrameMeta(0, 1, 0)]))
+    assert len(arrays.objects()) == 0 and arrays.frames()["num_objects"].tolist() == [0]
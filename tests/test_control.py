@@ -0,0 +1,162 @@
+import json
+
+import pytest
+
+from ds_rtsp.app import Application
+from ds_rtsp.config import load_config
+from ds_rtsp.control import ControlError, ControlServer
+
+
+class FakeController:
+    def __init__(self):
+        self.added = []
+        self.removed = []
+
+    def list_sources(self):
+        return {"capacity": 4, "sources": []}
+
+    def add_source(self, uri):
+        if "://" not in uri:
+            raise ControlError("400 Bad Request", "expected a URI")
+        self.added.append(uri)
+        return len(self.added)
+
+    def remove_source(self, index):
+        self.removed.append(index)
+
+
+@pytest.fixture
+def server():
+    # Only dispatch and handle, without a socket service
+    control_server = ControlServer.__new__(ControlServer)
+    control_server.controller = FakeController()
+    return control_server
+
+
+def reply(server, method, path, body=b""):
+    status, content_type, payload = server.handle(method, path, body)
+    assert content_type == "application/json"
+    return status, json.loads(payload.decode("utf-8"))
+
+
+def test_add_list_and_remove(server):
+    assert reply(server, "POST", "/sources", b'{"uri": "rtsp://camera/1"}') == ("201 Created", {"index": 1})
+    assert reply(server, "GET", "/sources")[0] == "200 OK"
+    assert reply(server, "DELETE", "/sources/1") == ("200 OK", {"index": 1})
+    assert server.controller.added == ["rtsp://camera/1"] and server.controller.removed == [1]
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b'{"url": "rtsp://camera/1"}',
+    b'["rtsp://camera/1"]',
+    b'{"uri": 5}',
+    b'{"uri": null}',
+    b'{"uri": ["rtsp://camera/1"]}',
+    b'{"uri": "camera"}',
+])
+def test_bad_source_answers_400(server, body):
+    status, answer = reply(server, "POST", "/sources", body)
+    assert status == "400 Bad Request" and "error" in answer
+    assert server.controller.added == []
+
+
+@pytest.mark.parametrize("method, path, status", [
+    ("GET", "/metrics", "404 Not Found"),
+    ("DELETE", "/sources/first", "404 Not Found"),
+    ("PUT", "/sources", "405 Method Not Allowed"),
+])
+def test_errors(server, method, path, status):
+    assert reply(server, method, path)[0] == status
+
+
+class FakePad:
+    def __init__(self):
+        self.probes = 0
+
+    def add_probe(self, mask, callback, user_data):
+        self.probes += 1
+
+
+class FakeQueue:
+    def __init__(self):
+        self.handlers = []
+
+    def get_property(self, name):
+        assert name == "leaky"
+        return 2
+
+    def connect(self, signal, callback, *args):
+        self.handlers.append((callback, args))
+
+    def overrun(self):
+        for callback, args in self.handlers:
+            callback(self, *args)
+
+
+class FakeSourceBin:
+    def __init__(self, name):
+        self.name = name
+        self.src = FakePad()
+        self.nvvidconv_sink = FakePad()
+        self.queue = FakeQueue()
+
+    def get_name(self):
+        return self.name
+
+    def get_by_name(self, name):
+        return {"%s-queue" % self.name: self.queue, "%s-nvvidconv" % self.name: self}[name]
+
+    def get_static_pad(self, name):
+        return self.src if name == "src" else self.nvvidconv_sink
+
+
+class FakePipeline:
+    def __init__(self):
+        self.bins = {}
+
+    def get_by_name(self, name):
+        return self.bins.get(name)
+
+
+class FakeTracer:
+    def __init__(self):
+        self.attached = []
+
+    def attach(self, pad, name):
+        self.attached.append((pad, name))
+
+
+class FakeSourceManager:
+    def __init__(self, pipeline, on_source_added):
+        self.pipeline = pipeline
+        self.on_source_added = on_source_added
+        self.restarts = {}
+
+    def add_source(self, source, watch):
+        source_bin = self.pipeline.bins[source.name] = FakeSourceBin(source.name)
+        self.on_source_added(source, source_bin)
+        return source_bin
+
+    def remove_source(self, source):
+        del self.pipeline.bins[source.name]
+
+
+def test_runtime_sources_get_the_startup_probes():
+    application = Application(load_config(defaults={"inputs": ["rtsp://camera/0"], "max_sources": 4}))
+    application.pipeline = FakePipeline()
+    application.latency_tracer = FakeTracer()
+    application.source_manager = FakeSourceManager(application.pipeline, application.on_source_added)
+
+    index = application.add_source("rtsp://camera/1")
+    source_bin = application.pipeline.bins[application.find_source(index).name]
+    assert application.latency_tracer.attached == [(source_bin.nvvidconv_sink, "source"),
+                                                  (source_bin.src, "nvvidconvsrc")]
+    source_bin.queue.overrun()
+    assert application.probes.stale_frames == {index: 1}
+
+    application.remove_source(index)
+    assert application.probes.stale_frames == {}
+    # Still stopping
+    source_bin.queue.overrun()
+    assert application.probes.stale_frames == {}
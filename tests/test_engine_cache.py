@@ -0,0 +1,146 @@
+import os
+
+import pytest
+
+from ds_rtsp.engine_cache import EngineCache, GstEngineBuilder
+
+
+class StubBuilder:
+    """
+    Records the builds the cache asks for and writes a fake engine instead.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, infer_config, batch_size, engine_path):
+        self.calls.append((os.path.basename(infer_config), batch_size))
+        with open(engine_path, "wb") as f:
+            f.write(b"engine for batch %d" % batch_size)
+        return True
+
+
+def write_config(directory, name="pgie.txt", network_mode=2, engine="model_b1_gpu0_fp16.engine"):
+    path = os.path.join(str(directory), name)
+    with open(path, "w") as f:
+        f.write("[property]\nonnx-file=model.onnx\nnetwork-mode=%d\nmodel-engine-file=%s\n" % (network_mode, engine))
+    return path
+
+
+def set_age(path, seconds_ago):
+    mtime = os.path.getmtime(path) - seconds_ago
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def model_dir(tmpdir):
+    with open(os.path.join(str(tmpdir), "model.onnx"), "wb") as f:
+        f.write(b"onnx v1")
+    return tmpdir
+
+
+@pytest.fixture
+def cache(model_dir):
+    return EngineCache(os.path.join(str(model_dir), "cache"), builder=StubBuilder(), platform="test")
+
+
+def test_builds_once(model_dir, cache):
+    config = write_config(model_dir)
+    first = cache.ensure(config, 1)
+    assert first and os.path.exists(first)
+    assert cache.ensure(config, 1) == first
+    assert cache.builder.calls == [("pgie.txt", 1)]
+
+
+def test_rebuilds_for_other_batch_size_and_precision(model_dir, cache):
+    cache.ensure(write_config(model_dir), 1)
+    cache.ensure(write_config(model_dir), 4)
+    cache.ensure(write_config(model_dir, "fp32.txt", network_mode=0), 1)
+    assert cache.builder.calls == [("pgie.txt", 1), ("pgie.txt", 4), ("fp32.txt", 1)]
+    assert len(cache.entries()) == 3
+
+
+def test_rebuilds_when_onnx_changes(model_dir, cache):
+    config = write_config(model_dir)
+    first = cache.ensure(config, 1)
+    with open(os.path.join(str(model_dir), "model.onnx"), "wb") as f:
+        f.write(b"onnx v2, re-exported")
+    second = cache.ensure(config, 1)
+    assert second != first
+    assert len(cache.builder.calls) == 2
+
+
+def test_ignores_truncated_engine(model_dir, cache):
+    config = write_config(model_dir)
+    engine = cache.ensure(config, 1)
+    with open(engine, "wb") as f:
+        f.write(b"eng")
+    assert cache.lookup_config(config, 1) is None
+    cache.ensure(config, 1)
+    assert len(cache.builder.calls) == 2
+
+
+def test_ignores_other_platform(model_dir, cache):
+    config = write_config(model_dir)
+    cache.ensure(config, 1)
+    other = EngineCache(cache.cache_dir, builder=StubBuilder(), platform="other")
+    assert other.lookup_config(config, 1) is None
+
+
+def write_engine(model_dir, name, seconds_ago=0):
+    path = os.path.join(str(model_dir), name)
+    with open(path, "wb") as f:
+        f.write(b"engine")
+    if seconds_ago:
+        set_age(path, seconds_ago)
+    return path
+
+
+def test_adopts_only_matching_fresh_engine(model_dir):
+    set_age(os.path.join(str(model_dir), "model.onnx"), 60)
+    engine = write_engine(model_dir, "model_b1_gpu0_fp16.engine")
+    assert GstEngineBuilder.adoptable(write_config(model_dir), 1) == engine
+    # Built for another batch size or precision than the config asks for
+    assert GstEngineBuilder.adoptable(write_config(model_dir), 2) is None
+    assert GstEngineBuilder.adoptable(write_config(model_dir, network_mode=0), 1) is None
+
+
+def test_does_not_adopt_engine_older_than_onnx(model_dir):
+    write_engine(model_dir, "model_b1_gpu0_fp16.engine", seconds_ago=60)
+    assert GstEngineBuilder.adoptable(write_config(model_dir), 1) is None
+
+
+def test_does_not_adopt_engine_without_precision(model_dir):
+    set_age(os.path.join(str(model_dir), "model.onnx"), 60)
+    write_engine(model_dir, "model_b1_gpu0.engine")
+    assert GstEngineBuilder.adoptable(write_config(model_dir, engine="model_b1_gpu0.engine"), 1) is None
+
+
+def test_model_without_onnx_file(model_dir, cache):
+    with open(os.path.join(str(model_dir), "model.uff"), "wb") as f:
+        f.write(b"uff")
+    path = os.path.join(str(model_dir), "uff.txt")
+    with open(path, "w") as f:
+        f.write("[property]\nmodel-file=model.uff\nnetwork-mode=2\n")
+    assert cache.model_of(path) == (os.path.join(str(model_dir), "model.uff"), "fp16")
+    # A config naming only a prebuilt engine is keyed by the config itself
+    path = os.path.join(str(model_dir), "prebuilt.txt")
+    with open(path, "w") as f:
+        f.write("[property]\nmodel-engine-file=model_b1_gpu0_fp16.engine\n")
+    assert cache.model_of(path) == (path, "fp32")
+    assert cache.ensure(path, 1)
+    assert cache.builder.calls == [("prebuilt.txt", 1)]
+
+
+def test_build_config_removed_when_launch_fails(model_dir, monkeypatch):
+    from gi.repository import Gst
+
+    def parse_launch(description):
+        raise RuntimeError("no element nvinfer")
+
+    monkeypatch.setattr(Gst, "init", lambda argv: None, raising=False)
+    monkeypatch.setattr(Gst, "parse_launch", parse_launch, raising=False)
+    config = write_config(model_dir)
+    with pytest.raises(RuntimeError):
+        GstEngineBuilder()(config, 1, os.path.join(str(model_dir), "cached.engine"))
+    assert sorted(os.listdir(str(model_dir))) == ["model.onnx", "pgie.txt"]
@@ -0,0 +1,79 @@
+import pytest
+
+from common.FPS import StreamRateMeter
+from ds_rtsp import fake_pyds
+from ds_rtsp import probes
+from ds_rtsp.probes import PipelineProbes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBuffer:
+    pass
+
+
+class FakeProbeInfo:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def get_buffer(self):
+        return self.buffer
+
+
+def push_batches(pipeline_probes, clock, num_batches, num_sources, fps):
+    """
+    Push one batch per frame interval through the FPS count probe and the
+    overlay probe, as the tracker and the tiler see them.
+    """
+    for frame_num in range(num_batches):
+        clock.now += 1.0 / fps
+        buffer = FakeBuffer()
+        fake_pyds.attach_batch_meta(hash(buffer), fake_pyds.synthetic_batch(num_sources, 3, frame_num, seed=frame_num))
+        info = FakeProbeInfo(buffer)
+        pipeline_probes.fps_count_probe(None, info, 0)
+        pipeline_probes.overlay_probe(None, info, 0)
+
+
+@pytest.fixture
+def clocked_probes(monkeypatch):
+    monkeypatch.setattr(probes, "pyds", fake_pyds)
+    clock = FakeClock()
+    pipeline_probes = PipelineProbes()
+    pipeline_probes.fps_meter = StreamRateMeter(clock=clock)
+    return pipeline_probes, clock
+
+
+@pytest.mark.parametrize("num_sources", [1, 4])
+def test_each_frame_counts_once(clocked_probes, num_sources):
+    pipeline_probes, clock = clocked_probes
+    push_batches(pipeline_probes, clock, 300, num_sources, 30.0)
+
+    meter = pipeline_probes.fps_meter
+    assert meter.source_ids() == list(range(num_sources))
+    for source_id in range(num_sources):
+        assert meter.frame_count(source_id) == 300
+        assert meter.rate(source_id, window=5.0) == pytest.approx(30.0, rel=0.02)
+
+
+def test_osd_shows_published_rate(clocked_probes):
+    pipeline_probes, clock = clocked_probes
+    push_batches(pipeline_probes, clock, 150, 2, 25.0)
+    pipeline_probes.fps_meter.publish()
+
+    buffer = FakeBuffer()
+    batch = fake_pyds.synthetic_batch(2, 0, 150)
+    fake_pyds.attach_batch_meta(hash(buffer), batch)
+    pipeline_probes.overlay_probe(None, FakeProbeInfo(buffer), 0)
+
+    l_frame = batch.frame_meta_list
+    while l_frame is not None:
+        texts = [meta.text_params[0].display_text for meta in l_frame.data.display_meta]
+        assert texts == ["FPS: 25.0"]
+        l_frame = l_frame.next
+    assert pipeline_probes.fps_meter.frame_count(0) == 150
@@ -0,0 +1,172 @@
+import sys
+import threading
+
+import pytest
+
+from conftest import HAVE_GST
+from ds_rtsp.latency import LatencyHistogram, LatencyTracer
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for _ in range(90):
+        histogram.record(1000.0)
+    for _ in range(10):
+        histogram.record(50000.0)
+    # Upper bounds of the buckets, within a quarter octave
+    assert 1000.0 <= histogram.percentile(50) <= 1000.0 * 2 ** 0.25
+    assert 50000.0 <= histogram.percentile(95) <= 50000.0 * 2 ** 0.25
+    assert histogram.percentile(99) == histogram.percentile(95)
+    assert histogram.mean() == pytest.approx(5900.0)
+
+
+def test_empty_and_out_of_range_histogram():
+    histogram = LatencyHistogram(max_us=1000.0)
+    assert histogram.percentile(50) == 0.0 and histogram.mean() == 0.0
+    histogram.record(0.0)
+    histogram.record(1e9)
+    assert histogram.counts[0] == 1 and histogram.counts[-1] == 1
+
+
+def tracer(*stages, **kwargs):
+    latency_tracer = LatencyTracer(**kwargs)
+    for name in stages:
+        latency_tracer.add_stage(name)
+    return latency_tracer
+
+
+def test_time_between_stages():
+    latency_tracer = tracer("source", "pgie", "encoder")
+    for frame in range(100):
+        pts = frame * 40000000
+        start = frame * 0.04
+        latency_tracer.stamp(pts, 0, "source", start)
+        latency_tracer.stamp(pts, 1, "pgie", start + 0.010)
+        latency_tracer.stamp(pts, 2, "encoder", start + 0.012)
+        # RTP packets of the same frame after the last stage are not counted
+        latency_tracer.stamp(pts, 2, "encoder", start + 0.013)
+    stats = latency_tracer.stats()
+    assert sorted(stats) == ["encoder", "pgie", "total"]
+    assert stats["pgie"]["count"] == stats["encoder"]["count"] == stats["total"]["count"] == 100
+    assert stats["pgie"]["mean_ms"] == pytest.approx(10.0)
+    assert stats["encoder"]["mean_ms"] == pytest.approx(2.0)
+    assert 10.0 <= stats["pgie"]["p50_ms"] <= 10.0 * 2 ** 0.25
+    assert stats["total"]["mean_ms"] == pytest.approx(12.0)
+    assert latency_tracer.inflight == {}
+    assert latency_tracer.dump().splitlines()[1].split()[:2] == ["pgie", "100"]
+
+
+def test_untracked_pts_and_inflight_cap():
+    latency_tracer = tracer("source", "pgie", max_inflight=4)
+    # Never seen by the first stage
+    latency_tracer.stamp(1, 1, "pgie", 0.0)
+    # Frames dropped before pgie age out
+    for pts in range(10):
+        latency_tracer.stamp(pts, 0, "source", pts)
+    assert sorted(latency_tracer.inflight) == [6, 7, 8, 9]
+    assert latency_tracer.stats()["pgie"]["count"] == 0
+
+
+def test_same_pts_from_another_source_restarts():
+    latency_tracer = tracer("source", "pgie")
+    latency_tracer.stamp(0, 0, "source", 0.0)
+    latency_tracer.stamp(0, 0, "source", 0.5)
+    latency_tracer.stamp(0, 1, "pgie", 0.501)
+    assert latency_tracer.stats()["pgie"]["mean_ms"] == pytest.approx(1.0)
+
+
+def test_stamps_from_many_threads():
+    # Source bins and queued stages stamp from their own streaming threads
+    latency_tracer = tracer("source", "pgie", "encoder", max_inflight=8)
+    errors = []
+
+    def stream(offset):
+        try:
+            for frame in range(2000):
+                pts = frame * 8 + offset
+                latency_tracer.stamp(pts, 0, "source")
+                latency_tracer.stamp(pts, 1, "pgie")
+                latency_tracer.stamp(pts, 2, "encoder")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=stream, args=(offset,)) for offset in range(8)]
+    # Switch threads as often as possible, to interleave inside stamp()
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for _ in range(100):
+            latency_tracer.dump()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
+    stats = latency_tracer.stats()
+    assert stats["total"]["count"] == stats["encoder"]["count"] > 0
+    assert len(latency_tracer.inflight) <= 8
+
+
+class FakeBuffer:
+    def __init__(self, pts):
+        self.pts = pts
+
+
+class FakeInfo:
+    def __init__(self, pts):
+        self.buffer = FakeBuffer(pts)
+
+    def get_buffer(self):
+        return self.buffer
+
+
+class FakePad:
+    def __init__(self):
+        self.probes = []
+
+    def add_probe(self, mask, callback, user_data):
+        self.probes.append((callback, user_data))
+
+    def push(self, pts):
+        for callback, user_data in self.probes:
+            callback(self, FakeInfo(pts), user_data)
+
+
+def test_probes_share_a_stage():
+    clock = iter(range(100)).__next__
+    latency_tracer = LatencyTracer(clock=lambda: clock() / 1000.0)
+    sources = [FakePad(), FakePad()]
+    for pad in sources:
+        latency_tracer.attach(pad, "source")
+    mux = FakePad()
+    latency_tracer.attach(mux, "streammux")
+    assert latency_tracer.stages == ["source", "streammux"]
+    sources[0].push(0)
+    sources[1].push(40)
+    mux.push(0)
+    mux.push(40)
+    stats = latency_tracer.stats()
+    assert stats["streammux"]["count"] == 2
+    assert stats["streammux"]["mean_ms"] == pytest.approx(2.0)
+
+
+@pytest.mark.skipif(not HAVE_GST, reason="needs GStreamer")
+def test_traces_cpu_stand_ins():
+    from gi.repository import Gst
+    Gst.init(None)
+    pipeline = Gst.parse_launch(
+        "videotestsrc name=source num-buffers=50 ! video/x-raw, width=320, height=240 ! "
+        "videoconvert name=convert ! identity name=slow sleep-time=2000 ! fakesink name=sink sync=false")
+    latency_tracer = LatencyTracer()
+    for name in ("source", "convert", "slow"):
+        latency_tracer.attach_element(pipeline.get_by_name(name))
+    assert not latency_tracer.attach_element(pipeline.get_by_name("sink"))
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    assert message and message.type == Gst.MessageType.EOS
+    stats = latency_tracer.stats()
+    assert stats["slow"]["count"] == stats["total"]["count"] == 50
+    assert stats["slow"]["p50_ms"] >= 2.0
@@ -0,0 +1,80 @@
+import pytest
+
+from ds_rtsp import stages
+from ds_rtsp.config import DEFAULT_CONFIG
+from ds_rtsp.recorder import EncodedRing
+
+SECOND = 1000000000
+
+
+class FakeBuffer:
+    def __init__(self, pts, size=1000):
+        self.pts = pts
+        self.size = size
+
+    def get_size(self):
+        return self.size
+
+
+def feed(ring, seconds, fps=25, gop=25, size=1000):
+    """
+    `seconds` of encoded video with a keyframe every `gop` frames. Returns
+    the buffers in order.
+    """
+    buffers = []
+    for frame in range(int(seconds * fps)):
+        buffer = FakeBuffer(frame * SECOND // fps, size)
+        ring.append(buffer, frame % gop == 0)
+        buffers.append(buffer)
+    return buffers
+
+
+def test_keeps_preroll_in_whole_gops():
+    ring = EncodedRing(preroll=3.0)
+    buffers = feed(ring, 10)
+    kept = ring.buffers()
+    # Starts on the keyframe at 6 s, the latest one at least 3 s back from 9.96 s
+    assert kept[0].pts == 6 * SECOND
+    assert kept == buffers[-len(kept):]
+    assert len(kept) == 4 * 25
+    assert ring.size == sum(buffer.size for buffer in kept)
+
+
+def test_short_stream_kept_whole():
+    ring = EncodedRing(preroll=5.0)
+    buffers = feed(ring, 2)
+    assert ring.buffers() == buffers
+
+
+def test_byte_cap_drops_oldest_gops():
+    ring = EncodedRing(preroll=10.0, max_bytes=60 * 1000)
+    feed(ring, 10)
+    kept = ring.buffers()
+    assert ring.size <= 60 * 1000
+    # Still starts on a keyframe, with the newest GOP kept
+    assert kept[0].pts % SECOND == 0
+    assert kept[-1].pts == 249 * SECOND // 25
+
+
+def test_newest_gop_kept_above_byte_cap():
+    ring = EncodedRing(preroll=5.0, max_bytes=10 * 1000)
+    buffers = feed(ring, 3)
+    assert ring.buffers() == buffers[50:]
+
+
+def test_ignores_delta_frames_before_first_keyframe():
+    ring = EncodedRing()
+    for frame in range(10):
+        ring.append(FakeBuffer(frame * SECOND // 25), False)
+    assert ring.buffers() == [] and ring.size == 0
+    keyframe = FakeBuffer(10 * SECOND // 25)
+    ring.append(keyframe, True)
+    assert ring.buffers() == [keyframe]
+
+
+@pytest.mark.parametrize("record_dir, expected", [(None, None), ("/tmp/clips", 1)])
+def test_encoder_repeats_headers_when_recording(monkeypatch, record_dir, expected):
+    monkeypatch.setattr(stages, "is_aarch64", lambda: False)
+    config = dict(DEFAULT_CONFIG, record_dir=record_dir)
+    encoder = [spec for spec in stages.rtsp_stage(config, 1).specs if spec.name == "encoder"][0]
+    assert encoder.get("insert-sps-pps") == expected
@@ -0,0 +1,105 @@
+import types
+
+import pytest
+
+from ds_rtsp import rtsp_output
+from ds_rtsp.rtsp_output import RtspClientGate
+
+
+class FakeElement:
+    def __init__(self, accept_events=True):
+        self.properties = {}
+        self.events = []
+        self.accept_events = accept_events
+
+    def get_property(self, name):
+        return self.properties[name]
+
+    def set_property(self, name, value):
+        self.properties[name] = value
+
+    def send_event(self, event):
+        self.events.append(event)
+        return self.accept_events
+
+
+class FakeClient:
+    """
+    GstRtspServer.RTSPClient stand-in: close() emits "closed".
+    """
+
+    def __init__(self):
+        self.handlers = []
+
+    def connect(self, signal, callback, *args):
+        assert signal == "closed"
+        self.handlers.append((callback, args))
+
+    def close(self):
+        for callback, args in self.handlers:
+            callback(self, *args)
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    # Force-key-unit events made by the gate, as plain tuples
+    monkeypatch.setattr(rtsp_output, "GstVideo", types.SimpleNamespace(
+        video_event_new_upstream_force_key_unit=lambda *args: ("force-key-unit",) + args))
+    return RtspClientGate(FakeElement(), FakeElement())
+
+
+def connect(gate):
+    client = FakeClient()
+    gate.on_client_connected(None, client)
+    return client
+
+
+def test_closed_until_first_client(gate):
+    assert gate.valve.get_property("drop") is True
+    assert not gate.is_open()
+    assert gate.encoder.events == []
+
+
+def test_opens_on_first_client_and_closes_after_last(gate):
+    first = connect(gate)
+    assert gate.valve.get_property("drop") is False
+    assert [event[0] for event in gate.encoder.events] == ["force-key-unit"]
+    # all-headers, so a new client gets SPS/PPS with the keyframe
+    assert gate.encoder.events[0][2] is True
+
+    second = connect(gate)
+    assert gate.clients == 2
+    assert len(gate.encoder.events) == 1
+
+    first.close()
+    assert gate.is_open()
+    second.close()
+    assert gate.valve.get_property("drop") is True
+    assert gate.clients == 0
+
+
+def test_reconnect_requests_another_keyframe(gate):
+    connect(gate).close()
+    connect(gate)
+    assert gate.is_open()
+    assert len(gate.encoder.events) == 2
+
+
+def test_media_unprepared_closes_branch(gate):
+    connect(gate)
+    connect(gate)
+    gate.on_media_unprepared(None)
+    assert gate.clients == 0
+    assert not gate.is_open()
+    # A close arriving after the media went away does not go negative
+    gate.on_client_closed(FakeClient())
+    assert gate.clients == 0
+
+
+def test_refused_keyframe_request_still_opens(monkeypatch, capsys):
+    monkeypatch.setattr(rtsp_output, "GstVideo", types.SimpleNamespace(
+        video_event_new_upstream_force_key_unit=lambda *args: "force-key-unit"))
+    gate = RtspClientGate(FakeElement(), FakeElement(accept_events=False))
+    connect(gate)
+    assert gate.is_open()
+    assert "Unable to request a keyframe" in capsys.readouterr().err
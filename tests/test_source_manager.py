@@ -0,0 +1,146 @@
+import types
+
+import pytest
+
+from ds_rtsp import app, source_manager
+from ds_rtsp.source_manager import SourceManager
+
+ERROR = "error"
+
+
+class FakeElement:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+
+    def get_name(self):
+        return self.name
+
+    def has_as_ancestor(self, ancestor):
+        element = self
+        while element:
+            if element is ancestor:
+                return True
+            element = element.parent
+        return False
+
+
+class FakePad:
+    def add_probe(self, mask, callback, user_data):
+        pass
+
+
+class FakeBin(FakeElement):
+    def __init__(self, name):
+        FakeElement.__init__(self, name)
+        self.state = "PLAYING"
+        self.children = dict((child, FakeElement("%s-%s" % (name, child), self)) for child in ("rtspsrc", "decoder"))
+
+    def get_static_pad(self, name):
+        return FakePad()
+
+    def set_state(self, state):
+        self.state = state
+
+
+class FakePipeline:
+    def __init__(self, *bins):
+        self.bins = dict((source_bin.name, source_bin) for source_bin in bins)
+
+    def get_by_name(self, name):
+        return self.bins.get(name)
+
+    def remove(self, source_bin):
+        del self.bins[source_bin.name]
+
+
+class FakeStreammux:
+    def get_static_pad(self, name):
+        return None
+
+
+class FakeMessage:
+    def __init__(self, src, type=ERROR):
+        self.src = src
+        self.type = type
+
+    def parse_error(self):
+        return "Could not read from resource", "debug"
+
+
+class FakeLoop:
+    def __init__(self):
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def timeouts(monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(source_manager, "Gst", types.SimpleNamespace(
+        MessageType=types.SimpleNamespace(ERROR=ERROR),
+        State=types.SimpleNamespace(NULL="NULL"),
+        StateChangeReturn=types.SimpleNamespace(FAILURE="FAILURE"),
+        PadProbeType=types.SimpleNamespace(BUFFER=1, EVENT_DOWNSTREAM=2)))
+    monkeypatch.setattr(source_manager, "GLib", types.SimpleNamespace(
+        timeout_add=lambda interval, callback, *args: scheduled.append((interval, callback, args))))
+    return scheduled
+
+
+def watched(*names):
+    bins = [FakeBin(name) for name in names]
+    manager = SourceManager(FakePipeline(*bins), FakeStreammux(), clock=lambda: 0.0)
+    for index, source_bin in enumerate(bins):
+        manager.watch(types.SimpleNamespace(index=index, name=source_bin.name, path="rtsp://camera/%d" % index))
+    return manager, bins
+
+
+def test_errors_from_a_torn_down_bin_do_not_quit_the_loop(timeouts, monkeypatch):
+    def bus_call(bus, message, loop):
+        if message.type == ERROR:
+            loop.quit()
+        return True
+
+    monkeypatch.setattr(app, "bus_call", bus_call)
+    manager, (source_bin,) = watched("source-bin-00")
+    application = types.SimpleNamespace(source_manager=manager, loop=FakeLoop())
+
+    # rtspsrc fails, then the decoder posts its own error for the same failure
+    for child in ("rtspsrc", "decoder"):
+        assert app.Application.on_bus_message(application, None, FakeMessage(source_bin.children[child]))
+    assert not application.loop.quit_called
+    assert source_bin.state == "NULL" and manager.pipeline.get_by_name("source-bin-00") is None
+    # Restarted once
+    assert len(timeouts) == 1 and manager.states[0].pending
+
+    # Anything else still ends the loop
+    app.Application.on_bus_message(application, None, FakeMessage(FakeElement("encoder")))
+    assert application.loop.quit_called
+
+
+def test_only_errors_of_the_failed_source_are_dropped(timeouts):
+    manager, bins = watched("source-bin-00", "source-bin-01")
+    assert manager.handle_message(FakeMessage(bins[0].children["rtspsrc"]))
+    assert manager.handle_message(FakeMessage(bins[0]))
+    assert not manager.states[1].pending
+    assert manager.handle_message(FakeMessage(bins[1].children["decoder"]))
+    assert manager.states[1].pending
+    assert len(timeouts) == 2
+
+
+def test_restart_forgets_the_failed_bin(timeouts, monkeypatch):
+    manager, (source_bin,) = watched("source-bin-00")
+    manager.handle_message(FakeMessage(source_bin.children["rtspsrc"]))
+    state = manager.states[0]
+    assert state.failed_bin is source_bin
+
+    restarted = manager.pipeline.bins["source-bin-00"] = FakeBin("source-bin-00")
+    monkeypatch.setattr(manager, "add_bin", lambda source: restarted)
+    interval, restart, args = timeouts.pop()
+    restart(*args)
+    assert state.source_bin is restarted and state.failed_bin is None
+    # The new bin fails on its own
+    assert manager.handle_message(FakeMessage(restarted.children["decoder"]))
+    assert state.pending and state.failures == 2
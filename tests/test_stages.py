@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+
+from conftest import HAVE_GST
+from ds_rtsp import stages
+from ds_rtsp.builder import PipelineBuilder
+from ds_rtsp.config import load_config
+from ds_rtsp.sources import SourceSpec
+
+
+class Source:
+    def __init__(self, size):
+        self.size = size
+
+
+def config(**overrides):
+    return load_config(defaults=overrides)
+
+
+@pytest.mark.parametrize("overrides, sizes, expected", [
+    # The largest source, so that none is upscaled
+    ({}, [(640, 480), (1280, 720)], (1280, 720)),
+    ({}, [(640, 480)], (640, 480)),
+    # Size unknown before negotiation
+    ({}, [None], stages.FALLBACK_MUX_SIZE),
+    ({}, [], stages.FALLBACK_MUX_SIZE),
+    # Set in the config
+    ({"mux_width": 960, "mux_height": 544}, [(1920, 1080)], (960, 544)),
+    # Nothing rendered: down to cover the model input, even for NV12
+    ({"output": "metadata-only"}, [(1920, 1080)], (1138, 640)),
+    ({"output": "metadata-only"}, [(640, 360)], (640, 360)),
+    ({"output": "metadata-only", "model": "yolov8n-416"}, [(1280, 720)], (740, 416)),
+    ({}, [(641, 481)], (640, 480)),
+])
+def test_mux_size(overrides, sizes, expected):
+    assert stages.mux_size(config(**overrides), [Source(size) for size in sizes]) == expected
+
+
+def test_source_scale():
+    source = SourceSpec(0, "videotestsrc@1920x1080", scale=(640, 360))
+    assert source.size == (640, 360)
+    assert source.specs[-1].get("caps") == "video/x-raw(memory:NVMM), format=NV12, width=640, height=360"
+    # Without a scale the source keeps its own size
+    assert SourceSpec(1, "videotestsrc@800x600").size == (800, 600)
+
+
+def test_stand_ins_fit_the_mux_size():
+    builder = PipelineBuilder(config(inputs=["videotestsrc@640x480", "videotestsrc@1280x720"], cpu_stand_ins=True))
+    assert builder.mux_size == (1280, 720)
+    for source in builder.sources:
+        assert source.specs[-1].get("caps") == "video/x-raw, width=1280, height=720, pixel-aspect-ratio=1/1"
+
+
+def test_compose_writes_no_infer_config(tmpdir):
+    base = os.path.join(str(tmpdir), "pgie.txt")
+    with open(base, "w") as f:
+        f.write("[property]\nbatch-size=1\n")
+    builder = PipelineBuilder(config(inputs=["videotestsrc"] * 2, pgie_config=base, model="yolov8n-fp16"))
+    builder.describe()
+    assert os.listdir(str(tmpdir)) == ["pgie.txt"]
+
+    path = builder.trunk[1].specs[0].get("config-file-path")
+    stages.write_infer_configs(builder.config, 2)
+    assert sorted(os.listdir(str(tmpdir))) == ["pgie.txt", os.path.basename(path)]
+    with open(path) as f:
+        assert "model-engine-file=yolov8n-fp16_b2_gpu0_fp16.engine" in f.read()
+
+
+def negotiated_caps(pipeline, element_name, timeout=10.0):
+    from gi.repository import Gst
+    pad = pipeline.get_by_name(element_name).get_static_pad("src")
+    pipeline.set_state(Gst.State.PLAYING)
+    deadline = time.monotonic() + timeout
+    caps = None
+    while caps is None and time.monotonic() < deadline:
+        message = pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+        assert message is None, message.parse_error()
+        caps = pad.get_current_caps()
+        time.sleep(0.05)
+    pipeline.set_state(Gst.State.NULL)
+    assert caps is not None, "%s negotiated nothing" % element_name
+    structure = caps.get_structure(0)
+    return structure.get_int("width")[1], structure.get_int("height")[1]
+
+
+@pytest.mark.skipif(not HAVE_GST, reason="needs GStreamer")
+@pytest.mark.parametrize("inputs, overrides, expected", [
+    (["videotestsrc@640x480", "videotestsrc@1280x720"], {}, (1280, 720)),
+    (["videotestsrc@640x480", "videotestsrc@320x240"], {}, (640, 480)),
+    (["videotestsrc@1920x1080"], {"output": "metadata-only"}, (1138, 640)),
+])
+def test_stand_ins_negotiate_mux_size(inputs, overrides, expected):
+    from gi.repository import Gst
+    Gst.init(None)
+    builder = PipelineBuilder(config(inputs=inputs, cpu_stand_ins=True, **overrides))
+    pipeline = builder.build()
+    if builder.streams_rtsp():
+        # Keep the RTP stream on this machine
+        pipeline.get_by_name("udpsink").set_property("host", "127.0.0.1")
+    # The funnel standing in for nvstreammux passes every source's frames
+    assert negotiated_caps(pipeline, "Stream-muxer") == expected
@@ -0,0 +1,100 @@
+import numpy as np
+
+from ds_rtsp.track_store import TrackStore
+
+
+def test_new_and_known_tracks():
+    store = TrackStore([("anchor", np.float32, (2,))])
+    slots, new = store.lookup([(0, 1), (0, 2), (1, 1)], 0)
+    assert new.tolist() == [True, True, True]
+    assert len(set(slots.tolist())) == 3
+    store.records["anchor"][slots[0]] = (5, 6)
+
+    again, new = store.lookup([(0, 1), (0, 3)], 1)
+    assert again[0] == slots[0]
+    assert new.tolist() == [False, True]
+    assert store.records["anchor"][again[0]].tolist() == [5, 6]
+    # New records start zeroed
+    assert store.records["anchor"][again[1]].tolist() == [0, 0]
+    assert store.records["first_seen"][again[0]] == 0
+    assert store.records["last_seen"][again[0]] == 1
+
+
+def test_expires_after_ttl():
+    store = TrackStore(ttl=10)
+    store.lookup([(0, 1), (0, 2)], 0)
+    for now in range(1, 20):
+        store.lookup([(0, 2)], now)
+        store.expire(now)
+        assert ((0, 1) in store.slots) == (now <= 10)
+    assert len(store) == 1
+    assert store.stats()["expired"] == 1
+    # A track coming back after it expired is a new one
+    slots, new = store.lookup([(0, 1)], 20)
+    assert new.tolist() == [True]
+
+
+def test_slots_reused_after_expiry():
+    store = TrackStore(ttl=2, capacity=4)
+    # IDs only ever increase, as nvtracker's do
+    for now in range(1000):
+        store.lookup([(0, now), (1, now)], now)
+        store.expire(now)
+    assert len(store) <= 6
+    assert store.stats()["capacity"] == 8
+    assert store.stats()["created"] == 2000
+
+
+def test_grows_up_to_max_tracks_then_evicts_least_recent():
+    store = TrackStore(max_tracks=8, capacity=2)
+    for track_id in range(8):
+        store.lookup([(0, track_id)], track_id)
+    stats = store.stats()
+    assert (stats["capacity"], stats["live"], stats["evicted"]) == (8, 8, 0)
+
+    # Track 0 seen again, so track 1 is the least recent
+    store.lookup([(0, 0)], 8)
+    store.lookup([(0, 100)], 9)
+    assert (0, 1) not in store.slots
+    assert (0, 0) in store.slots and (0, 100) in store.slots
+    stats = store.stats()
+    assert (stats["capacity"], stats["live"], stats["evicted"]) == (8, 8, 1)
+    assert stats["bytes"] == 8 * store.dtype.itemsize
+
+
+def test_on_release_sees_the_record():
+    released = []
+
+    def on_release(slot, key):
+        released.append((key, int(store.records["first_seen"][slot]), int(store.records["last_seen"][slot])))
+
+    store = TrackStore(max_tracks=2, ttl=5, on_release=on_release)
+    store.lookup([(0, 1)], 0)
+    store.lookup([(0, 2)], 1)
+    store.lookup([(0, 3)], 2)
+    assert released == [((0, 1), 0, 0)]
+    store.expire(10)
+    assert sorted(released[1:]) == [((0, 2), 1, 1), ((0, 3), 2, 2)]
+    assert len(store) == 0
+
+
+def test_batch_larger_than_max_tracks_keeps_its_slots():
+    store = TrackStore([("anchor", np.float32, (2,))], max_tracks=4, capacity=2)
+    old, _ = store.lookup([(0, 1), (0, 2)], 0)
+    store.records["anchor"][old] = [(1, 1), (2, 2)]
+
+    # Track 1 again and six new ones in one update: only track 2 is older
+    keys = [(0, 1)] + [(1, track_id) for track_id in range(6)]
+    slots, new = store.lookup(keys, 1)
+    assert len(set(slots.tolist())) == len(keys)
+    assert new.tolist() == [False] + [True] * 6
+    assert all(store.slots[key] == slot for key, slot in zip(keys, slots.tolist()))
+    assert store.records["anchor"][slots[0]].tolist() == [1, 1]
+    assert store.records["last_seen"][slots].tolist() == [1] * len(keys)
+    stats = store.stats()
+    assert (stats["live"], stats["evicted"], stats["capacity"]) == (7, 1, 7)
+
+    # The next update evicts again instead of growing
+    slots, new = store.lookup([(2, 0)], 2)
+    assert store.stats()["capacity"] == 7 and store.stats()["evicted"] == 2
+    assert (0, 1) not in store.slots